@@ -0,0 +1,418 @@
+#pragma once
+
+// Runtime of the C++ wire codecs generated by iface.generator, see
+// iface/generator/wireformat.py for the format. The generated code defines
+// encode(), decode_field() and decode() for every struct in its namespace, the
+// templates below find them by the argument dependent lookup.
+
+#include <cstdint>
+#include <cstring>
+#include <stdexcept>
+#include <string>
+#include <utility>
+#include <vector>
+
+namespace mad { namespace interfaces { namespace wire {
+
+enum class WireType : std::uint32_t
+{
+  Varint = 0,
+  Fixed64 = 1,
+  Length = 2,
+  Fixed32 = 5
+};
+
+inline std::uint64_t zigzag(std::int64_t value)
+{
+  return (static_cast<std::uint64_t>(value) << 1) ^ static_cast<std::uint64_t>(value >> 63);
+}
+
+inline std::int64_t unzigzag(std::uint64_t value)
+{
+  return static_cast<std::int64_t>(value >> 1) ^ -static_cast<std::int64_t>(value & 1);
+}
+
+class Writer
+{
+public:
+  void varint(std::uint64_t value)
+  {
+    while (value >= 0x80) {
+      m_data.push_back(static_cast<char>((value & 0x7f) | 0x80));
+      value >>= 7;
+    }
+    m_data.push_back(static_cast<char>(value));
+  }
+
+  void key(std::uint32_t id, WireType type)
+  {
+    varint((static_cast<std::uint64_t>(id) << 3) | static_cast<std::uint32_t>(type));
+  }
+
+  void fixed32(std::uint32_t value)
+  {
+    for (int i = 0; i < 4; ++i)
+      m_data.push_back(static_cast<char>(value >> (8 * i)));
+  }
+
+  void fixed64(std::uint64_t value)
+  {
+    for (int i = 0; i < 8; ++i)
+      m_data.push_back(static_cast<char>(value >> (8 * i)));
+  }
+
+  void bytes(const char* data, std::size_t size)
+  {
+    varint(size);
+    m_data.append(data, size);
+  }
+
+  // Starts a length delimited value, returns the position to give to
+  // end_length() after the value is written.
+  std::size_t begin_length()
+  {
+    // One byte is reserved, longer lengths move the value.
+    m_data.push_back(0);
+    return m_data.size();
+  }
+
+  void end_length(std::size_t start)
+  {
+    std::uint64_t length = m_data.size() - start;
+    if (length < 0x80) {
+      m_data[start - 1] = static_cast<char>(length);
+      return;
+    }
+    char prefix[10];
+    std::size_t size = 0;
+    while (length >= 0x80) {
+      prefix[size++] = static_cast<char>((length & 0x7f) | 0x80);
+      length >>= 7;
+    }
+    prefix[size++] = static_cast<char>(length);
+    m_data.replace(start - 1, 1, prefix, size);
+  }
+
+  std::size_t size() const
+  {
+    return m_data.size();
+  }
+
+  // Drops the data written after the size.
+  void truncate(std::size_t size)
+  {
+    m_data.resize(size);
+  }
+
+  const std::string& data() const
+  {
+    return m_data;
+  }
+
+  std::string release()
+  {
+    std::string data;
+    data.swap(m_data);
+    return data;
+  }
+
+private:
+  std::string m_data;
+};
+
+class Reader
+{
+public:
+  Reader(const char* data, std::size_t size)
+    : m_pos(data),
+      m_end(data + size)
+  {
+  }
+
+  explicit Reader(const std::string& data)
+    : Reader(data.data(), data.size())
+  {
+  }
+
+  bool at_end() const
+  {
+    return m_pos == m_end;
+  }
+
+  std::uint64_t varint()
+  {
+    std::uint64_t value = 0;
+    for (int shift = 0; shift < 70; shift += 7) {
+      if (m_pos == m_end)
+        throw std::runtime_error("Truncated varint.");
+      const std::uint8_t byte = static_cast<std::uint8_t>(*m_pos++);
+      value |= static_cast<std::uint64_t>(byte & 0x7f) << shift;
+      if (byte < 0x80)
+        return value;
+    }
+    throw std::runtime_error("Varint too long.");
+  }
+
+  void key(std::uint32_t& id, WireType& type)
+  {
+    const std::uint64_t key = varint();
+    id = static_cast<std::uint32_t>(key >> 3);
+    type = static_cast<WireType>(key & 7);
+  }
+
+  std::uint32_t fixed32()
+  {
+    const char* data = take(4);
+    std::uint32_t value = 0;
+    for (int i = 0; i < 4; ++i)
+      value |= static_cast<std::uint32_t>(static_cast<std::uint8_t>(data[i])) << (8 * i);
+    return value;
+  }
+
+  std::uint64_t fixed64()
+  {
+    const char* data = take(8);
+    std::uint64_t value = 0;
+    for (int i = 0; i < 8; ++i)
+      value |= static_cast<std::uint64_t>(static_cast<std::uint8_t>(data[i])) << (8 * i);
+    return value;
+  }
+
+  // Returns the reader of a length delimited value.
+  Reader sub()
+  {
+    const std::uint64_t length = varint();
+    if (length > static_cast<std::uint64_t>(m_end - m_pos))
+      throw std::runtime_error("Truncated length delimited value.");
+    const char* data = take(static_cast<std::size_t>(length));
+    return Reader(data, static_cast<std::size_t>(length));
+  }
+
+  std::string string()
+  {
+    const Reader value = sub();
+    return std::string(value.m_pos, value.m_end);
+  }
+
+  // Skips the value of an unknown field.
+  void skip(WireType type)
+  {
+    switch (type) {
+    case WireType::Varint:
+      varint();
+      break;
+    case WireType::Fixed64:
+      take(8);
+      break;
+    case WireType::Length:
+      sub();
+      break;
+    case WireType::Fixed32:
+      take(4);
+      break;
+    default:
+      throw std::runtime_error("Unsupported wire type.");
+    }
+  }
+
+private:
+  const char* take(std::size_t size)
+  {
+    if (size > static_cast<std::size_t>(m_end - m_pos))
+      throw std::runtime_error("Truncated value.");
+    const char* data = m_pos;
+    m_pos += size;
+    return data;
+  }
+
+  const char* m_pos;
+  const char* m_end;
+};
+
+inline void expect(WireType type, WireType expected)
+{
+  if (type != expected)
+    throw std::runtime_error("Unexpected wire type of a field.");
+}
+
+// Codecs of the builtin types, the kinds of wireformat.BUILTIN_WIRE_KINDS.
+
+struct SignedCodec
+{
+  static constexpr WireType type = WireType::Varint;
+
+  template <typename T>
+  static void write(Writer& writer, T value) { writer.varint(zigzag(static_cast<std::int64_t>(value))); }
+
+  template <typename T>
+  static void read(Reader& reader, T& value) { value = static_cast<T>(unzigzag(reader.varint())); }
+};
+
+struct UnsignedCodec
+{
+  static constexpr WireType type = WireType::Varint;
+
+  template <typename T>
+  static void write(Writer& writer, T value) { writer.varint(static_cast<std::uint64_t>(value)); }
+
+  template <typename T>
+  static void read(Reader& reader, T& value) { value = static_cast<T>(reader.varint()); }
+};
+
+struct BoolCodec
+{
+  static constexpr WireType type = WireType::Varint;
+
+  static void write(Writer& writer, bool value) { writer.varint(value ? 1 : 0); }
+
+  template <typename T>
+  static void read(Reader& reader, T& value) { value = reader.varint() != 0; }
+};
+
+struct FloatCodec
+{
+  static constexpr WireType type = WireType::Fixed32;
+
+  static void write(Writer& writer, float value)
+  {
+    std::uint32_t bits;
+    std::memcpy(&bits, &value, sizeof(bits));
+    writer.fixed32(bits);
+  }
+
+  static void read(Reader& reader, float& value)
+  {
+    const std::uint32_t bits = reader.fixed32();
+    std::memcpy(&value, &bits, sizeof(bits));
+  }
+};
+
+struct DoubleCodec
+{
+  static constexpr WireType type = WireType::Fixed64;
+
+  static void write(Writer& writer, double value)
+  {
+    std::uint64_t bits;
+    std::memcpy(&bits, &value, sizeof(bits));
+    writer.fixed64(bits);
+  }
+
+  static void read(Reader& reader, double& value)
+  {
+    const std::uint64_t bits = reader.fixed64();
+    std::memcpy(&value, &bits, sizeof(bits));
+  }
+};
+
+struct StringCodec
+{
+  static constexpr WireType type = WireType::Length;
+
+  static void write(Writer& writer, const std::string& value) { writer.bytes(value.data(), value.size()); }
+
+  static void read(Reader& reader, std::string& value) { value = reader.string(); }
+};
+
+template <typename T>
+bool is_default(const T& value)
+{
+  return value == T();
+}
+
+template <typename Codec, typename T>
+void write_field(Writer& writer, std::uint32_t id, const T& value)
+{
+  writer.key(id, Codec::type);
+  Codec::write(writer, value);
+}
+
+template <typename Codec, typename T>
+void read_field(Reader& reader, WireType type, T& value)
+{
+  expect(type, Codec::type);
+  Codec::read(reader, value);
+}
+
+// Writes the items of a repeated numeric or bool field as a single length
+// delimited field.
+template <typename Codec, typename T>
+void write_packed(Writer& writer, std::uint32_t id, const std::vector<T>& values)
+{
+  if (values.empty())
+    return;
+  writer.key(id, WireType::Length);
+  const std::size_t start = writer.begin_length();
+  for (const auto& value : values)
+    Codec::write(writer, static_cast<T>(value));
+  writer.end_length(start);
+}
+
+// Appends an item of a repeated field of a builtin type, or all the items if
+// they are packed.
+template <typename Codec, typename T>
+void read_repeated(Reader& reader, WireType type, std::vector<T>& values)
+{
+  if (type == WireType::Length && Codec::type != WireType::Length) {
+    Reader packed = reader.sub();
+    while (!packed.at_end()) {
+      T value;
+      Codec::read(packed, value);
+      values.push_back(value);
+    }
+    return;
+  }
+  expect(type, Codec::type);
+  T value;
+  Codec::read(reader, value);
+  values.push_back(std::move(value));
+}
+
+template <typename T>
+void write_message(Writer& writer, std::uint32_t id, const T& value)
+{
+  writer.key(id, WireType::Length);
+  const std::size_t start = writer.begin_length();
+  encode(writer, value);
+  writer.end_length(start);
+}
+
+// Writes the message of a value type stored inline unless all its fields
+// have the default values.
+template <typename T>
+void write_value_message(Writer& writer, std::uint32_t id, const T& value)
+{
+  const std::size_t mark = writer.size();
+  writer.key(id, WireType::Length);
+  const std::size_t start = writer.begin_length();
+  encode(writer, value);
+  if (writer.size() == start)
+    writer.truncate(mark);
+  else
+    writer.end_length(start);
+}
+
+template <typename T>
+void read_message(Reader& reader, WireType type, T& value)
+{
+  expect(type, WireType::Length);
+  Reader message = reader.sub();
+  decode(message, value);
+}
+
+template <typename T>
+std::string encode_message(const T& value)
+{
+  Writer writer;
+  encode(writer, value);
+  return writer.release();
+}
+
+template <typename T>
+void decode_message(const std::string& data, T& value)
+{
+  Reader reader(data);
+  decode(reader, value);
+}
+
+}}} // namespace mad::interfaces::wire
@@ -0,0 +1,5 @@
+from .benchmark import *
+from .corpus import CORPORA, CorpusSpec, generate_corpus, get_corpus_spec
+from .cppbench import run_cpp_benchmark
+from .pybench import run_python_benchmark
+from .startup import STARTUP_COMMANDS, run_startup
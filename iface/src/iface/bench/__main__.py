@@ -0,0 +1,59 @@
+from .benchmark import *
+from .corpus import CORPORA, CorpusSpec, generate_corpus, get_corpus_spec
+from .cppbench import DEFAULT_RECORDS
+from .pybench import DEFAULT_PY_RECORDS
+
+if __name__ == "__main__":
+    import argparse
+    import os
+    import sys
+
+    from ..parser import ENGINES
+
+    args_parser = argparse.ArgumentParser(description="Benchmark the parser on synthetic corpora.")
+    args_parser.add_argument("-c", "--corpus", dest="corpora", action="append", default=[], choices=[ spec.name for spec in CORPORA ], help="corpus to run, all by default")
+    args_parser.add_argument("-e", "--engine", dest="engines", action="append", default=[], choices=ENGINES, help="parser engine to run, all by default")
+    args_parser.add_argument("-r", "--repeat", dest="repeat", type=int, default=DEFAULT_REPEAT, help="compilations of every corpus, the best time is taken (default: %(default)s)")
+    args_parser.add_argument("-b", "--baseline", dest="baseline", default="", help="results to compare with, the run fails if a phase is slower by more than the threshold")
+    args_parser.add_argument("-t", "--threshold", dest="threshold", type=float, default=DEFAULT_THRESHOLD, help="allowed slowdown against the baseline as a fraction (default: %(default)s)")
+    args_parser.add_argument("--min-seconds", dest="min_seconds", type=float, default=DEFAULT_MIN_SECONDS, help="slowdowns smaller than this are ignored as noise (default: %(default)s)")
+    args_parser.add_argument("-o", "--output", dest="output", default="", help="file to store the results to, e.g. as a new baseline")
+    args_parser.add_argument("--skip-startup", dest="skip_startup", default=False, action="store_true", help="don't measure the startup of the CLI")
+    args_parser.add_argument("--cpp", dest="cpp", default=False, action="store_true", help="compile and run the benchmark of the generated C++ structs against the MapNode trees")
+    args_parser.add_argument("--cpp-include", dest="cpp_include", default="", help="directory of the C++ headers of the project (default: the one of the source tree)")
+    args_parser.add_argument("--cpp-records", dest="cpp_records", type=int, default=DEFAULT_RECORDS, help="records built and read by the C++ benchmark (default: %(default)s)")
+    args_parser.add_argument("--python-classes", dest="python_classes", default=False, action="store_true", help="run the benchmark of the generated Python classes against dicts")
+    args_parser.add_argument("--python-records", dest="python_records", type=int, default=DEFAULT_PY_RECORDS, help="records built and read by the Python classes benchmark (default: %(default)s)")
+    args_parser.add_argument("--corpus-dir", dest="corpus_dir", default="", help="keep the generated corpora in the directory")
+    args_parser.add_argument("--generate", dest="generate", default="", metavar="DIR", help="only generate the corpora to the directory")
+
+    args = args_parser.parse_args()
+
+    specs = [ get_corpus_spec(name) for name in args.corpora ] if args.corpora else CORPORA
+
+    if args.generate:
+        for spec in specs:
+            main_filepath, include_path, files = generate_corpus(spec, os.path.join(args.generate, spec.name))
+            print("{}: {} files, compile by -I {} {}".format(spec.name, len(files), include_path, main_filepath))
+        sys.exit(0)
+
+    baseline = load_results(args.baseline) if args.baseline else None
+
+    results = run_benchmark(specs, engines=args.engines or ENGINES, repeat=args.repeat, corpus_dir=args.corpus_dir or None,
+            startup=not args.skip_startup,
+            cpp={ "cpp_include_dir": args.cpp_include or None, "records": args.cpp_records } if args.cpp else None,
+            pyclasses={ "records": args.python_records } if args.python_classes else None,
+            log=sys.stdout)
+
+    if args.output:
+        save_results(results, args.output)
+
+    if baseline is not None:
+        regressions = compare_results(results, baseline, args.threshold, args.min_seconds)
+        for corpus_name, engine, phase, baseline_seconds, seconds in regressions:
+            print("REGRESSION {} {} {}: {:.4f} s -> {:.4f} s ({:+.0%})".format(corpus_name, engine, phase,
+                    baseline_seconds, seconds, seconds / baseline_seconds - 1.0))
+        if regressions:
+            sys.exit(1)
+        print("No regressions against '{}'.".format(args.baseline))
+#endif __main__
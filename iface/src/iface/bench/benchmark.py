@@ -0,0 +1,152 @@
+import json
+import os
+import platform
+import tempfile
+import time
+
+from ..parser import CompilationSession, FrontEndBuilder, Profiler, write_class_diagram
+from .corpus import generate_corpus
+from .cppbench import run_cpp_benchmark
+from .pybench import run_python_benchmark
+from .startup import run_startup
+
+# Bump when the format of the results changes.
+RESULTS_FORMAT_VERSION = 1
+
+# Phases of the compilation reported by the benchmark (see Profiler).
+PHASES = [ "parse", "visit", "index", "build", "serialize", "total" ]
+
+DEFAULT_REPEAT = 5
+DEFAULT_THRESHOLD = 0.1
+# Slowdowns smaller than this are taken for noise.
+DEFAULT_MIN_SECONDS = 0.005
+
+def run_compilation(main_filepath, include_path, engine):
+    """
+    Compiles the corpus once and returns the wall time of the phases. The
+    times are the self times of the phases (see Profiler.phase()), e.g.
+    'parse' and 'visit' of the included files count to 'parse' and 'visit',
+    not to 'index'.
+    """
+    profiler = Profiler(trace_memory=False)
+    profiler.start()
+    session = CompilationSession([ include_path ], engine=engine, profiler=profiler)
+    front_end = FrontEndBuilder(session)
+    front_end.process_file(main_filepath)
+    with open(os.devnull, "w") as f:
+        write_class_diagram(front_end.root_builder, f, profiler)
+    profiler.stop()
+
+    report = profiler.report()
+    times = { phase: report["phases"][phase]["self_wall"] for phase in PHASES if phase in report["phases"] }
+    times["total"] = report["total"]["wall"]
+    return times
+#enddef
+
+def run_benchmark(specs, engines=["parsimonious", "fast"], repeat=DEFAULT_REPEAT, corpus_dir=None, startup=True, cpp=None, pyclasses=None, log=None):
+    """
+    Generates every corpus and compiles it 'repeat' times by every engine.
+    Returns the results, the best (minimum) time of every phase per corpus
+    and engine and, if 'startup', of the CLI startup (see run_startup()).
+    The corpora are generated to a temporary directory unless 'corpus_dir'
+    is given. 'cpp' are the keyword arguments of run_cpp_benchmark() to run
+    it too, None not to, 'pyclasses' the ones of run_python_benchmark().
+    """
+    results = {
+        "version": RESULTS_FORMAT_VERSION,
+        "python": platform.python_version(),
+        "time": time.time(),
+        "corpora": {}
+    }
+
+    with tempfile.TemporaryDirectory(prefix="iface-bench-") as tmp_dir:
+        for spec in specs:
+            directory = os.path.join(corpus_dir or tmp_dir, spec.name)
+            main_filepath, include_path, files = generate_corpus(spec, directory)
+            corpus_results = {
+                "spec": spec.to_dict(),
+                "files": len(files),
+                "bytes": sum(os.path.getsize(filepath) for filepath in files),
+                "engines": {}
+            }
+
+            for engine in engines:
+                best = {}
+                for _ in range(repeat):
+                    times = run_compilation(main_filepath, include_path, engine)
+                    for phase, seconds in times.items():
+                        best[phase] = min(best.get(phase, seconds), seconds)
+                corpus_results["engines"][engine] = best
+                if log is not None:
+                    print("{:<12} {:<14} {}".format(spec.name, engine,
+                            "  ".join("{} {:.4f}".format(phase, best[phase]) for phase in PHASES if phase in best)), file=log)
+
+            results["corpora"][spec.name] = corpus_results
+
+    if startup:
+        results["startup"] = run_startup(repeat, log=log)
+
+    if cpp is not None:
+        results["cpp"] = run_cpp_benchmark(repeat=repeat, log=log, **cpp)
+
+    if pyclasses is not None:
+        results["pyclasses"] = run_python_benchmark(repeat=repeat, log=log, **pyclasses)
+
+    return results
+#enddef
+
+def _compare_times(regressions, corpus_name, engine, times, baseline_times, threshold, min_seconds):
+    for phase, seconds in times.items():
+        baseline_seconds = baseline_times.get(phase)
+        if baseline_seconds is not None and seconds > baseline_seconds * (1.0 + threshold) \
+                and seconds - baseline_seconds > min_seconds:
+            regressions.append((corpus_name, engine, phase, baseline_seconds, seconds))
+#enddef
+
+def compare_results(results, baseline, threshold=DEFAULT_THRESHOLD, min_seconds=DEFAULT_MIN_SECONDS):
+    """
+    Returns the regressions of the results against the baseline, a list of
+    (corpus, engine, phase, baseline seconds, seconds) of the phases slower
+    by more than the threshold (a fraction of the baseline time) and by more
+    than 'min_seconds'. Corpora generated by different parameters aren't
+    compared. Regressions of the startup are reported as of the 'startup'
+    corpus and 'cli' engine, the ones of the C++ representations (see
+    run_cpp_benchmark()) as of the 'cpp' corpus and the representation, the
+    same for the Python ones (see run_python_benchmark()) and 'pyclasses'.
+    """
+    regressions = []
+    for corpus_name, corpus_results in results["corpora"].items():
+        baseline_corpus = baseline.get("corpora", {}).get(corpus_name)
+        if baseline_corpus is None or baseline_corpus["spec"] != corpus_results["spec"]:
+            continue
+        for engine, times in corpus_results["engines"].items():
+            _compare_times(regressions, corpus_name, engine, times, baseline_corpus["engines"].get(engine, {}), threshold, min_seconds)
+
+    _compare_times(regressions, "startup", "cli", results.get("startup", {}), baseline.get("startup", {}), threshold, min_seconds)
+
+    for name in ("cpp", "pyclasses"):
+        representations_results = results.get(name)
+        baseline_representations = baseline.get(name)
+        if representations_results is None or baseline_representations is None \
+                or (representations_results["records"], representations_results["samples"]) \
+                != (baseline_representations["records"], baseline_representations["samples"]):
+            continue
+        for representation, times in representations_results["representations"].items():
+            _compare_times(regressions, name, representation, times,
+                    baseline_representations["representations"].get(representation, {}), threshold, min_seconds)
+    return regressions
+#enddef
+
+def load_results(filepath):
+    with open(filepath, "r") as f:
+        results = json.load(f)
+    if results.get("version") != RESULTS_FORMAT_VERSION:
+        raise RuntimeError("Unsupported version of the benchmark results '{}'.".format(filepath))
+    return results
+#enddef
+
+def save_results(results, filepath):
+    with open(filepath, "w") as f:
+        json.dump(results, f, indent=1, sort_keys=True)
+        f.write("\n")
+#enddef
@@ -0,0 +1,182 @@
+import os
+import random
+
+BUILTIN_FIELD_TYPES = [ "int", "int32", "uint", "uint32", "float", "double", "bool", "string" ]
+
+class CorpusSpec(object):
+    """
+    Parameters of a synthetic corpus: the main file with 'namespaces' top
+    level namespaces, each nested 'depth' levels deep, every namespace with
+    'interfaces' interfaces of 'fields' fields and 'using' using directives.
+    The main file includes 'include_fanout' files, each of them includes
+    'include_fanout' files again, up to 'include_depth' levels. Included files
+    have a namespace with the same number of interfaces and using directives.
+    'attr_density' is the probability an entity is given attributes.
+    """
+
+    def __init__(self, name, namespaces=1, depth=1, interfaces=10, fields=5, attr_density=0.2,
+            include_fanout=0, include_depth=0, using=1, seed=0):
+        self.name = name
+        self.namespaces = namespaces
+        self.depth = depth
+        self.interfaces = interfaces
+        self.fields = fields
+        self.attr_density = attr_density
+        self.include_fanout = include_fanout
+        self.include_depth = include_depth
+        self.using = using
+        self.seed = seed
+    #enddef
+
+    def to_dict(self):
+        return dict(self.__dict__)
+    #enddef
+
+#endclass
+
+# Corpora the benchmark runs by default.
+CORPORA = [
+    CorpusSpec("small", namespaces=2, depth=2, interfaces=10, fields=5),
+    CorpusSpec("wide", namespaces=20, depth=1, interfaces=50, fields=10),
+    CorpusSpec("deep", namespaces=2, depth=30, interfaces=5, fields=5),
+    CorpusSpec("fields", namespaces=1, depth=1, interfaces=20, fields=500),
+    CorpusSpec("attributes", namespaces=4, depth=2, interfaces=20, fields=10, attr_density=1.0),
+    CorpusSpec("includes", namespaces=2, depth=2, interfaces=10, fields=5, include_fanout=3, include_depth=3, using=3),
+]
+
+def get_corpus_spec(name):
+    for spec in CORPORA:
+        if spec.name == name:
+            return spec
+    raise RuntimeError("Unknown corpus '{}'.".format(name))
+#enddef
+
+class _CorpusWriter(object):
+
+    def __init__(self, spec):
+        self._spec = spec
+        self._random = random.Random(spec.seed)
+    #enddef
+
+    def _attrs(self, indent):
+        if self._random.random() >= self._spec.attr_density:
+            return ""
+        attrs = self._random.choice([
+            [ "@deprecated" ],
+            [ "@doc(\"Generated entity.\")" ],
+            [ "@meta.order({})".format(self._random.randrange(100)) ],
+            # The grammar takes the integer part of a float for an int value,
+            # so floats are written without it.
+            [ "@meta.weight(.{})".format(self._random.randrange(100)), "@meta.visible(true)" ]
+        ])
+        return "".join(indent + attr + "\n" for attr in attrs)
+    #enddef
+
+    def _namespace_content(self, lines, indent, ns_name, external_types):
+        """
+        Writes the using directives and interfaces of a namespace. Fields
+        refer to the builtins, the external types (full names), the types
+        declared in the namespace and the preceding interfaces (relative
+        names).
+        """
+        local_types = []
+        for i in range(self._spec.using):
+            type_name = "{}_Handle{}".format(ns_name, i)
+            lines.append(indent + "@treatment(\"{}\")".format("value_type" if i % 2 == 0 else "reference_type"))
+            lines.append(indent + "using {};".format(type_name))
+            local_types.append(type_name)
+
+        for i in range(self._spec.interfaces):
+            interface_name = "{}_I{}".format(ns_name, i)
+            base = ""
+            if i > 0 and self._random.random() < 0.2:
+                base = " : {}_I{}".format(ns_name, self._random.randrange(i))
+
+            lines.append(self._attrs(indent) + indent + "interface {}{} {{".format(interface_name, base))
+            for j in range(self._spec.fields):
+                candidates = self._random.choice([ BUILTIN_FIELD_TYPES, local_types, external_types ]) \
+                        or BUILTIN_FIELD_TYPES
+                field_type = self._random.choice(candidates)
+                repeated = "[]" if self._random.random() < 0.2 else ""
+                ref = "ref " if self._random.random() < 0.1 else ""
+                # The ids are unique in the namespace, so they don't collide
+                # with the ones of the bases.
+                field_id = i * self._spec.fields + j + 1
+                lines.append(self._attrs(indent + "  ") + indent + "  {}{}{} f{} = {};".format(ref, field_type, repeated, j, field_id))
+            lines.append(indent + "}")
+
+            local_types.append(interface_name)
+        return local_types
+    #enddef
+
+    def _include_file(self, directory, level, index, files):
+        """
+        Writes the included file and the ones it includes. Returns file name
+        of the file and full names of the types of all of them.
+        """
+        filename = "inc_{}_{}.iface".format(level, index)
+        ns_name = "inc_{}_{}".format(level, index)
+
+        lines = []
+        external_types = []
+        if level < self._spec.include_depth:
+            for i in range(self._spec.include_fanout):
+                included, included_types = self._include_file(directory, level + 1, index * self._spec.include_fanout + i, files)
+                lines.append("include \"{}\"".format(included))
+                external_types.extend(included_types)
+
+        lines.append("namespace {} {{".format(ns_name))
+        local_types = self._namespace_content(lines, "  ", ns_name, external_types)
+        lines.append("}")
+
+        filepath = os.path.join(directory, filename)
+        with open(filepath, "w") as f:
+            f.write("\n".join(lines) + "\n")
+        files.append(filepath)
+
+        return filename, [ ns_name + "." + type_name for type_name in local_types ] + external_types
+    #enddef
+
+    def write(self, directory):
+        include_dir = os.path.join(directory, "include")
+        os.makedirs(include_dir, exist_ok=True)
+
+        files = []
+        lines = []
+        external_types = []
+        if self._spec.include_depth > 0:
+            for i in range(self._spec.include_fanout):
+                included, included_types = self._include_file(include_dir, 1, i, files)
+                lines.append("include \"{}\"".format(included))
+                external_types.extend(included_types)
+
+        def namespace(ns_path, level):
+            indent = "  " * level
+            ns_name = ns_path[-1]
+            lines.append(self._attrs(indent) + indent + "namespace {} {{".format(ns_name))
+            self._namespace_content(lines, indent + "  ", "_".join(ns_path), external_types)
+            if level + 1 < self._spec.depth:
+                namespace(ns_path + [ "n{}".format(level + 1) ], level + 1)
+            lines.append(indent + "}")
+        #enddef
+
+        for i in range(self._spec.namespaces):
+            namespace([ "ns{}".format(i) ], 0)
+
+        main_filepath = os.path.join(directory, "main.iface")
+        with open(main_filepath, "w") as f:
+            f.write("\n".join(lines) + "\n")
+        files.append(main_filepath)
+
+        return main_filepath, include_dir, files
+    #enddef
+
+#endclass
+
+def generate_corpus(spec, directory):
+    """
+    Writes the corpus to the directory. Returns path of the main file, the
+    include path and paths of all the written files.
+    """
+    return _CorpusWriter(spec).write(directory)
+#enddef
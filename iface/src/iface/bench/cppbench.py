@@ -0,0 +1,224 @@
+import json
+import os
+import subprocess
+import tempfile
+
+DEFAULT_RECORDS = 100000
+DEFAULT_SAMPLES = 8
+
+# Schema of the benchmarked records, the generated structs are compared with
+# the same data held by MapNode trees (and the Python classes with dicts, see
+# pybench).
+RECORDS_SCHEMA = """
+namespace bench {
+
+@treatment("value_type")
+interface Point {
+  double x = 1;
+  double y = 2;
+}
+
+interface Record {
+  int id = 1;
+  double weight = 2;
+  bool flag = 3;
+  string name = 4;
+  Point position = 5;
+  int[] samples = 6;
+}
+
+}
+"""
+
+_BENCHMARK_SOURCE = r"""
+#include "records.hpp"
+
+#include <mad/interfaces/tree.hpp>
+
+#include <algorithm>
+#include <chrono>
+#include <cstdio>
+#include <cstdlib>
+#include <memory>
+#include <string>
+#include <vector>
+
+namespace tree = mad::interfaces::tree;
+
+template <typename T>
+struct ValueNode : public virtual tree::Node
+{
+  explicit ValueNode(T v) : value(std::move(v)) {}
+  T value;
+};
+
+template <typename T>
+const T& get(const tree::MapNode& node, const std::string& key)
+{
+  return dynamic_cast<const ValueNode<T>&>(node.find(key)->value()).value;
+}
+
+template <typename T>
+void set(tree::MapNode& node, const std::string& key, T value)
+{
+  node.insert(key, std::unique_ptr<tree::Node>(new ValueNode<T>(std::move(value))));
+}
+
+static const std::string ID = "id", WEIGHT = "weight", FLAG = "flag", NAME = "name",
+    POSITION = "position", X = "x", Y = "y", SAMPLES = "samples";
+
+static double seconds_since(std::chrono::steady_clock::time_point start)
+{
+  return std::chrono::duration<double>(std::chrono::steady_clock::now() - start).count();
+}
+
+static std::vector<bench::Record> build_structs(int records, int samples)
+{
+  std::vector<bench::Record> result(records);
+  for (int i = 0; i < records; ++i) {
+    bench::Record& record = result[i];
+    record.id = i;
+    record.weight = i * 0.5;
+    record.flag = i % 2 == 0;
+    record.name = "record";
+    record.position.x = i;
+    record.position.y = -i;
+    for (int j = 0; j < samples; ++j)
+      record.samples.push_back(i + j);
+  }
+  return result;
+}
+
+static double read_structs(const std::vector<bench::Record>& records)
+{
+  double sum = 0;
+  for (const bench::Record& record : records) {
+    sum += record.id + record.weight + (record.flag ? 1 : 0) + record.name.size() + record.position.x + record.position.y;
+    for (int sample : record.samples)
+      sum += sample;
+  }
+  return sum;
+}
+
+static std::vector<tree::MapNode> build_maps(int records, int samples)
+{
+  std::vector<tree::MapNode> result(records);
+  for (int i = 0; i < records; ++i) {
+    tree::MapNode& record = result[i];
+    set(record, ID, i);
+    set(record, WEIGHT, i * 0.5);
+    set(record, FLAG, i % 2 == 0);
+    set(record, NAME, std::string("record"));
+    std::unique_ptr<tree::MapNode> position(new tree::MapNode());
+    set(*position, X, double(i));
+    set(*position, Y, double(-i));
+    record.insert(POSITION, std::move(position));
+    std::unique_ptr<tree::ListNode> list(new tree::ListNode());
+    for (int j = 0; j < samples; ++j)
+      list->add(std::unique_ptr<tree::Node>(new ValueNode<int>(i + j)));
+    record.insert(SAMPLES, std::move(list));
+  }
+  return result;
+}
+
+static double read_maps(const std::vector<tree::MapNode>& records)
+{
+  double sum = 0;
+  for (const tree::MapNode& record : records) {
+    const tree::MapNode& position = dynamic_cast<const tree::MapNode&>(record.find(POSITION)->value());
+    sum += get<int>(record, ID) + get<double>(record, WEIGHT) + (get<bool>(record, FLAG) ? 1 : 0)
+        + get<std::string>(record, NAME).size() + get<double>(position, X) + get<double>(position, Y);
+    const tree::ListNode& list = dynamic_cast<const tree::ListNode&>(record.find(SAMPLES)->value());
+    for (size_t j = 0; j < list.size(); ++j)
+      sum += dynamic_cast<const ValueNode<int>&>(list[j]).value;
+  }
+  return sum;
+}
+
+int main(int argc, char* argv[])
+{
+  const int records = std::atoi(argv[1]);
+  const int samples = std::atoi(argv[2]);
+  const int repeat = std::atoi(argv[3]);
+
+  double best[4] = { 1e9, 1e9, 1e9, 1e9 };
+  double checksums[2] = { 0, 0 };
+  for (int r = 0; r < repeat; ++r) {
+    auto start = std::chrono::steady_clock::now();
+    std::vector<bench::Record> structs = build_structs(records, samples);
+    best[0] = std::min(best[0], seconds_since(start));
+    start = std::chrono::steady_clock::now();
+    checksums[0] = read_structs(structs);
+    best[1] = std::min(best[1], seconds_since(start));
+
+    start = std::chrono::steady_clock::now();
+    std::vector<tree::MapNode> maps = build_maps(records, samples);
+    best[2] = std::min(best[2], seconds_since(start));
+    start = std::chrono::steady_clock::now();
+    checksums[1] = read_maps(maps);
+    best[3] = std::min(best[3], seconds_since(start));
+  }
+
+  std::printf("{\"structs\": {\"build\": %.9f, \"read\": %.9f, \"checksum\": %.1f}, "
+              "\"mapnode\": {\"build\": %.9f, \"read\": %.9f, \"checksum\": %.1f}}\n",
+              best[0], best[1], checksums[0], best[2], best[3], checksums[1]);
+  return 0;
+}
+"""
+
+def default_cpp_include_dir():
+    """
+    Returns the directory of the C++ headers of the project in the source
+    tree or None if it isn't there.
+    """
+    source_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    include_dir = os.path.join(source_dir, os.pardir, os.pardir, "cpp", "include")
+    return os.path.normpath(include_dir) if os.path.isdir(include_dir) else None
+#enddef
+
+def run_cpp_benchmark(cpp_include_dir=None, compiler=None, records=DEFAULT_RECORDS, samples=DEFAULT_SAMPLES, repeat=5, log=None):
+    """
+    Generates the structs of the benchmark schema by the C++ generator,
+    compiles a program building and reading the records both as the structs
+    and as MapNode trees and runs it. Returns the best times of the 'build'
+    and 'read' phases per representation ('structs' and 'mapnode').
+    """
+    from ..generator import generate_cpp_header, load_schema
+    from ..parser import CompilationSession, compile_files
+
+    cpp_include_dir = cpp_include_dir or default_cpp_include_dir()
+    if not cpp_include_dir:
+        raise RuntimeError("The C++ headers of the project weren't found, give their directory.")
+    compiler = compiler or os.environ.get("CXX") or "c++"
+
+    with tempfile.TemporaryDirectory(prefix="iface-cppbench-") as tmp_dir:
+        schema_filepath = os.path.join(tmp_dir, "records.iface")
+        with open(schema_filepath, "w") as f:
+            f.write(RECORDS_SCHEMA)
+        schema = load_schema(compile_files(CompilationSession(), [ schema_filepath ]).build())
+        with open(os.path.join(tmp_dir, "records.hpp"), "w") as f:
+            generate_cpp_header(schema, f)
+
+        source_filepath = os.path.join(tmp_dir, "benchmark.cpp")
+        with open(source_filepath, "w") as f:
+            f.write(_BENCHMARK_SOURCE)
+        executable = os.path.join(tmp_dir, "benchmark")
+        subprocess.run([ compiler, "-O2", "-std=c++17", "-Wno-deprecated-declarations",
+                "-I", tmp_dir, "-I", cpp_include_dir, source_filepath, "-o", executable ], check=True)
+
+        output = subprocess.run([ executable, str(records), str(samples), str(repeat) ],
+                check=True, stdout=subprocess.PIPE, universal_newlines=True).stdout
+
+    representations = json.loads(output)
+    if representations["structs"].pop("checksum") != representations["mapnode"].pop("checksum"):
+        raise RuntimeError("The representations of the records differ.")
+
+    if log is not None:
+        for name, times in representations.items():
+            print("{:<12} {:<14} {}".format("cpp", name, "  ".join("{} {:.4f}".format(phase, seconds) for phase, seconds in times.items())), file=log)
+        print("{:<12} {:<14} build x{:.1f}  read x{:.1f}".format("cpp", "speedup",
+                representations["mapnode"]["build"] / representations["structs"]["build"],
+                representations["mapnode"]["read"] / representations["structs"]["read"]), file=log)
+
+    return { "records": records, "samples": samples, "representations": representations }
+#enddef
@@ -0,0 +1,165 @@
+import importlib.util
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+from .cppbench import DEFAULT_SAMPLES, RECORDS_SCHEMA
+
+DEFAULT_PY_RECORDS = 100000
+
+# Phases timed per representation.
+PY_PHASES = [ "build", "read", "encode", "decode" ]
+
+def _build_dicts(module, records, samples):
+    return [ { "id": i, "weight": i * 0.5, "flag": i % 2 == 0, "name": "record",
+               "position": { "x": float(i), "y": float(-i) }, "samples": [ i + j for j in range(samples) ] }
+             for i in range(records) ]
+#enddef
+
+def _read_dicts(records):
+    total = 0.0
+    for record in records:
+        position = record["position"]
+        total += record["id"] + record["weight"] + (1 if record["flag"] else 0) + len(record["name"]) + position["x"] + position["y"]
+        total += sum(record["samples"])
+    return total
+#enddef
+
+def _encode_dicts(module, records):
+    return json.dumps(records).encode("utf-8")
+#enddef
+
+def _decode_dicts(module, data):
+    return json.loads(data)
+#enddef
+
+def _build_classes(module, records, samples):
+    Record = module.Record
+    Point = module.Point
+    return [ Record(id=i, weight=i * 0.5, flag=i % 2 == 0, name="record",
+                    position=Point(x=float(i), y=float(-i)), samples=[ i + j for j in range(samples) ])
+             for i in range(records) ]
+#enddef
+
+def _read_classes(records):
+    total = 0.0
+    for record in records:
+        position = record.position
+        total += record.id + record.weight + (1 if record.flag else 0) + len(record.name) + position.x + position.y
+        total += sum(record.samples)
+    return total
+#enddef
+
+def _encode_classes(module, records):
+    return module.encode_many(records)
+#enddef
+
+def _decode_classes(module, data):
+    return module.decode_many(module.Record, data)
+#enddef
+
+# Representation -> (build, read, encode, decode).
+_REPRESENTATIONS = {
+    "classes": (_build_classes, _read_classes, _encode_classes, _decode_classes),
+    "dicts": (_build_dicts, _read_dicts, _encode_dicts, _decode_dicts),
+}
+
+def _load_records_module(directory):
+    """
+    Generates the classes of the benchmark schema with their wire codecs and
+    imports the module.
+    """
+    from ..generator import generate_python, load_schema
+    from ..parser import CompilationSession, compile_files
+
+    schema_filepath = os.path.join(directory, "records.iface")
+    with open(schema_filepath, "w") as f:
+        f.write(RECORDS_SCHEMA)
+    schema = load_schema(compile_files(CompilationSession(), [ schema_filepath ]).build())
+    module_filepath = os.path.join(directory, "records.py")
+    with open(module_filepath, "w") as f:
+        generate_python(schema, f)
+
+    spec = importlib.util.spec_from_file_location("iface_bench_records", module_filepath)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+#enddef
+
+def _measure_memory(build, module, records, samples):
+    # Bytes allocated by building the records, kept alive until measured.
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        objects = build(module, records, samples)
+        size = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+    del objects
+    return size
+#enddef
+
+def run_python_benchmark(records=DEFAULT_PY_RECORDS, samples=DEFAULT_SAMPLES, repeat=5, log=None):
+    """
+    Generates the Python classes of the benchmark schema and compares them
+    with dicts of the same records as loaded from JSON. Returns the best
+    times of the 'build', 'read', 'encode' and 'decode' phases per
+    representation ('classes' and 'dicts'), the memory of the built records
+    and the size of the encoded ones (the wire format against JSON).
+    """
+    with tempfile.TemporaryDirectory(prefix="iface-pybench-") as tmp_dir:
+        module = _load_records_module(tmp_dir)
+
+    representations = {}
+    memory = {}
+    encoded_bytes = {}
+    checksums = {}
+    for name, (build, read, encode, decode) in _REPRESENTATIONS.items():
+        best = {}
+        for _ in range(repeat):
+            times = {}
+            start = time.perf_counter()
+            objects = build(module, records, samples)
+            times["build"] = time.perf_counter() - start
+
+            start = time.perf_counter()
+            checksum = read(objects)
+            times["read"] = time.perf_counter() - start
+
+            start = time.perf_counter()
+            data = encode(module, objects)
+            times["encode"] = time.perf_counter() - start
+
+            del objects
+            start = time.perf_counter()
+            decoded = decode(module, data)
+            times["decode"] = time.perf_counter() - start
+
+            if read(decoded) != checksum:
+                raise RuntimeError("The decoded records of the {} differ.".format(name))
+            del decoded
+            for phase, seconds in times.items():
+                best[phase] = min(best.get(phase, seconds), seconds)
+
+        representations[name] = best
+        memory[name] = _measure_memory(build, module, records, samples)
+        encoded_bytes[name] = len(data)
+        checksums[name] = checksum
+
+    if checksums["classes"] != checksums["dicts"]:
+        raise RuntimeError("The representations of the records differ.")
+
+    if log is not None:
+        for name, times in representations.items():
+            print("{:<12} {:<14} {}  memory {:.1f} MB  encoded {:.1f} MB".format("python", name,
+                    "  ".join("{} {:.4f}".format(phase, times[phase]) for phase in PY_PHASES),
+                    memory[name] / 1e6, encoded_bytes[name] / 1e6), file=log)
+        print("{:<12} {:<14} {}  memory x{:.1f}".format("python", "speedup",
+                "  ".join("{} x{:.1f}".format(phase, representations["dicts"][phase] / representations["classes"][phase]) for phase in PY_PHASES),
+                memory["dicts"] / memory["classes"]), file=log)
+
+    return { "records": records, "samples": samples, "representations": representations,
+             "memory": memory, "encoded_bytes": encoded_bytes }
+#enddef
@@ -0,0 +1,67 @@
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+_TINY_INPUT = """namespace bench {
+  interface Tiny {
+    int a = 1;
+  }
+}
+"""
+
+# Directory to put on the PYTHONPATH of the measured processes.
+_SOURCE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Startup measurements, run as 'python ARGS'. '{input}' is replaced by path
+# of a tiny input file. The parse cache is off, so the compilations parse.
+STARTUP_COMMANDS = [
+    ("import", [ "-c", "import iface.parser" ]),
+    ("help", [ "-m", "iface.parser", "--help" ]),
+    ("compile_fast", [ "-m", "iface.parser", "--cache-dir", "", "-e", "fast", "{input}" ]),
+    ("compile_parsimonious", [ "-m", "iface.parser", "--cache-dir", "", "-e", "parsimonious", "{input}" ]),
+]
+
+def _run(args, grammar_cache_dir):
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join([ _SOURCE_DIR ] + ([ env["PYTHONPATH"] ] if env.get("PYTHONPATH") else []))
+    # Directory of the compiled grammar cache (see cache.load_grammar()).
+    env["IFACE_CACHE_DIR"] = grammar_cache_dir
+
+    start = time.perf_counter()
+    subprocess.run([ sys.executable ] + args, env=env, check=True, stdout=subprocess.DEVNULL)
+    return time.perf_counter() - start
+#enddef
+
+def run_startup(repeat, log=None):
+    """
+    Measures the startup of the CLI in fresh processes, the best of 'repeat'
+    runs of every command of STARTUP_COMMANDS. The compilations run with the
+    compiled grammar cached, 'compile_parsimonious_cold' compiles the grammar
+    every time. Returns the name -> seconds of the measurements.
+    """
+    times = {}
+    with tempfile.TemporaryDirectory(prefix="iface-startup-") as tmp_dir:
+        input_filepath = os.path.join(tmp_dir, "tiny.iface")
+        with open(input_filepath, "w") as f:
+            f.write(_TINY_INPUT)
+        grammar_cache_dir = os.path.join(tmp_dir, "cache")
+
+        commands = [ (name, [ arg.format(input=input_filepath) for arg in args ]) for name, args in STARTUP_COMMANDS ]
+        # Warm up the compiled grammar cache.
+        _run(commands[-1][1], grammar_cache_dir)
+
+        for name, args in commands:
+            times[name] = min(_run(args, grammar_cache_dir) for _ in range(repeat))
+
+        cold_times = []
+        for i in range(repeat):
+            cold_times.append(_run(commands[-1][1], os.path.join(tmp_dir, "cold{}".format(i))))
+        times["compile_parsimonious_cold"] = min(cold_times)
+
+    if log is not None:
+        print("{:<12} {:<14} {}".format("startup", "cli",
+                "  ".join("{} {:.4f}".format(name, seconds) for name, seconds in times.items())), file=log)
+    return times
+#enddef
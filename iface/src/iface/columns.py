@@ -0,0 +1,43 @@
+"""
+Runtime of the columns of the Python classes generated by iface.generator,
+the repeated fields of the numeric and bool types are stored in contiguous
+array.array buffers. The buffers are exported without copying, e.g. by
+memoryview() or as_numpy(), and extended in bulk by extend() or frombytes().
+"""
+
+import array
+
+# Builtin type -> typecode of its array.
+COLUMN_TYPECODES = {
+    "int": "i",
+    "int32": "i",
+    "uint": "I",
+    "uint32": "I",
+    "float": "f",
+    "double": "d",
+    "bool": "B",
+}
+
+def column(typecode, values=None):
+    """
+    Returns the array of the typecode with the values, the values themselves
+    if they are already such an array.
+    """
+    if values is None:
+        return array.array(typecode)
+    if isinstance(values, array.array) and values.typecode == typecode:
+        return values
+    return array.array(typecode, values)
+#enddef
+
+def as_numpy(values):
+    """
+    Returns the NumPy array sharing the buffer of the column, the column can't
+    be resized while it exists.
+    """
+    try:
+        import numpy
+    except ImportError:
+        raise RuntimeError("NumPy is needed to view the columns as NumPy arrays.")
+    return numpy.frombuffer(values, dtype=values.typecode)
+#enddef
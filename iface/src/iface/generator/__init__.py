@@ -0,0 +1,4 @@
+from .model import *
+from .cpp import CppStructGenerator, generate_cpp_header
+from .cppwire import CppWireGenerator, generate_cpp_wire_header
+from .python import PythonGenerator, generate_python
@@ -0,0 +1,47 @@
+from .model import *
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    args_parser = argparse.ArgumentParser(description="Generate code from the class diagram of the input.")
+    args_parser.add_argument("-g", "--generator", dest="generator", default="cpp", choices=["cpp", "cpp-wire", "python", "python-wire"],
+            help="'cpp' generates a header with plain C++ structs, 'cpp-wire' a header with their wire codecs (give the header of the structs by --include), 'python' a Python module with __slots__ classes, 'python-wire' the classes with their wire codecs (default: cpp)")
+    args_parser.add_argument("-o", "--output", dest="output", default="", help="output file or empty (default) for stdout")
+    args_parser.add_argument("-I", "--includepath", dest="include_paths", action="append", default=[], help="paths where to look for included files")
+    args_parser.add_argument("--diagram", dest="diagram", default="", help="class diagram written by the parser (JSON or binary) to generate from instead of the input files")
+    args_parser.add_argument("--namespace", dest="namespace", default="", help="C++ namespace to put the generated code to, e.g. 'mad::generated'")
+    args_parser.add_argument("--include", dest="includes", action="append", default=[], help="header to include by the generated C++ code, e.g. of the types of the included files")
+    args_parser.add_argument("input_files", metavar="INPUT_FILE", nargs="*")
+
+    args = args_parser.parse_args()
+
+    if args.diagram:
+        if args.input_files:
+            args_parser.error("either the input files or the class diagram can be given")
+        schema = load_schema_file(args.diagram)
+    else:
+        if not args.input_files:
+            args_parser.error("no input files")
+        from ..parser import CompilationSession, compile_files
+        session = CompilationSession(args.include_paths)
+        schema = load_schema(compile_files(session, args.input_files).build())
+
+    namespace = [ name for name in args.namespace.split("::") if name ]
+
+    if args.generator in ("python", "python-wire"):
+        from .python import generate_python
+        generate = lambda f: generate_python(schema, f, wire=args.generator == "python-wire")
+    elif args.generator == "cpp-wire":
+        from .cppwire import generate_cpp_wire_header
+        generate = lambda f: generate_cpp_wire_header(schema, f, namespace=namespace, includes=args.includes)
+    else:
+        from .cpp import generate_cpp_header
+        generate = lambda f: generate_cpp_header(schema, f, namespace=namespace, includes=args.includes)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            generate(f)
+    else:
+        generate(sys.stdout)
+#endif __main__
@@ -0,0 +1,243 @@
+"""
+C++ backend generating plain structs from the class diagram, an alternative
+to the dynamic mad::interfaces::tree::MapNode trees. Fields of the builtin and
+value types (see TREATMENT_VALUE_TYPE) are stored inline, fields of the other
+types are owned by std::unique_ptr, 'ref' fields are non-owning pointers and
+repeated fields are std::vector. The repeated fields of the interfaces with
+the columnar layout (see SchemaModel.is_columnar()) are struct of arrays,
+<struct>Columns with a std::vector per field. Repeated bools are stored as
+std::vector<std::uint8_t>, std::vector<bool> has no contiguous storage nor
+references to its items. The base of an interface is the base class of its
+struct.
+"""
+
+# C++ type of every builtin type of the parser (see BUILTIN_TYPES).
+CPP_BUILTIN_TYPES = {
+    "int": "int",
+    "int32": "std::int32_t",
+    "uint": "unsigned int",
+    "uint32": "std::uint32_t",
+    "float": "float",
+    "double": "double",
+    "bool": "bool",
+    "string": "std::string",
+}
+
+_CPP_KEYWORDS = frozenset("""
+alignas alignof and and_eq asm auto bitand bitor bool break case catch char char8_t char16_t char32_t class
+compl concept const consteval constexpr constinit const_cast continue co_await co_return co_yield decltype
+default delete do double dynamic_cast else enum explicit export extern false float for friend goto if inline
+int long mutable namespace new noexcept not not_eq nullptr operator or or_eq private protected public
+register reinterpret_cast requires return short signed sizeof static static_assert static_cast struct
+switch template this thread_local throw true try typedef typeid typename union unsigned using virtual void
+volatile wchar_t while xor xor_eq
+""".split())
+
+# Methods of the struct of arrays.
+_COLUMNS_RESERVED_NAMES = frozenset([ "size", "empty", "reserve", "clear", "push_back", "append" ])
+
+def vector_type(item_type):
+    """
+    Returns the std::vector of the C++ item type.
+    """
+    return "std::vector<{}>".format("std::uint8_t" if item_type == "bool" else item_type)
+#enddef
+
+def cpp_identifier(name):
+    """
+    Returns the name usable as a C++ identifier, keywords get a trailing
+    underscore.
+    """
+    return name + "_" if name in _CPP_KEYWORDS else name
+#enddef
+
+class CppStructGenerator(object):
+    """
+    Generates a header with the structs of the schema (see SchemaModel). The
+    types the diagram refers to but doesn't define, e.g. the ones of the
+    included files, are expected to come from the 'includes', the structs
+    can be put to the 'namespace' (a list of names).
+    """
+
+    def __init__(self, schema, namespace=[], includes=[]):
+        self._schema = schema
+        self._namespace = [ cpp_identifier(name) for name in namespace ]
+        self._includes = list(includes)
+        self._columnar_types = schema.columnar_types()
+    #enddef
+
+    def qualified_name(self, full_type):
+        """
+        Returns the C++ name of the type given by its full name.
+        """
+        builtin = CPP_BUILTIN_TYPES.get(full_type)
+        if builtin is not None:
+            return builtin
+        return "::" + "::".join(self._namespace + [ cpp_identifier(name) for name in full_type.split(".") ])
+    #enddef
+
+    def columns_name(self, full_type):
+        """
+        Returns the C++ name of the struct of arrays of the type.
+        """
+        return self.qualified_name(full_type) + "Columns"
+    #enddef
+
+    def field_type(self, field, struct=None):
+        """
+        Returns the C++ type of the field of the struct and whether it's
+        stored inline.
+        """
+        if struct is not None and self._schema.is_columnar(struct, field):
+            return self.columns_name(field.full_type), True
+        item_type = self.qualified_name(field.full_type)
+        inline = False
+        if field.is_ref:
+            item_type += "*"
+        elif field.is_builtin or field.is_value_type:
+            inline = True
+        else:
+            item_type = "std::unique_ptr<{}>".format(item_type)
+
+        if field.is_repeated:
+            return vector_type(item_type), False
+        return item_type, inline
+    #enddef
+
+    def _field_declaration(self, struct, field):
+        field_type, inline = self.field_type(field, struct)
+        name = cpp_identifier(field.name)
+        if inline:
+            # Value initialized, builtins aren't left uninitialized.
+            return "{} {}{{}};".format(field_type, name)
+        if field.is_ref and not field.is_repeated:
+            return "{} {} = nullptr;".format(field_type, name)
+        return "{} {};".format(field_type, name)
+    #enddef
+
+    def namespace_names(self, struct):
+        """
+        Returns the C++ namespaces of the struct.
+        """
+        return self._namespace + [ cpp_identifier(name) for name in struct.namespace ]
+    #enddef
+
+    def _write_namespaced(self, lines, structs, write_struct):
+        # Consecutive structs of a namespace share the namespace block.
+        opened = None
+        for struct in structs:
+            names = self.namespace_names(struct)
+            if names != opened:
+                if opened:
+                    lines.append("")
+                    lines.append("}" * len(opened) + " // namespace " + "::".join(opened))
+                lines.append("")
+                if names:
+                    lines.append(" ".join("namespace {} {{".format(name) for name in names))
+                    lines.append("")
+                opened = names
+            else:
+                lines.append("")
+            write_struct(lines, struct)
+        if opened:
+            lines.append("")
+            lines.append("}" * len(opened) + " // namespace " + "::".join(opened))
+    #enddef
+
+    def _struct(self, lines, struct):
+        lines.append("struct {}{}".format(cpp_identifier(struct.name),
+                " : public {}".format(self.qualified_name(struct.base)) if struct.base else ""))
+        lines.append("{")
+        for field in struct.fields:
+            lines.append("  " + self._field_declaration(struct, field))
+        lines.append("};")
+        if struct.full_name in self._columnar_types:
+            lines.append("")
+            self._columns_struct(lines, struct)
+    #enddef
+
+    def _columns_struct(self, lines, struct):
+        if self._schema.struct(struct.full_name + "Columns") is not None:
+            raise RuntimeError("Struct of arrays of '{0}' collides with interface '{0}Columns'.".format(struct.full_name))
+        fields = self._schema.column_fields(struct.full_name)
+        item_type = self.qualified_name(struct.full_name)
+        columns = [ cpp_identifier(field.name) + ("_" if field.name in _COLUMNS_RESERVED_NAMES else "") for field in fields ]
+        members = [ cpp_identifier(field.name) for field in fields ]
+
+        lines.append("struct {}Columns".format(cpp_identifier(struct.name)))
+        lines.append("{")
+        for field, column in zip(fields, columns):
+            lines.append("  {} {};".format(vector_type(self.qualified_name(field.full_type)), column))
+        lines.append("")
+        lines.append("  std::size_t size() const {{ return {}.size(); }}".format(columns[0]))
+        lines.append("  bool empty() const {{ return {}.empty(); }}".format(columns[0]))
+        lines.append("  void reserve(std::size_t count) {{ {} }}".format(" ".join("{}.reserve(count);".format(column) for column in columns)))
+        lines.append("  void clear() {{ {} }}".format(" ".join("{}.clear();".format(column) for column in columns)))
+        lines.append("")
+        lines.append("  void push_back(const {}& item)".format(item_type))
+        lines.append("  {")
+        for column, member in zip(columns, members):
+            lines.append("    {}.push_back(item.{});".format(column, member))
+        lines.append("  }")
+        lines.append("")
+        lines.append("  void append(const {}Columns& other)".format(cpp_identifier(struct.name)))
+        lines.append("  {")
+        for column in columns:
+            lines.append("    {0}.insert({0}.end(), other.{0}.begin(), other.{0}.end());".format(column))
+        lines.append("  }")
+        lines.append("")
+        lines.append("  {} operator[](std::size_t index) const".format(item_type))
+        lines.append("  {")
+        lines.append("    {} item;".format(item_type))
+        for column, member in zip(columns, members):
+            lines.append("    item.{} = {}[index];".format(member, column))
+        lines.append("    return item;")
+        lines.append("  }")
+        lines.append("};")
+    #enddef
+
+    def generate(self):
+        """
+        Returns the content of the header.
+        """
+        lines = [
+            "// Generated by iface.generator, do not edit.",
+            "#pragma once",
+            "",
+            "#include <cstddef>",
+            "#include <cstdint>",
+            "#include <memory>",
+            "#include <string>",
+            "#include <vector>",
+        ]
+        if self._includes:
+            lines.append("")
+            lines.extend("#include \"{}\"".format(include) for include in self._includes)
+
+        structs = self._schema.ordered_structs()
+
+        # The structs can refer to each other by pointers in any order.
+        if structs:
+            lines.append("")
+        for struct in structs:
+            names = self.namespace_names(struct)
+            declaration = "struct {};".format(cpp_identifier(struct.name))
+            lines.append(" ".join([ "namespace {} {{".format(name) for name in names ] + [ declaration ] + [ "}" * len(names) ]).rstrip())
+
+        self._write_namespaced(lines, structs, self._struct)
+
+        return "\n".join(lines) + "\n"
+    #enddef
+
+    def write(self, f):
+        f.write(self.generate())
+    #enddef
+
+#endclass
+
+def generate_cpp_header(schema, f, namespace=[], includes=[]):
+    """
+    Writes the header with the structs of the schema to the file object.
+    """
+    CppStructGenerator(schema, namespace=namespace, includes=includes).write(f)
+#enddef
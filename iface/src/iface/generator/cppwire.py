@@ -0,0 +1,194 @@
+"""
+C++ backend generating the wire codecs (see wireformat) of the structs of the
+C++ struct backend, the header with the structs is given by the includes. For
+every struct encode(), decode_field() and decode() are defined in its
+namespace, the runtime is mad/interfaces/wire.hpp.
+"""
+
+from .cpp import CppStructGenerator, cpp_identifier
+from .wireformat import PACKED_KINDS, inherited_wire_fields, wire_fields, wire_kind
+
+_WIRE = "::mad::interfaces::wire::"
+
+# Wire kind -> codec of the runtime.
+CPP_WIRE_CODECS = {
+    "signed": _WIRE + "SignedCodec",
+    "unsigned": _WIRE + "UnsignedCodec",
+    "bool": _WIRE + "BoolCodec",
+    "float": _WIRE + "FloatCodec",
+    "double": _WIRE + "DoubleCodec",
+    "string": _WIRE + "StringCodec",
+}
+
+class CppWireGenerator(CppStructGenerator):
+    """
+    Generates a header with the wire codecs of the structs generated by
+    CppStructGenerator of the same schema and namespace.
+    """
+
+    def _signatures(self, struct):
+        name = self.qualified_name(struct.full_name)
+        return [
+            "void encode({}Writer& writer, const {}& value)".format(_WIRE, name),
+            "bool decode_field({0}Reader& reader, {1}& value, std::uint32_t id, {0}WireType type)".format(_WIRE, name),
+            "void decode({}Reader& reader, {}& value)".format(_WIRE, name),
+        ]
+    #enddef
+
+    def _declarations(self, lines, struct):
+        lines.extend("inline " + signature + ";" for signature in self._signatures(struct))
+    #enddef
+
+    def _encode_field(self, lines, struct, field):
+        kind = wire_kind(field)
+        member = "value." + cpp_identifier(field.name)
+        inline = field.is_builtin or field.is_value_type
+
+        if self._schema.is_columnar(struct, field):
+            # Written as the repeated field of the items.
+            lines.append("  for (std::size_t index = 0; index < {}.size(); ++index)".format(member))
+            lines.append("    {}write_message(writer, {}, {}[index]);".format(_WIRE, field.id, member))
+        elif kind != "message":
+            codec = CPP_WIRE_CODECS[kind]
+            if field.is_repeated and kind in PACKED_KINDS:
+                lines.append("  {}write_packed<{}>(writer, {}, {});".format(_WIRE, codec, field.id, member))
+            elif field.is_repeated:
+                lines.append("  for (const auto& item : {})".format(member))
+                lines.append("    {}write_field<{}>(writer, {}, item);".format(_WIRE, codec, field.id))
+            else:
+                lines.append("  if (!{}is_default({}))".format(_WIRE, member))
+                lines.append("    {}write_field<{}>(writer, {}, {});".format(_WIRE, codec, field.id, member))
+        elif field.is_repeated:
+            lines.append("  for (const auto& item : {})".format(member))
+            if inline:
+                lines.append("    {}write_message(writer, {}, item);".format(_WIRE, field.id))
+            else:
+                # Null items aren't written.
+                lines.append("    if (item)")
+                lines.append("      {}write_message(writer, {}, *item);".format(_WIRE, field.id))
+        elif inline:
+            lines.append("  {}write_value_message(writer, {}, {});".format(_WIRE, field.id, member))
+        else:
+            lines.append("  if ({})".format(member))
+            lines.append("    {}write_message(writer, {}, *{});".format(_WIRE, field.id, member))
+    #enddef
+
+    def _decode_field(self, lines, struct, field):
+        kind = wire_kind(field)
+        member = "value." + cpp_identifier(field.name)
+        inline = field.is_builtin or field.is_value_type
+
+        lines.append("  case {}:".format(field.id))
+        if self._schema.is_columnar(struct, field):
+            item_type = self.qualified_name(field.full_type)
+            lines.append("  {")
+            lines.append("    {} item;".format(item_type))
+            lines.append("    {}read_message(reader, type, item);".format(_WIRE))
+            lines.append("    {}.push_back(item);".format(member))
+            lines.append("    return true;")
+            lines.append("  }")
+            return
+        if kind != "message":
+            codec = CPP_WIRE_CODECS[kind]
+            if field.is_repeated:
+                lines.append("    {}read_repeated<{}>(reader, type, {});".format(_WIRE, codec, member))
+            else:
+                lines.append("    {}read_field<{}>(reader, type, {});".format(_WIRE, codec, member))
+        elif field.is_repeated:
+            if inline:
+                lines.append("    {}.emplace_back();".format(member))
+                lines.append("    {}read_message(reader, type, {}.back());".format(_WIRE, member))
+            else:
+                lines.append("    {}.emplace_back(new {}());".format(member, self.qualified_name(field.full_type)))
+                lines.append("    {}read_message(reader, type, *{}.back());".format(_WIRE, member))
+        elif inline:
+            lines.append("    {}read_message(reader, type, {});".format(_WIRE, member))
+        else:
+            lines.append("    {}.reset(new {}());".format(member, self.qualified_name(field.full_type)))
+            lines.append("    {}read_message(reader, type, *{});".format(_WIRE, member))
+        lines.append("    return true;")
+    #enddef
+
+    def _definitions(self, lines, struct):
+        # Checks the ids of the fields of the bases too.
+        inherited_wire_fields(self._schema, struct)
+        fields = wire_fields(struct)
+        encode, decode_field, decode = self._signatures(struct)
+
+        lines.append("inline " + encode)
+        lines.append("{")
+        if struct.base:
+            lines.append("  encode(writer, static_cast<const {}&>(value));".format(self.qualified_name(struct.base)))
+        for field in fields:
+            self._encode_field(lines, struct, field)
+        if not struct.base and not fields:
+            lines.append("  (void)writer;")
+            lines.append("  (void)value;")
+        lines.append("}")
+        lines.append("")
+
+        lines.append("inline " + decode_field)
+        lines.append("{")
+        if fields:
+            lines.append("  switch (id) {")
+            for field in fields:
+                self._decode_field(lines, struct, field)
+            lines.append("  }")
+        if struct.base:
+            lines.append("  return decode_field(reader, static_cast<{}&>(value), id, type);".format(self.qualified_name(struct.base)))
+        else:
+            if not fields:
+                lines.append("  (void)reader;")
+                lines.append("  (void)value;")
+                lines.append("  (void)id;")
+                lines.append("  (void)type;")
+            lines.append("  return false;")
+        lines.append("}")
+        lines.append("")
+
+        lines.append("inline " + decode)
+        lines.append("{")
+        lines.append("  while (!reader.at_end()) {")
+        lines.append("    std::uint32_t id;")
+        lines.append("    {}WireType type;".format(_WIRE))
+        lines.append("    reader.key(id, type);")
+        lines.append("    if (!decode_field(reader, value, id, type))")
+        lines.append("      reader.skip(type);")
+        lines.append("  }")
+        lines.append("}")
+    #enddef
+
+    def generate(self):
+        """
+        Returns the content of the header.
+        """
+        lines = [
+            "// Generated by iface.generator, do not edit.",
+            "#pragma once",
+            "",
+            "#include <mad/interfaces/wire.hpp>",
+            "",
+            "#include <cstddef>",
+            "#include <cstdint>",
+        ]
+        if self._includes:
+            lines.append("")
+            lines.extend("#include \"{}\"".format(include) for include in self._includes)
+
+        # The codecs of the nested messages are declared before use.
+        structs = self._schema.ordered_structs()
+        self._write_namespaced(lines, structs, self._declarations)
+        self._write_namespaced(lines, structs, self._definitions)
+
+        return "\n".join(lines) + "\n"
+    #enddef
+
+#endclass
+
+def generate_cpp_wire_header(schema, f, namespace=[], includes=[]):
+    """
+    Writes the header with the wire codecs of the structs of the schema to the
+    file object, the includes should give the header of the structs.
+    """
+    CppWireGenerator(schema, namespace=namespace, includes=includes).write(f)
+#enddef
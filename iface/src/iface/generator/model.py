@@ -0,0 +1,240 @@
+import json
+
+from ..parser.layouts import InterfaceLayouts
+from ..parser.module import BUILTIN_TYPES, TREATMENT_VALUE_TYPE
+
+BUILTIN_TYPE_NAMES = frozenset(identifier for identifier, _ in BUILTIN_TYPES)
+
+# Builtin types of the repeated fields stored in contiguous typed arrays.
+COLUMN_TYPE_NAMES = frozenset([ "int", "int32", "uint", "uint32", "float", "double", "bool" ])
+
+# Value of the 'layout' attribute of an interface storing its repeated fields
+# of other interfaces as struct of arrays, see SchemaModel.is_columnar().
+LAYOUT_COLUMNAR = "columnar"
+
+# Attributes of the diagram nodes set by the builders, the others come from
+# the '@attr' annotations.
+_CLASS_ATTRIBUTES = frozenset([ "name", "base", "inheritance" ])
+_FIELD_ATTRIBUTES = frozenset([ "is_ref", "type", "full_type", "name", "is_repeated", "id" ])
+
+def _node_parts(node):
+    """
+    Returns (type name, attributes, children) of a class diagram node, either
+    a codemodel node or its JSON form.
+    """
+    if isinstance(node, dict):
+        return node["type"], node.get("attributes", {}), node.get("children", [])
+    return type(node).__name__, node.attributes, node.children
+#enddef
+
+class FieldModel(object):
+    """
+    Field of a struct with the type resolved to the full name and its
+    treatment ("" if the type has none). 'id' is the field id or None if it
+    has none.
+    """
+
+    def __init__(self, name, full_type, treatment="", is_ref=False, is_repeated=False, id=None, attributes={}):
+        self.name = name
+        self.full_type = full_type
+        self.treatment = treatment
+        self.is_ref = is_ref
+        self.is_repeated = is_repeated
+        self.id = id
+        self.attributes = dict(attributes)
+    #enddef
+
+    @property
+    def is_builtin(self):
+        return self.full_type in BUILTIN_TYPE_NAMES
+    #enddef
+
+    @property
+    def is_value_type(self):
+        return self.treatment == TREATMENT_VALUE_TYPE
+    #enddef
+
+    @property
+    def is_column(self):
+        """
+        Whether the field is stored as a typed array, a repeated field of
+        the types of COLUMN_TYPE_NAMES.
+        """
+        return self.is_repeated and not self.is_ref and self.full_type in COLUMN_TYPE_NAMES
+    #enddef
+
+#endclass
+
+class StructModel(object):
+    """
+    Interface of the class diagram, 'base' is the full name of its base or
+    None.
+    """
+
+    def __init__(self, namespace, name, base=None, fields=[], attributes={}):
+        self.namespace = list(namespace)
+        self.name = name
+        self.base = base
+        self.fields = list(fields)
+        self.attributes = dict(attributes)
+    #enddef
+
+    @property
+    def full_name(self):
+        return ".".join(self.namespace + [ self.name ])
+    #enddef
+
+#endclass
+
+class SchemaModel(object):
+    """
+    Structs of a class diagram in the order of the diagram, with the
+    treatments of all the types it refers to.
+    """
+
+    def __init__(self, structs, treatments):
+        self.structs = list(structs)
+        # Full type name -> treatment or "".
+        self.treatments = dict(treatments)
+        self._structs = { struct.full_name: struct for struct in self.structs }
+        self._layouts = InterfaceLayouts(self.struct, lambda struct: (struct.base, struct.fields), lambda field: (field.name, field.id))
+    #enddef
+
+    def struct(self, full_name):
+        """
+        Returns the struct or None if the type isn't defined by the diagram.
+        """
+        return self._structs.get(full_name)
+    #enddef
+
+    def layout(self, full_name):
+        """
+        Returns InterfaceLayout of the struct, its fields are (struct, field).
+        The layouts are computed once per schema, each one from the layout of
+        the base. Raises if two fields of the struct and its bases share an
+        id.
+        """
+        return self._layouts.layout(full_name)
+    #enddef
+
+    def column_fields(self, full_type):
+        """
+        Returns the fields of the interface, the ones of its bases first, if
+        it can be stored as struct of arrays, i.e. all of them are of the
+        types of COLUMN_TYPE_NAMES and not repeated, otherwise None.
+        """
+        if self.struct(full_type) is None:
+            return None
+        layout = self.layout(full_type)
+        fields = [ field for _, field in layout.fields ]
+        if not layout.complete or not fields or any(field.is_repeated or field.is_ref or field.full_type not in COLUMN_TYPE_NAMES for field in fields):
+            return None
+        return fields
+    #enddef
+
+    def is_columnar(self, struct, field):
+        """
+        Whether the field of the struct is stored as struct of arrays, a
+        repeated field of an interface with LAYOUT_COLUMNAR of the interface
+        which can be (see column_fields()).
+        """
+        return struct.attributes.get("layout") == LAYOUT_COLUMNAR and field.is_repeated and not field.is_ref \
+                and not field.is_builtin and self.column_fields(field.full_type) is not None
+    #enddef
+
+    def columnar_types(self):
+        """
+        Returns the full names of the interfaces stored as struct of arrays
+        by some field.
+        """
+        return set(field.full_type for struct in self.structs for field in struct.fields if self.is_columnar(struct, field))
+    #enddef
+
+    def ordered_structs(self):
+        """
+        Returns the structs ordered so that every struct follows its base, the
+        value types it holds inline and the types of its fields stored as
+        struct of arrays, otherwise in the order of the diagram.
+        """
+        ordered = []
+        # Full name -> True when done, False while being visited.
+        state = {}
+
+        def visit(struct):
+            done = state.get(struct.full_name)
+            if done:
+                return
+            if done is False:
+                raise RuntimeError("Type '{}' contains itself by value.".format(struct.full_name))
+            state[struct.full_name] = False
+
+            dependencies = [ struct.base ] if struct.base else []
+            dependencies.extend(field.full_type for field in struct.fields
+                    if (field.is_value_type and not field.is_ref) or self.is_columnar(struct, field))
+            for full_name in dependencies:
+                dependency = self.struct(full_name)
+                if dependency is not None:
+                    visit(dependency)
+
+            state[struct.full_name] = True
+            ordered.append(struct)
+        #enddef
+
+        for struct in self.structs:
+            visit(struct)
+        return ordered
+    #enddef
+
+#endclass
+
+def load_schema(diagram):
+    """
+    Returns SchemaModel of the class diagram given by its root node, either
+    a codemodel node (e.g. FrontEndBuilder.build()) or its JSON form.
+    """
+    _, root_attributes, root_children = _node_parts(diagram)
+    treatments = { full_type: type_info.get("treatment", "") for full_type, type_info in root_attributes.get("using", {}).items() }
+
+    structs = []
+
+    def visit(node, namespace):
+        node_type, attributes, children = _node_parts(node)
+        if node_type == "Package":
+            for child in children:
+                visit(child, namespace + [ attributes["name"] ])
+        elif node_type == "Class":
+            fields = []
+            for child in children:
+                _, field_attributes, _ = _node_parts(child)
+                full_type = ".".join(field_attributes["full_type"])
+                fields.append(FieldModel(field_attributes["name"], full_type,
+                        treatment=treatments.get(full_type, ""),
+                        is_ref=field_attributes.get("is_ref", False),
+                        is_repeated=field_attributes.get("is_repeated", False),
+                        id=field_attributes.get("id"),
+                        attributes={ key: value for key, value in field_attributes.items() if key not in _FIELD_ATTRIBUTES }))
+            structs.append(StructModel(namespace, attributes["name"], base=attributes.get("base"), fields=fields,
+                    attributes={ key: value for key, value in attributes.items() if key not in _CLASS_ATTRIBUTES }))
+    #enddef
+
+    for child in root_children:
+        visit(child, [])
+    return SchemaModel(structs, treatments)
+#enddef
+
+def load_schema_file(filepath):
+    """
+    Returns SchemaModel of the class diagram file written by the parser, in
+    the JSON or the binary format.
+    """
+    from ..parser.bindiagram import BIN_MAGIC, BinaryClassDiagram
+
+    with open(filepath, "rb") as f:
+        magic = f.read(len(BIN_MAGIC))
+    if magic == BIN_MAGIC:
+        with BinaryClassDiagram(filepath) as diagram:
+            return load_schema(diagram.root())
+
+    with open(filepath, "r") as f:
+        return load_schema(json.load(f))
+#enddef
@@ -0,0 +1,384 @@
+"""
+Python backend generating a class per interface, a lighter alternative to
+the dicts of the JSON form. The classes have __slots__, the class of an
+interface derives from the class of its base, the fields have the defaults
+of their types and the value types are created with the object. Repeated
+fields of the numeric and bool types are typed arrays (see iface.columns),
+the ones of the interfaces with the columnar layout (see
+SchemaModel.is_columnar()) are struct of arrays, <class>Columns. With the
+wire codec (see wireformat), encode() returns the message bytes and the
+decode() class method creates the object from them, encode_many() and
+decode_many() (of iface.wire) handle sequences of the objects.
+"""
+
+import keyword
+
+from .model import BUILTIN_TYPE_NAMES, COLUMN_TYPE_NAMES
+from .wireformat import PACKED_KINDS, WIRE_LENGTH, WIRE_TYPES, inherited_wire_fields, wire_key, wire_kind
+
+# Builtin type -> Python literal of its default value.
+PYTHON_DEFAULTS = {
+    "int": "0",
+    "int32": "0",
+    "uint": "0",
+    "uint32": "0",
+    "bool": "False",
+    "float": "0.0",
+    "double": "0.0",
+    "string": "\"\"",
+}
+
+# Names of the methods and of the module, fields and classes of the names get
+# a trailing underscore like the keywords.
+_RESERVED_NAMES = frozenset([ "encode", "decode", "_encode", "_decode", "encode_many", "decode_many" ])
+
+# Methods of the struct of arrays classes.
+_COLUMNS_RESERVED_NAMES = frozenset([ "append", "extend" ])
+
+# Functions of iface.wire used by the generated code.
+_RUNTIME_FUNCTIONS = [
+    "decode_bool", "decode_double", "decode_float", "decode_length", "decode_packed", "decode_signed", "decode_string", "decode_varint",
+    "encode_bool", "encode_double", "encode_float", "encode_length_delimited", "encode_packed", "encode_signed", "encode_string", "encode_varint",
+    "skip_field",
+]
+
+def python_identifier(name):
+    return name + "_" if keyword.iskeyword(name) or name in _RESERVED_NAMES else name
+#enddef
+
+def _bytes_literal(value):
+    return repr(bytes(value))
+#enddef
+
+def _varint_bytes(value):
+    data = bytearray()
+    while value >= 0x80:
+        data.append((value & 0x7f) | 0x80)
+        value >>= 7
+    data.append(value)
+    return data
+#enddef
+
+class PythonGenerator(object):
+    """
+    Generates a Python module with the classes of the schema (see
+    SchemaModel), with the wire codec if 'wire'. The bases must be defined by
+    the schema, with the wire codec the types of the encoded fields too.
+    """
+
+    def __init__(self, schema, wire=True):
+        from ..columns import COLUMN_TYPECODES
+
+        missing = BUILTIN_TYPE_NAMES.difference(PYTHON_DEFAULTS)
+        if missing:
+            raise RuntimeError("Builtin types {} have no Python default.".format(", ".join(sorted(missing))))
+        missing = COLUMN_TYPE_NAMES.difference(COLUMN_TYPECODES)
+        if missing:
+            raise RuntimeError("Column types {} have no array typecode.".format(", ".join(sorted(missing))))
+        self._typecodes = COLUMN_TYPECODES
+        self._schema = schema
+        self._wire = wire
+        self._class_names = self._unique_class_names()
+    #enddef
+
+    def _unique_class_names(self):
+        # Interface names, or the full names if ambiguous.
+        counts = {}
+        for struct in self._schema.structs:
+            counts[struct.name] = counts.get(struct.name, 0) + 1
+        return { struct.full_name: python_identifier(struct.name if counts[struct.name] == 1 else struct.full_name.replace(".", "_"))
+                 for struct in self._schema.structs }
+    #enddef
+
+    def class_name(self, full_name):
+        try:
+            return self._class_names[full_name]
+        except KeyError:
+            raise RuntimeError("Type '{}' isn't defined by the class diagram, it has no Python class.".format(full_name))
+    #enddef
+
+    def columns_class_name(self, full_name):
+        name = self.class_name(full_name) + "Columns"
+        if name in self._class_names.values():
+            raise RuntimeError("Class '{}' of the columns of '{}' collides with an interface.".format(name, full_name))
+        return name
+    #enddef
+
+    def _all_fields(self, struct):
+        """
+        Returns (struct, field) of all the fields of the struct, the ones of
+        the bases first.
+        """
+        layout = self._schema.layout(struct.full_name)
+        if not layout.complete:
+            # The chain ends by the missing base.
+            raise RuntimeError("Base '{}' of '{}' isn't defined by the class diagram.".format(layout.bases[-1], struct.full_name))
+        return layout.fields
+    #enddef
+
+    def _creates_value(self, field):
+        # Value types of the diagram are created with the object.
+        return field.is_value_type and not field.is_builtin and not field.is_ref and not field.is_repeated \
+                and self._schema.struct(field.full_type) is not None
+    #enddef
+
+    def _init(self, lines, fields):
+        arguments = [ "self" ]
+        for _, field in fields:
+            name = python_identifier(field.name)
+            if field.is_repeated or field.is_ref or not field.is_builtin:
+                arguments.append("{}=None".format(name))
+            else:
+                arguments.append("{}={}".format(name, PYTHON_DEFAULTS[field.full_type]))
+        lines.append("    def __init__({}):".format(", ".join(arguments)))
+        for owner, field in fields:
+            name = python_identifier(field.name)
+            if field.is_column:
+                lines.append("        self.{0} = _column(\"{1}\", {0})".format(name, self._typecodes[field.full_type]))
+            elif self._schema.is_columnar(owner, field):
+                lines.append("        self.{0} = {0} if isinstance({0}, {1}) else {1}({0})".format(name, self.columns_class_name(field.full_type)))
+            elif field.is_repeated:
+                lines.append("        self.{0} = [] if {0} is None else {0}".format(name))
+            elif self._creates_value(field):
+                lines.append("        self.{0} = {1}() if {0} is None else {0}".format(name, self.class_name(field.full_type)))
+            else:
+                lines.append("        self.{0} = {0}".format(name))
+        if not fields:
+            lines.append("        pass")
+        lines.append("    #enddef")
+    #enddef
+
+    def _encode(self, lines, fields):
+        lines.append("    def encode(self):")
+        lines.append("        out = bytearray()")
+        lines.append("        self._encode(out)")
+        lines.append("        return bytes(out)")
+        lines.append("    #enddef")
+        lines.append("")
+        lines.append("    def _encode(self, out):")
+        for _, field in fields:
+            kind = wire_kind(field)
+            name = python_identifier(field.name)
+            if kind == "message":
+                # Checked even if the class isn't needed for encoding.
+                self.class_name(field.full_type)
+
+            if field.is_repeated and kind in PACKED_KINDS:
+                lines.append("        if self.{}:".format(name))
+                lines.append("            out += {}".format(_bytes_literal(_varint_bytes(wire_key(field.id, WIRE_LENGTH)))))
+                lines.append("            _encode_packed(\"{}\", self.{}, out)".format(kind, name))
+                continue
+
+            key = _bytes_literal(_varint_bytes(wire_key(field.id, WIRE_TYPES[kind])))
+            if field.is_repeated:
+                lines.append("        for value in self.{}:".format(name))
+                indent = "            "
+            elif kind == "message":
+                lines.append("        value = self.{}".format(name))
+                lines.append("        if value is not None:")
+                indent = "            "
+            else:
+                lines.append("        value = self.{}".format(name))
+                lines.append("        if value:")
+                indent = "            "
+
+            if kind == "message":
+                lines.append(indent + "data = bytearray()")
+                lines.append(indent + "value._encode(data)")
+                if field.is_value_type and not field.is_repeated:
+                    lines.append(indent + "if data:")
+                    indent += "    "
+                lines.append(indent + "out += {}".format(key))
+                lines.append(indent + "_encode_length_delimited(data, out)")
+            else:
+                lines.append(indent + "out += {}".format(key))
+                lines.append(indent + "_encode_{}(value, out)".format("varint" if kind == "unsigned" else kind))
+        if not fields:
+            lines.append("        pass")
+        lines.append("    #enddef")
+    #enddef
+
+    def _decode(self, lines, struct, fields, encoded):
+        lines.append("    @classmethod")
+        lines.append("    def decode(cls, data):")
+        lines.append("        return cls._decode(data, 0, len(data))")
+        lines.append("    #enddef")
+        lines.append("")
+        # The fields are decoded to locals and set once, the object isn't
+        # initialized by __init__.
+        lines.append("    @classmethod")
+        lines.append("    def _decode(cls, data, pos, end):")
+        for owner, field in fields:
+            if field.is_column:
+                default = "_column(\"{}\")".format(self._typecodes[field.full_type])
+            elif self._schema.is_columnar(owner, field):
+                default = "{}()".format(self.columns_class_name(field.full_type))
+            elif field.is_repeated:
+                default = "[]"
+            elif field.is_builtin and not field.is_ref:
+                default = PYTHON_DEFAULTS[field.full_type]
+            else:
+                default = "None"
+            lines.append("        v_{} = {}".format(field.name, default))
+        lines.append("        while pos < end:")
+        # Keys of one byte (ids up to 15) are decoded inline.
+        lines.append("            key = data[pos]")
+        lines.append("            if key < 0x80:")
+        lines.append("                pos += 1")
+        lines.append("            else:")
+        lines.append("                key, pos = _decode_varint(data, pos)")
+
+        keyword = "if"
+        for _, field in encoded:
+            kind = wire_kind(field)
+            local = "v_" + field.name
+
+            if field.is_repeated and kind in PACKED_KINDS:
+                lines.append("            {} key == {}:".format(keyword, wire_key(field.id, WIRE_LENGTH)))
+                lines.append("                pos = _decode_packed(\"{}\", data, pos, {})".format(kind, local))
+                keyword = "elif"
+
+            lines.append("            {} key == {}:".format(keyword, wire_key(field.id, WIRE_TYPES[kind])))
+            keyword = "elif"
+            if kind == "message":
+                lines.append("                field_end, pos = _decode_length(data, pos)")
+                value = "{}._decode(data, pos, field_end)".format(self.class_name(field.full_type))
+                lines.append("                {}".format("{}.append({})".format(local, value) if field.is_repeated else "{} = {}".format(local, value)))
+                lines.append("                pos = field_end")
+            elif field.is_repeated:
+                lines.append("                value, pos = _decode_{}(data, pos)".format("varint" if kind == "unsigned" else kind))
+                lines.append("                {}.append(value)".format(local))
+            else:
+                lines.append("                {}, pos = _decode_{}(data, pos)".format(local, "varint" if kind == "unsigned" else kind))
+
+        if keyword == "if":
+            lines.append("            pos = _skip_field(data, pos, key & 7)")
+        else:
+            lines.append("            else:")
+            lines.append("                pos = _skip_field(data, pos, key & 7)")
+        lines.append("        if pos != end:")
+        lines.append("            raise RuntimeError(\"Broken message of '{}'.\")".format(struct.full_name))
+        lines.append("        obj = cls.__new__(cls)")
+        for _, field in fields:
+            name = python_identifier(field.name)
+            if self._creates_value(field):
+                lines.append("        obj.{0} = {1}() if v_{2} is None else v_{2}".format(name, self.class_name(field.full_type), field.name))
+            else:
+                lines.append("        obj.{} = v_{}".format(name, field.name))
+        lines.append("        return obj")
+        lines.append("    #enddef")
+    #enddef
+
+    def _columns_class(self, lines, struct):
+        fields = self._schema.column_fields(struct.full_name)
+        class_name = self.class_name(struct.full_name)
+        columns = [ python_identifier(field.name) + ("_" if field.name in _COLUMNS_RESERVED_NAMES else "") for field in fields ]
+
+        lines.append("class {}(object):".format(self.columns_class_name(struct.full_name)))
+        lines.append("    \"\"\"")
+        lines.append("    Struct of arrays of '{}', a column per field.".format(struct.full_name))
+        lines.append("    \"\"\"")
+        lines.append("")
+        lines.append("    __slots__ = ({})".format(", ".join("\"{}\"".format(column) for column in columns) + ("," if len(columns) == 1 else "")))
+        lines.append("")
+        lines.append("    def __init__(self, items=None):")
+        for field, column in zip(fields, columns):
+            lines.append("        self.{} = _column(\"{}\")".format(column, self._typecodes[field.full_type]))
+        lines.append("        if items is not None:")
+        lines.append("            self.extend(items)")
+        lines.append("    #enddef")
+        lines.append("")
+        lines.append("    def __len__(self):")
+        lines.append("        return len(self.{})".format(columns[0]))
+        lines.append("    #enddef")
+        lines.append("")
+        # The bool columns hold 0 and 1.
+        values = [ ("bool(self.{}[index])" if field.full_type == "bool" else "self.{}[index]").format(column) for field, column in zip(fields, columns) ]
+        lines.append("    def __getitem__(self, index):")
+        lines.append("        return {}({})".format(class_name, ", ".join(values)))
+        lines.append("    #enddef")
+        lines.append("")
+        values = [ ("map(bool, self.{})" if field.full_type == "bool" else "self.{}").format(column) for field, column in zip(fields, columns) ]
+        lines.append("    def __iter__(self):")
+        lines.append("        return map({}, {})".format(class_name, ", ".join(values)))
+        lines.append("    #enddef")
+        lines.append("")
+        lines.append("    def append(self, item):")
+        for field, column in zip(fields, columns):
+            lines.append("        self.{}.append(item.{})".format(column, python_identifier(field.name)))
+        lines.append("    #enddef")
+        lines.append("")
+        lines.append("    def extend(self, items):")
+        lines.append("        if isinstance(items, {}):".format(self.columns_class_name(struct.full_name)))
+        for column in columns:
+            lines.append("            self.{0}.extend(items.{0})".format(column))
+        lines.append("            return")
+        lines.append("        items = list(items)")
+        for field, column in zip(fields, columns):
+            lines.append("        self.{}.extend([ item.{} for item in items ])".format(column, python_identifier(field.name)))
+        lines.append("    #enddef")
+        lines.append("")
+        lines.append("#endclass")
+    #enddef
+
+    def _class(self, lines, struct):
+        fields = self._all_fields(struct)
+
+        lines.append("class {}({}):".format(self.class_name(struct.full_name),
+                self.class_name(struct.base) if struct.base else "object"))
+        lines.append("    \"\"\"")
+        lines.append("    Interface '{}'.".format(struct.full_name))
+        lines.append("    \"\"\"")
+        lines.append("")
+        # Just the own fields, the ones of the base have its slots.
+        slots = [ "\"{}\"".format(python_identifier(field.name)) for field in struct.fields ]
+        lines.append("    __slots__ = ({})".format(", ".join(slots) + ("," if len(slots) == 1 else "")))
+        lines.append("")
+        # The fields of the bases are set directly, without calling the
+        # __init__ of the base.
+        self._init(lines, fields)
+        if self._wire:
+            # The 'ref' fields are attributes, but aren't encoded.
+            encoded = inherited_wire_fields(self._schema, struct)
+            lines.append("")
+            self._encode(lines, encoded)
+            lines.append("")
+            self._decode(lines, struct, fields, encoded)
+        lines.append("")
+        lines.append("#endclass")
+    #enddef
+
+    def generate(self):
+        """
+        Returns the content of the module.
+        """
+        lines = [ "# Generated by iface.generator, do not edit.", "" ]
+        lines.append("from iface.columns import column as _column")
+        if self._wire:
+            lines.append("from iface.wire import decode_many, encode_many")
+            # The runtime functions are module globals, no attribute lookups.
+            lines.append("from iface.wire import {}".format(", ".join("{0} as _{0}".format(name) for name in _RUNTIME_FUNCTIONS)))
+        columnar_types = self._schema.columnar_types()
+        # The bases and the value types are defined first.
+        for struct in self._schema.ordered_structs():
+            lines.append("")
+            self._class(lines, struct)
+            if struct.full_name in columnar_types:
+                lines.append("")
+                self._columns_class(lines, struct)
+        return "\n".join(lines) + "\n"
+    #enddef
+
+    def write(self, f):
+        f.write(self.generate())
+    #enddef
+
+#endclass
+
+def generate_python(schema, f, wire=True):
+    """
+    Writes the Python module with the classes of the schema to the file
+    object, with their wire codecs if 'wire'.
+    """
+    PythonGenerator(schema, wire=wire).write(f)
+#enddef
@@ -0,0 +1,95 @@
+"""
+Tag/varint wire format shared by the generated C++ and Python codecs. A
+message is a sequence of fields, every field starts by the varint key
+(field id << 3 | wire type) followed by the value:
+
+    varint (0)   - int and int32 zigzag encoded, uint, uint32 and bool
+    fixed64 (1)  - double, little endian
+    length (2)   - string (UTF-8), nested message, packed repeated field
+    fixed32 (5)  - float, little endian
+
+Fields of the default values (zero, empty, missing, value types with all the
+fields default) aren't written, 'ref' fields aren't encoded at all. Repeated fields of the numeric and bool types
+are packed to a single length delimited field, the other repeated fields are
+written field per item. Fields of the base interface are written to the
+message of the derived one. Decoders skip fields of unknown ids, so the
+messages can be extended by new fields.
+"""
+
+WIRE_VARINT = 0
+WIRE_FIXED64 = 1
+WIRE_LENGTH = 2
+WIRE_FIXED32 = 5
+
+MAX_FIELD_ID = (1 << 29) - 1
+
+# Builtin type -> kind of its wire encoding.
+BUILTIN_WIRE_KINDS = {
+    "int": "signed",
+    "int32": "signed",
+    "uint": "unsigned",
+    "uint32": "unsigned",
+    "bool": "bool",
+    "float": "float",
+    "double": "double",
+    "string": "string",
+}
+
+# Wire kind -> wire type.
+WIRE_TYPES = {
+    "signed": WIRE_VARINT,
+    "unsigned": WIRE_VARINT,
+    "bool": WIRE_VARINT,
+    "float": WIRE_FIXED32,
+    "double": WIRE_FIXED64,
+    "string": WIRE_LENGTH,
+    "message": WIRE_LENGTH,
+}
+
+# Kinds of the repeated fields written packed.
+PACKED_KINDS = frozenset([ "signed", "unsigned", "bool", "float", "double" ])
+
+def wire_kind(field):
+    return BUILTIN_WIRE_KINDS.get(field.full_type, "message")
+#enddef
+
+def wire_key(field_id, wire_type):
+    return (field_id << 3) | wire_type
+#enddef
+
+def _check_wire_id(struct, field):
+    if field.id is None:
+        raise RuntimeError("Field '{}.{}' has no id, the wire codec needs ids of all the fields.".format(struct.full_name, field.name))
+    if not 0 < field.id <= MAX_FIELD_ID:
+        raise RuntimeError("Id {} of field '{}.{}' is out of range.".format(field.id, struct.full_name, field.name))
+#enddef
+
+def wire_fields(struct):
+    """
+    Returns the encoded fields of the struct itself (not of its base), the
+    ones which aren't 'ref'. Raises if one of them has no valid id.
+    """
+    fields = []
+    for field in struct.fields:
+        if field.is_ref:
+            continue
+        _check_wire_id(struct, field)
+        fields.append(field)
+    return fields
+#enddef
+
+def inherited_wire_fields(schema, struct):
+    """
+    Returns (struct, field) of the encoded fields of the struct and of its
+    bases defined by the schema, the ones of the bases first, as given by
+    the layout of the struct (see SchemaModel.layout()). The layout raises
+    if two of them share an id, they are written to the same message.
+    """
+    fields = []
+    for owner, field in schema.layout(struct.full_name).fields:
+        if field.is_ref:
+            continue
+        _check_wire_id(owner, field)
+        fields.append((owner, field))
+    return fields
+#enddef
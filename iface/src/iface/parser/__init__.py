@@ -1 +1,42 @@
 from .module import *
+
+# Name -> module providing it. The modules are imported on the first use of
+# the name, so importing the package (e.g. to run the CLI) stays cheap.
+_LAZY_NAMES = {
+    "compile_async": ".aio",
+    "prefetch_files_async": ".aio",
+    "process_file_async": ".aio",
+    "FastParser": ".fastparser",
+    "BatchBuild": ".batch",
+    "BatchTarget": ".batch",
+    "load_batch_manifest": ".batch",
+    "BinaryClassDiagram": ".bindiagram",
+    "write_binary_class_diagram": ".bindiagram",
+    "MemoryParseCache": ".cache",
+    "ParseCache": ".cache",
+    "load_grammar": ".cache",
+    "MemoryIndex": ".ifaceidx",
+    "IncludeResolver": ".includes",
+    "load_index": ".ifaceidx",
+    "write_index": ".ifaceidx",
+    "IncrementalBuild": ".incremental",
+    "InterfaceLayout": ".layouts",
+    "InterfaceLayouts": ".layouts",
+    "write_class_diagram": ".jsonwriter",
+    "grammar": ".module",
+    "prefetch_files": ".parallel",
+    "Profiler": ".profiling",
+    "CompileServer": ".server",
+}
+
+def __getattr__(name):
+    module_name = _LAZY_NAMES.get(name)
+    if module_name is None:
+        raise AttributeError("module '{}' has no attribute '{}'".format(__name__, name))
+    import importlib
+    return getattr(importlib.import_module(module_name, __name__), name)
+#enddef
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_NAMES))
+#enddef
@@ -1,46 +1,152 @@
 from .module import *
+from .cache import CACHE_DIR_ENV, DEFAULT_EVICT_INTERVAL, DEFAULT_MAX_AGE, DEFAULT_MAX_SIZE, MemoryParseCache, ParseCache
+from .ifaceidx import INDEX_FILE_EXTENSION, write_index
+
+# The other modules are imported by the modes using them, so the startup (and
+# --help) doesn't pay for them.
 
 if __name__ == "__main__":
     import argparse
+    import os
     import sys
 
     args_parser = argparse.ArgumentParser(description="Generate code based on the input.")
     args_parser.add_argument("-o", "--output", dest="output", default="", help="output file base name or empty (default) for stdout")
+    args_parser.add_argument("-f", "--format", dest="format", default="json", choices=["json", "bin"], help="format of the class diagram, 'bin' can be loaded lazily by BinaryClassDiagram (default: json)")
     args_parser.add_argument("-I", "--includepath", dest="include_paths", action="append", default=[], help="paths where to look for included files")
+    args_parser.add_argument("-e", "--engine", dest="engine", default="parsimonious", choices=ENGINES, help="parser engine, 'fast' avoids building the parsimonious tree (default: parsimonious)")
+    args_parser.add_argument("--using-all-types", dest="using_all_types", default=False, action="store_true", help="list all the known types in the 'using' section of the output, not just the referenced ones")
+    args_parser.add_argument("--stream", dest="stream", default=False, action="store_true", help="parse and process the files one top level block at a time to bound the memory (bypasses the parse cache)")
+    args_parser.add_argument("--cache-dir", dest="cache_dir", default=os.environ.get(CACHE_DIR_ENV, ""), help="directory of the persistent parse cache or empty for no caching (default: ${} or empty)".format(CACHE_DIR_ENV))
+    args_parser.add_argument("--cache-max-size", dest="cache_max_size", type=int, default=DEFAULT_MAX_SIZE, help="size in bytes the parse cache is evicted to (default: %(default)s)")
+    args_parser.add_argument("--cache-max-age", dest="cache_max_age", type=int, default=DEFAULT_MAX_AGE, help="seconds after which unused parse cache entries are evicted (default: %(default)s)")
+    args_parser.add_argument("--cache-evict-interval", dest="cache_evict_interval", type=int, default=DEFAULT_EVICT_INTERVAL, help="seconds between the evictions of the parse cache, a compilation storing no entry doesn't evict (default: %(default)s)")
+    args_parser.add_argument("-j", "--jobs", dest="jobs", type=int, default=1, help="number of processes parsing the input and included files, of threads building the targets in the batch mode (default: %(default)s)")
+    args_parser.add_argument("--emit-index", dest="emit_index", default=False, action="store_true", help="write precompiled index of the types of every input file and its includes next to the file (*{})".format(INDEX_FILE_EXTENSION))
+    args_parser.add_argument("--manifest", dest="manifest", default="", help="rebuild the output only if its dependencies recorded in the manifest changed, the parse cache defaults to MANIFEST.cache then")
+    args_parser.add_argument("--watch", dest="watch", default=False, action="store_true", help="keep the output up to date by watching the input and included files (the manifest defaults to OUTPUT.manifest)")
+    args_parser.add_argument("--batch", dest="batch", default="", metavar="MANIFEST", help="build all the targets of the batch manifest (see load_batch_manifest) sharing the parsed and indexed files")
+    args_parser.add_argument("--serve", dest="serve", default="", metavar="SOCKET", help="run compile server listening on the Unix domain socket, see the 'client' module")
+    args_parser.add_argument("--profile", dest="profile", default="", metavar="REPORT", help="write JSON report of the time and memory spent in the phases of the compilation, nodes per rule, indexed includes, type and include resolutions")
+    args_parser.add_argument("--profile-no-memory", dest="profile_no_memory", default=False, action="store_true", help="don't trace the memory when profiling, it slows the compilation down")
     args_parser.add_argument("-d", "--debug", dest="debug", default=False, action="store_true", help="turns debugging messages on")
     args_parser.add_argument("input_files", metavar="INPUT_FILE", nargs="*")
 
     args = args_parser.parse_args()
 
-    opts["debug"] = args.debug
+    cache = None
+    if args.cache_dir:
+        cache = ParseCache(args.cache_dir, max_size=args.cache_max_size, max_age=args.cache_max_age, evict_interval=args.cache_evict_interval)
+
+    if args.serve:
+        from .server import CompileServer
+        server = CompileServer(args.serve, engine=args.engine, cache=cache, debug=args.debug)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+        sys.exit(0)
+
+    if args.batch:
+        if args.output or args.input_files:
+            args_parser.error("outputs and inputs of the batch build are given by the manifest")
+
+        from .batch import BatchBuild, load_batch_manifest
+
+        batch_build = BatchBuild(load_batch_manifest(args.batch), engine=args.engine, cache=cache, debug=args.debug,
+                using_all_types=args.using_all_types, output_format=args.format)
+        sys.exit(0 if batch_build.build(args.jobs) else 1)
+
+    if args.manifest or args.watch:
+        if not args.output or not args.input_files or "-" in args.input_files:
+            args_parser.error("incremental build needs the output and input files")
+
+        from .incremental import IncrementalBuild
+
+        manifest_path = args.manifest if args.manifest else args.output + ".manifest"
+        if cache is None:
+            cache = ParseCache(manifest_path + ".cache", max_size=args.cache_max_size, max_age=args.cache_max_age, evict_interval=args.cache_evict_interval)
+        if args.watch:
+            cache = MemoryParseCache(cache)
 
-    # TODO Don't use global register, provide it to the builders explicitly so
-    # the purpose of the index builder is more clear.
-    interfaces_index_builder = InterfacesIndexBuilder(args.include_paths)
-    class_diagram_builder = ClassDiagramBuilder()
+        incremental_build = IncrementalBuild(manifest_path, args.input_files, args.output,
+                include_paths=args.include_paths, engine=args.engine, cache=cache, debug=args.debug,
+                using_all_types=args.using_all_types, output_format=args.format)
+        try:
+            if args.watch:
+                incremental_build.watch()
+            else:
+                incremental_build.build()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            cache.evict()
+        sys.exit(0)
+
+    profiler = None
+    if args.profile:
+        from .profiling import Profiler
+        profiler = Profiler(trace_memory=not args.profile_no_memory)
+        profiler.start()
+
+    session = CompilationSession(args.include_paths, debug=args.debug, engine=args.engine, cache=cache, stream=args.stream,
+            using_all_types=args.using_all_types, profiler=profiler)
+
+    if args.jobs > 1:
+        from .parallel import prefetch_files
+        input_filepaths = [ input_filepath for input_filepath in args.input_files if input_filepath.strip() != "-" ]
+        with session.phase("prefetch"):
+            prefetch_files(session, input_filepaths, args.jobs)
 
-    # Parse input into the parsimonious tree and process it in order to build
-    # a class diagram from it.
-    builders = [ interfaces_index_builder, class_diagram_builder ]
+    front_end = FrontEndBuilder(session)
+
+    # Parse input and process it in order to build the types index and a
+    # class diagram from it.
     if args.input_files:
         for input_filepath in args.input_files:
             if input_filepath.strip() == "-":
-                ParsimoniousNodeVisitor.process_input(sys.stdin.read(), builders)
+                front_end.process_input(sys.stdin.read())
             else:
-                print_debug("Processing file '{}'.".format(input_filepath))
-                ParsimoniousNodeVisitor.process_file(input_filepath, builders)
+                front_end.process_file(input_filepath)
+                if args.emit_index:
+                    write_index(session, input_filepath)
+    else:
+        front_end.process_input(sys.stdin.read())
+
+    # Write the codemodel class diagram to output.
+    if args.format == "bin":
+        from .bindiagram import write_binary_class_diagram as write_diagram
     else:
-        ParsimoniousNodeVisitor.process_input(sys.stdin.read(), builders)
+        from .jsonwriter import write_class_diagram as write_diagram
+    with session.phase("write"):
+        if args.output:
+            # Written aside, so a failed build doesn't replace the previous
+            # output.
+            tmp_path = args.output + ".tmp"
+            try:
+                with open(tmp_path, "wb" if args.format == "bin" else "w") as f:
+                    write_diagram(front_end.root_builder, f, profiler)
+                os.replace(tmp_path, args.output)
+            except BaseException:
+                # Don't leave the partly written output behind.
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+                raise
+        else:
+            write_diagram(front_end.root_builder, sys.stdout.buffer if args.format == "bin" else sys.stdout, profiler)
 
-    class_diagram = class_diagram_builder.build()
+    session.print_debug("Include resolution: {}.", session.resolver.stats())
 
-    # Print the codemodel class diagram to output.
-    def print_class_diagram(class_diagram, f):
-        print(codemodel.to_json(class_diagram), end="", file=f)
+    if cache is not None:
+        evicted = cache.evict()
+        session.print_debug("{} entries evicted from the parse cache.", evicted)
 
-    if args.output:
-        with open(args.output, "w") as f:
-            print_class_diagram(class_diagram_builder.build(), f)
-    else:
-        print_class_diagram(class_diagram, sys.stdout)
+    if profiler is not None:
+        profiler.stop()
+        with open(args.profile, "w") as f:
+            profiler.write_report(f, session)
 #endif __main__
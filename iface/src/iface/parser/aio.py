@@ -0,0 +1,108 @@
+"""
+Asyncio entry points of the front end, so many compilations can overlap in
+one event loop. The files and the files they include are read concurrently
+and parsed in an executor, the builders are then fed from the recorded
+events in a worker thread, so the loop is never blocked.
+
+Cancelling a coroutine cancels the reads and parses not started yet. Feeding
+of the builders can't be interrupted, it finishes in its thread, but the
+session must not be used any more then.
+"""
+
+import asyncio
+import os
+
+from .cache import EventsRecorder
+from .module import CompilationSession, compile_files
+
+def _read_file(filepath):
+    with open(filepath, "r") as f:
+        return f.read()
+#enddef
+
+def _parse_input(inp, engine, cache):
+    """
+    Runs in the executor, returns the recorded events of the input.
+    """
+    session = CompilationSession(engine=engine, cache=cache)
+    recorder = EventsRecorder()
+    session.process_input(inp, [ recorder ])
+    return recorder.events
+#enddef
+
+async def prefetch_files_async(session, filepaths, executor=None):
+    """
+    Reads the files and all the files they include (transitively) and
+    resolves the includes concurrently, parses the files in the executor
+    (the default one of the loop if None) and stores the recorded events to
+    the session as prefetched, like prefetch_files() does. A process pool
+    executor needs a picklable parse cache of the session, e.g. ParseCache.
+
+    Files failing to read or parse are left out, the error is reported once
+    the file is processed.
+    """
+    loop = asyncio.get_running_loop()
+    submitted = set()
+    pending = []
+
+    async def fetch(filepath):
+        try:
+            # Reading blocks, it goes to the default executor even if the
+            # parsing goes to a process pool.
+            inp = await loop.run_in_executor(None, _read_file, filepath)
+        except OSError as e:
+            session.print_debug("Prefetching file '{}' failed ({}).", filepath, e)
+            return
+
+        try:
+            events = await loop.run_in_executor(executor, _parse_input, inp, session.engine, session.cache)
+        except Exception as e:
+            session.print_debug("Prefetching file '{}' failed ({}).", filepath, e)
+            return
+        session.prefetched[filepath] = events
+
+        # Included files can be fetched as soon as they are discovered.
+        for event in events:
+            if event is not None and event[0] == "include_filepath":
+                # Resolution can touch the filesystem too.
+                include_filepath = await loop.run_in_executor(None, session.resolver.resolve, event[1])
+                if include_filepath is not None:
+                    submit(include_filepath)
+    #enddef
+
+    def submit(filepath):
+        filepath = os.path.abspath(filepath)
+        if filepath not in submitted and filepath not in session.prefetched:
+            session.print_debug("Prefetching file '{}'.", filepath)
+            submitted.add(filepath)
+            pending.append(loop.create_task(fetch(filepath)))
+    #enddef
+
+    for filepath in filepaths:
+        submit(filepath)
+
+    try:
+        while pending:
+            await pending.pop()
+    finally:
+        for task in pending:
+            task.cancel()
+#enddef
+
+async def process_file_async(session, filepath, builders, executor=None):
+    """
+    Asynchronous CompilationSession.process_file(), the file and the files it
+    includes are prefetched by prefetch_files_async().
+    """
+    await prefetch_files_async(session, [ filepath ], executor)
+    await asyncio.get_running_loop().run_in_executor(None, session.process_file, filepath, builders)
+#enddef
+
+async def compile_async(session, filepaths, executor=None):
+    """
+    Asynchronous compile_files(), all the files and the files they include
+    are prefetched by prefetch_files_async() at once. Returns the front end.
+    """
+    await prefetch_files_async(session, filepaths, executor)
+    return await asyncio.get_running_loop().run_in_executor(None, compile_files, session, filepaths)
+#enddef
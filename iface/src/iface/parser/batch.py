@@ -0,0 +1,148 @@
+import concurrent.futures
+import json
+import os
+import sys
+import time
+
+from .bindiagram import write_binary_class_diagram
+from .cache import MemoryParseCache
+from .ifaceidx import MemoryIndex
+from .includes import IncludeResolver
+from .jsonwriter import write_class_diagram
+from .module import CompilationSession, compile_files
+
+class BatchTarget(object):
+    """
+    Output compiled from its input files, with the result of the last build.
+    """
+
+    def __init__(self, inputs, output, include_paths=[]):
+        self.inputs = [ os.path.abspath(path) for path in inputs ]
+        self.output = os.path.abspath(output)
+        self.include_paths = [ os.path.abspath(path) for path in include_paths ]
+        # Seconds the last build took and its error or None.
+        self.elapsed = None
+        self.error = None
+    #enddef
+
+#endclass
+
+def load_batch_manifest(manifest_path):
+    """
+    Returns targets of the batch manifest, a JSON object of the form:
+
+        {
+            "include_paths": [ "include" ],
+            "targets": [
+                { "inputs": [ "a.iface" ], "output": "a.json", "include_paths": [ "a/include" ] },
+                ...
+            ]
+        }
+
+    The top level include paths are searched after the ones of a target.
+    A target may give a single "input" instead of "inputs". Relative paths
+    are relative to the directory of the manifest.
+    """
+    with open(manifest_path, "r") as f:
+        manifest = json.load(f)
+
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    def path(p):
+        return os.path.join(base_dir, p)
+
+    common_include_paths = manifest.get("include_paths", [])
+    targets = []
+    for target in manifest["targets"]:
+        inputs = target["inputs"] if "inputs" in target else [ target["input"] ]
+        include_paths = target.get("include_paths", []) + common_include_paths
+        targets.append(BatchTarget([ path(p) for p in inputs ], path(target["output"]), [ path(p) for p in include_paths ]))
+    return targets
+#enddef
+
+class BatchBuild(object):
+    """
+    Compiles many targets in one process. The targets share the parsed files
+    (in memory, in front of the optional persistent parse cache) and the
+    index of the included files, so an include common to the targets is
+    parsed and indexed once, and the include resolvers of the same include
+    paths. Every target is compiled in its own
+    CompilationSession and written independently, optionally by parallel
+    threads.
+    """
+
+    def __init__(self, targets, engine="parsimonious", cache=None, debug=False, using_all_types=False, output_format="json"):
+        self.targets = targets
+        self._engine = engine
+        self._cache = MemoryParseCache(cache)
+        self._index = MemoryIndex()
+        # Include paths -> IncludeResolver.
+        self._resolvers = {}
+        self._debug = debug
+        self._using_all_types = using_all_types
+        self._output_format = output_format
+    #enddef
+
+    def build_target(self, target):
+        """
+        Compiles the target and writes its output. Returns True on success,
+        the error is stored in the target otherwise.
+        """
+        start = time.perf_counter()
+        try:
+            resolver = self._resolvers.setdefault(tuple(target.include_paths), IncludeResolver(target.include_paths))
+            session = CompilationSession(target.include_paths,
+                    debug=self._debug,
+                    engine=self._engine,
+                    cache=self._cache,
+                    using_all_types=self._using_all_types,
+                    index=self._index,
+                    resolver=resolver)
+            front_end = compile_files(session, target.inputs)
+
+            tmp_path = target.output + ".tmp"
+            try:
+                if self._output_format == "bin":
+                    with open(tmp_path, "wb") as f:
+                        write_binary_class_diagram(front_end.root_builder, f)
+                else:
+                    with open(tmp_path, "w") as f:
+                        write_class_diagram(front_end.root_builder, f)
+                os.replace(tmp_path, target.output)
+            except BaseException:
+                # Don't leave the partly written output behind.
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+                raise
+            target.error = None
+        except Exception as e:
+            target.error = "{}: {}".format(type(e).__name__, e)
+        target.elapsed = time.perf_counter() - start
+        return target.error is None
+    #enddef
+
+    def build(self, jobs=1):
+        """
+        Builds all the targets by up to 'jobs' threads and reports the time
+        every target took. Returns True if all of them succeeded.
+        """
+        start = time.perf_counter()
+        if jobs > 1:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+                results = list(executor.map(self.build_target, self.targets))
+        else:
+            results = [ self.build_target(target) for target in self.targets ]
+
+        for target in self.targets:
+            if target.error is None:
+                print("{:8.3f} s  {}".format(target.elapsed, target.output), file=sys.stderr)
+            else:
+                print("{:8.3f} s  {} FAILED: {}".format(target.elapsed, target.output, target.error), file=sys.stderr)
+        print("{:8.3f} s  {} of {} targets built".format(time.perf_counter() - start, sum(results), len(results)), file=sys.stderr)
+
+        self._cache.evict()
+        return all(results)
+    #enddef
+
+#endclass
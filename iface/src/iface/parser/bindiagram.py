@@ -0,0 +1,383 @@
+"""
+Compact binary form of the class diagram. Downstream generators can load
+just the namespaces and interfaces they need instead of parsing the whole
+JSON.
+
+Layout of the file (little endian):
+
+    header      magic, format version
+    nodes       node records, children always precede their parent
+    strings     interned strings (u32 length, UTF-8 bytes), then a table of
+                their u64 offsets
+    index       entries (u32 full name string, u8 node kind, u64 offset) of
+                the packages and classes sorted by full name
+    footer      u64 offsets and counts of the sections, magic
+
+A node record is a u8 node kind, the attributes encoded as a tagged value
+and a u32 number of children followed by their u64 offsets. All strings in
+the attributes are references into the strings section.
+"""
+
+import mmap
+import struct
+
+# Bump when the format changes.
+BIN_FORMAT_VERSION = 1
+
+BIN_MAGIC = b"IFACEBIN"
+
+_HEADER = struct.Struct("<8sI")
+_FOOTER = struct.Struct("<QQQQQ8s")
+_INDEX_ENTRY = struct.Struct("<IBQ")
+_U8 = struct.Struct("<B")
+_U32 = struct.Struct("<I")
+_U64 = struct.Struct("<Q")
+_I64 = struct.Struct("<q")
+_F64 = struct.Struct("<d")
+
+NODE_PACKAGE = 0
+NODE_CLASS = 1
+NODE_ATTRIBUTE = 2
+
+# Indexed by the node kind, see _node_types().
+_NODE_TYPES = None
+
+def _node_types():
+    # Imported on the first use, opening a diagram doesn't need codemodel
+    # until a node is materialized.
+    global _NODE_TYPES
+    if _NODE_TYPES is None:
+        import codemodel
+        _NODE_TYPES = [ codemodel.Package, codemodel.Class, codemodel.Attribute ]
+    return _NODE_TYPES
+#enddef
+
+_TAG_NONE = 0
+_TAG_FALSE = 1
+_TAG_TRUE = 2
+_TAG_INT = 3
+_TAG_FLOAT = 4
+_TAG_STR = 5
+_TAG_LIST = 6
+_TAG_DICT = 7
+_TAG_BIGINT = 8
+
+class _BinaryWriter(object):
+
+    def __init__(self, f, profiler=None):
+        self._f = f
+        self._profiler = profiler
+        self._node_types = _node_types()
+        self._offset = 0
+        # String -> its index in the strings section.
+        self._strings = {}
+        # (full name, node kind, offset) of the packages and classes.
+        self._index = []
+    #enddef
+
+    def _write(self, data):
+        self._f.write(data)
+        self._offset += len(data)
+    #enddef
+
+    def _intern(self, string):
+        index = self._strings.get(string)
+        if index is None:
+            index = len(self._strings)
+            self._strings[string] = index
+        return index
+    #enddef
+
+    def _encode_value(self, value, out):
+        if value is None:
+            out.append(_U8.pack(_TAG_NONE))
+        elif value is True:
+            out.append(_U8.pack(_TAG_TRUE))
+        elif value is False:
+            out.append(_U8.pack(_TAG_FALSE))
+        elif isinstance(value, int):
+            if -2**63 <= value < 2**63:
+                out.append(_U8.pack(_TAG_INT) + _I64.pack(value))
+            else:
+                out.append(_U8.pack(_TAG_BIGINT) + _U32.pack(self._intern(str(value))))
+        elif isinstance(value, float):
+            out.append(_U8.pack(_TAG_FLOAT) + _F64.pack(value))
+        elif isinstance(value, str):
+            out.append(_U8.pack(_TAG_STR) + _U32.pack(self._intern(value)))
+        elif isinstance(value, (list, tuple)):
+            out.append(_U8.pack(_TAG_LIST) + _U32.pack(len(value)))
+            for item in value:
+                self._encode_value(item, out)
+        elif isinstance(value, dict):
+            out.append(_U8.pack(_TAG_DICT) + _U32.pack(len(value)))
+            for key, item in value.items():
+                out.append(_U32.pack(self._intern(str(key))))
+                self._encode_value(item, out)
+        else:
+            raise TypeError("Unsupported attribute value type ({}).".format(type(value).__name__))
+    #enddef
+
+    def write_header(self):
+        self._write(_HEADER.pack(BIN_MAGIC, BIN_FORMAT_VERSION))
+    #enddef
+
+    def write_node(self, builder, parent_name):
+        """
+        Writes the subtree of the builder, children first, and returns offset
+        of the node record.
+        """
+        if self._profiler is None:
+            diagram_node = builder.build_node()
+        else:
+            with self._profiler.phase("build"):
+                diagram_node = builder.build_node()
+        kind = self._node_types.index(type(diagram_node))
+
+        full_name = parent_name
+        if kind != NODE_ATTRIBUTE and diagram_node.attributes.get("name"):
+            name = diagram_node.attributes["name"]
+            full_name = parent_name + "." + name if parent_name else name
+
+        children_offsets = [ self.write_node(child_builder, full_name) for child_builder in builder.child_builders ]
+
+        offset = self._offset
+        if kind != NODE_ATTRIBUTE and full_name:
+            self._index.append((full_name, kind, offset))
+
+        if self._profiler is None:
+            self._write_record(kind, diagram_node, children_offsets)
+        else:
+            with self._profiler.phase("serialize"):
+                self._write_record(kind, diagram_node, children_offsets)
+        return offset
+    #enddef
+
+    def _write_record(self, kind, diagram_node, children_offsets):
+        out = [ _U8.pack(kind) ]
+        self._encode_value(diagram_node.attributes, out)
+        out.append(_U32.pack(len(children_offsets)))
+        out.extend(_U64.pack(child_offset) for child_offset in children_offsets)
+        self._write(b"".join(out))
+    #enddef
+
+    def write_footer(self, root_offset):
+        # Reopened namespaces give several packages of the same name, they
+        # stay in the order of the document.
+        index = sorted(self._index)
+        # Intern the names before the strings section is written.
+        name_indexes = [ self._intern(full_name) for full_name, _, _ in index ]
+
+        string_offsets = []
+        for string in self._strings:
+            string_offsets.append(self._offset)
+            data = string.encode("utf-8")
+            self._write(_U32.pack(len(data)) + data)
+        strings_offset = self._offset
+        self._write(b"".join(_U64.pack(string_offset) for string_offset in string_offsets))
+
+        index_offset = self._offset
+        for name_index, (_, kind, offset) in zip(name_indexes, index):
+            self._write(_INDEX_ENTRY.pack(name_index, kind, offset))
+
+        self._write(_FOOTER.pack(root_offset, strings_offset, len(string_offsets), index_offset, len(index), BIN_MAGIC))
+    #enddef
+
+#endclass
+
+def write_binary_class_diagram(builder, f, profiler=None):
+    """
+    Writes the class diagram of the builders tree to the binary file object.
+    Like write_class_diagram(), every subtree is built and written right
+    away and the tree is built just once. The file doesn't need to be
+    seekable. With a profiler, building and serialization are measured as
+    the 'build' and 'serialize' phases.
+    """
+    writer = _BinaryWriter(f, profiler)
+    writer.write_header()
+    root_offset = writer.write_node(builder, "")
+    writer.write_footer(root_offset)
+#enddef
+
+class BinaryClassDiagram(object):
+    """
+    Lazy loader of the binary class diagram. The file is memory-mapped and
+    the Package, Class and Attribute nodes are materialized only when asked
+    for by their full name (see node()). The nodes are found by binary search
+    in the sorted index, opening the diagram reads just the header and the
+    footer.
+    """
+
+    def __init__(self, filepath):
+        with open(filepath, "rb") as f:
+            try:
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # Empty file.
+                raise RuntimeError("File '{}' isn't a binary class diagram.".format(filepath))
+
+        try:
+            magic, version = _HEADER.unpack_from(self._mmap, 0)
+            footer = _FOOTER.unpack_from(self._mmap, len(self._mmap) - _FOOTER.size)
+        except struct.error:
+            self.close()
+            raise RuntimeError("File '{}' isn't a binary class diagram.".format(filepath))
+
+        if magic != BIN_MAGIC or footer[5] != BIN_MAGIC:
+            self.close()
+            raise RuntimeError("File '{}' isn't a binary class diagram.".format(filepath))
+        if version != BIN_FORMAT_VERSION:
+            self.close()
+            raise RuntimeError("Unsupported version {} of the binary class diagram '{}'.".format(version, filepath))
+
+        self._root_offset, self._strings_offset, self._strings_count, self._index_offset, self._index_count, _ = footer
+        # String index -> decoded string.
+        self._strings = {}
+    #enddef
+
+    def close(self):
+        self._mmap.close()
+    #enddef
+
+    def __enter__(self):
+        return self
+    #enddef
+
+    def __exit__(self, *exc_info):
+        self.close()
+    #enddef
+
+    def _string(self, index):
+        string = self._strings.get(index)
+        if string is None:
+            if index >= self._strings_count:
+                raise RuntimeError("Broken binary class diagram (string {} out of range).".format(index))
+            string_offset = _U64.unpack_from(self._mmap, self._strings_offset + index * _U64.size)[0]
+            length = _U32.unpack_from(self._mmap, string_offset)[0]
+            start = string_offset + _U32.size
+            string = self._mmap[start:start + length].decode("utf-8")
+            self._strings[index] = string
+        return string
+    #enddef
+
+    def _index_entry(self, i):
+        name_index, kind, offset = _INDEX_ENTRY.unpack_from(self._mmap, self._index_offset + i * _INDEX_ENTRY.size)
+        return self._string(name_index), offset
+    #enddef
+
+    def _offsets(self, full_name):
+        """
+        Returns offsets of the nodes of the full name, found by binary search
+        in the sorted index, the entries of the same name follow each other.
+        """
+        low, high = 0, self._index_count
+        while low < high:
+            middle = (low + high) // 2
+            if self._index_entry(middle)[0] < full_name:
+                low = middle + 1
+            else:
+                high = middle
+
+        offsets = []
+        for i in range(low, self._index_count):
+            name, offset = self._index_entry(i)
+            if name != full_name:
+                break
+            offsets.append(offset)
+        return offsets
+    #enddef
+
+    def names(self):
+        """
+        Returns sorted full names of the packages and classes.
+        """
+        names = []
+        for i in range(self._index_count):
+            name = self._index_entry(i)[0]
+            if not names or names[-1] != name:
+                names.append(name)
+        return names
+    #enddef
+
+    def _decode_value(self, pos):
+        tag = self._mmap[pos]
+        pos += 1
+        if tag == _TAG_NONE:
+            return None, pos
+        elif tag == _TAG_FALSE:
+            return False, pos
+        elif tag == _TAG_TRUE:
+            return True, pos
+        elif tag == _TAG_INT:
+            return _I64.unpack_from(self._mmap, pos)[0], pos + _I64.size
+        elif tag == _TAG_BIGINT:
+            return int(self._string(_U32.unpack_from(self._mmap, pos)[0])), pos + _U32.size
+        elif tag == _TAG_FLOAT:
+            return _F64.unpack_from(self._mmap, pos)[0], pos + _F64.size
+        elif tag == _TAG_STR:
+            return self._string(_U32.unpack_from(self._mmap, pos)[0]), pos + _U32.size
+        elif tag == _TAG_LIST:
+            count = _U32.unpack_from(self._mmap, pos)[0]
+            pos += _U32.size
+            value = []
+            for _ in range(count):
+                item, pos = self._decode_value(pos)
+                value.append(item)
+            return value, pos
+        elif tag == _TAG_DICT:
+            count = _U32.unpack_from(self._mmap, pos)[0]
+            pos += _U32.size
+            value = {}
+            for _ in range(count):
+                key = self._string(_U32.unpack_from(self._mmap, pos)[0])
+                value[key], pos = self._decode_value(pos + _U32.size)
+            return value, pos
+        else:
+            raise RuntimeError("Broken binary class diagram (unknown value tag {} at {}).".format(tag, pos - 1))
+    #enddef
+
+    def _materialize(self, offset, children):
+        kind = self._mmap[offset]
+        node = _node_types()[kind]()
+        node.attributes, pos = self._decode_value(offset + 1)
+        if children:
+            count = _U32.unpack_from(self._mmap, pos)[0]
+            pos += _U32.size
+            for i in range(count):
+                child_offset = _U64.unpack_from(self._mmap, pos + i * _U64.size)[0]
+                node.add(self._materialize(child_offset, children))
+        return node
+    #enddef
+
+    def root(self, children=True):
+        """
+        Returns the root package, by default with the whole diagram.
+        """
+        return self._materialize(self._root_offset, children)
+    #enddef
+
+    def node(self, full_name, children=True):
+        """
+        Returns the package or class of the full name, by default with all
+        its content, or without the children nodes. A namespace opened more
+        times in the input gives more packages, the first one is returned
+        (see nodes()). Raises KeyError if there is no such node.
+        """
+        offsets = self._offsets(full_name)
+        if not offsets:
+            raise KeyError(full_name)
+        return self._materialize(offsets[0], children)
+    #enddef
+
+    def nodes(self, full_name, children=True):
+        """
+        Returns all the packages or classes of the full name in the order of
+        the input.
+        """
+        return [ self._materialize(offset, children) for offset in self._offsets(full_name) ]
+    #enddef
+
+    def __contains__(self, full_name):
+        return bool(self._offsets(full_name))
+    #enddef
+
+#endclass
@@ -0,0 +1,341 @@
+import collections
+import hashlib
+import os
+import pickle
+import threading
+import time
+
+from .module import grammar_definition
+
+# Bump when the format of the stored events changes.
+CACHE_FORMAT_VERSION = 1
+
+CACHE_DIR_ENV = "IFACE_CACHE_DIR"
+
+DEFAULT_MAX_SIZE = 256 * 1024 * 1024
+DEFAULT_MAX_AGE = 30 * 24 * 60 * 60
+# Seconds between the scans of the cache by ParseCache.evict().
+DEFAULT_EVICT_INTERVAL = 60 * 60
+# File in the cache directory touched by every scan, it isn't a shard.
+EVICTION_STAMP = "last-eviction"
+DEFAULT_MAX_ENTRIES = 4096
+
+def _grammar_hash():
+    grammar_hash = hashlib.sha256()
+    grammar_hash.update(str(CACHE_FORMAT_VERSION).encode("utf-8"))
+    grammar_hash.update(grammar_definition.encode("utf-8"))
+    return grammar_hash
+#enddef
+
+_GRAMMAR_HASH = _grammar_hash()
+
+def input_key(inp):
+    """
+    Returns the cache key of the input, the hash of the input content and of
+    the grammar.
+    """
+    key_hash = _GRAMMAR_HASH.copy()
+    key_hash.update(inp.encode("utf-8"))
+    return key_hash.hexdigest()
+#enddef
+
+def default_grammar_cache_dir():
+    """
+    Returns the directory of the compiled grammar cache: ${IFACE_CACHE_DIR}
+    or 'iface' in the user cache directory (${XDG_CACHE_HOME} or ~/.cache).
+    """
+    cache_dir = os.environ.get(CACHE_DIR_ENV)
+    if cache_dir:
+        return cache_dir
+    return os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"), "iface")
+#enddef
+
+def load_grammar(cache_dir=None):
+    """
+    Returns the compiled grammar, unpickled from the cache directory or
+    compiled and stored there. The entry is keyed by the hash of the grammar
+    and of the installed parsimonious, so it's never stale. A cache which
+    can't be read or written just costs the compilation.
+    """
+    import parsimonious
+    import parsimonious.expressions
+
+    if cache_dir is None:
+        cache_dir = default_grammar_cache_dir()
+
+    key_hash = _GRAMMAR_HASH.copy()
+    try:
+        st = os.stat(parsimonious.expressions.__file__)
+        key_hash.update("{}:{}:{}".format(parsimonious.expressions.__file__, st.st_size, st.st_mtime_ns).encode("utf-8"))
+    except OSError:
+        # Unknown installation, e.g. a zip import.
+        return parsimonious.Grammar(grammar_definition)
+    # The ParseCache shards are directories, so the entry isn't evicted.
+    entry_path = os.path.join(cache_dir, "grammar-{}.pickle".format(key_hash.hexdigest()))
+
+    try:
+        with open(entry_path, "rb") as f:
+            grammar = pickle.load(f)
+        if isinstance(grammar, parsimonious.Grammar):
+            return grammar
+    except Exception:
+        # Missing or broken entry, it will be overwritten.
+        pass
+
+    grammar = parsimonious.Grammar(grammar_definition)
+    try:
+        import tempfile
+        os.makedirs(cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=cache_dir)
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(grammar, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, entry_path)
+    except OSError:
+        pass
+    return grammar
+#enddef
+
+class EventsRecorder(object):
+    """
+    Builder recording the nodes of interest in a compact, flattened form.
+    Begin of a node is stored as a (name, text) tuple, end of the most
+    recently begun node is stored as None.
+    """
+
+    def __init__(self):
+        self.events = []
+    #enddef
+
+    def node_begin(self, node):
+        self.events.append((node.name, node.text))
+    #enddef
+
+    def node_end(self, node):
+        self.events.append(None)
+    #enddef
+
+#endclass
+
+class CachedNode(object):
+
+    __slots__ = ("name", "text")
+
+    def __init__(self, name, text):
+        self.name = name
+        self.text = text
+    #enddef
+
+    def __str__(self):
+        return self.name
+    #enddef
+
+#endclass
+
+def replay_events(events, builders, session):
+    """
+    Feeds the events recorded by the EventsRecorder to the builders.
+    """
+    debug = session.debug
+    nodes_stack = []
+    for event in events:
+        if event is not None:
+            node = CachedNode(*event)
+            nodes_stack.append(node)
+            if debug:
+                session.print_debug("Node {} begin.", node)
+            for builder in builders:
+                builder.node_begin(node)
+        else:
+            node = nodes_stack.pop()
+            if debug:
+                session.print_debug("Node {} end.", node)
+            for builder in builders:
+                builder.node_end(node)
+#enddef
+
+class ParseCache(object):
+    """
+    On-disk cache of the parsed inputs. Entries are keyed by the hash of the
+    input content and of the grammar, so an entry is never stale, it just
+    stops being used. Unused entries are removed by evict(), at most once per
+    the evict interval. The time of the last eviction is kept by the mtime
+    of the EVICTION_STAMP file in the cache directory.
+
+    The cache holds no state of a compilation, it can be shared by sessions
+    running in parallel threads or processes.
+    """
+
+    def __init__(self, cache_dir, max_size=DEFAULT_MAX_SIZE, max_age=DEFAULT_MAX_AGE, evict_interval=DEFAULT_EVICT_INTERVAL):
+        self._cache_dir = cache_dir
+        self._max_size = max_size
+        self._max_age = max_age
+        self._evict_interval = evict_interval
+        # Number of the entries stored by this instance.
+        self._stored = 0
+    #enddef
+
+    @property
+    def cache_dir(self):
+        return self._cache_dir
+    #enddef
+
+    def key(self, inp):
+        return input_key(inp)
+    #enddef
+
+    def _entry_path(self, key):
+        return os.path.join(self._cache_dir, key[:2], key)
+    #enddef
+
+    def load(self, key):
+        """
+        Returns the recorded events or None if there is no usable entry.
+        """
+        entry_path = self._entry_path(key)
+        try:
+            with open(entry_path, "rb") as f:
+                events = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            # Broken entry, it will be overwritten.
+            return None
+
+        # Refresh the entry so the eviction removes the least recently used
+        # entries first.
+        try:
+            os.utime(entry_path)
+        except OSError:
+            pass
+
+        return events
+    #enddef
+
+    def store(self, key, events):
+        entry_path = self._entry_path(key)
+        os.makedirs(os.path.dirname(entry_path), exist_ok=True)
+
+        # Write to a temporary file first so concurrently running compilations
+        # never see an incomplete entry.
+        import tempfile
+        fd, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=os.path.dirname(entry_path))
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(events, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, entry_path)
+        self._stored += 1
+    #enddef
+
+    def _evicted_recently(self):
+        try:
+            return time.time() - os.stat(os.path.join(self._cache_dir, EVICTION_STAMP)).st_mtime < self._evict_interval
+        except OSError:
+            return False
+    #enddef
+
+    def evict(self, force=False):
+        """
+        Removes entries not used for longer than the max age and then the
+        least recently used entries until the cache fits the max size.
+        Returns number of the evicted entries. Unless forced, the cache is
+        scanned only if this instance stored an entry, so it could have grown,
+        and no eviction ran within the evict interval.
+        """
+        if not os.path.isdir(self._cache_dir):
+            return 0
+        if not force and (not self._stored or self._evicted_recently()):
+            return 0
+
+        entries = []
+        for shard in os.listdir(self._cache_dir):
+            shard_path = os.path.join(self._cache_dir, shard)
+            if not os.path.isdir(shard_path):
+                continue
+            for entry in os.listdir(shard_path):
+                entry_path = os.path.join(shard_path, entry)
+                try:
+                    st = os.stat(entry_path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, entry_path))
+
+        now = time.time()
+        total_size = 0
+        evicted = 0
+        for mtime, size, entry_path in sorted(entries, reverse=True):
+            if now - mtime > self._max_age or total_size + size > self._max_size:
+                try:
+                    os.remove(entry_path)
+                    evicted += 1
+                except OSError:
+                    pass
+            else:
+                total_size += size
+
+        stamp_path = os.path.join(self._cache_dir, EVICTION_STAMP)
+        try:
+            with open(stamp_path, "a"):
+                pass
+            os.utime(stamp_path)
+        except OSError:
+            pass
+        self._stored = 0
+        return evicted
+    #enddef
+
+#endclass
+
+class MemoryParseCache(object):
+    """
+    In-memory parse cache for long running processes serving many
+    compilations, optionally in front of a persistent ParseCache. It keeps
+    up to 'max_entries' least recently used entries.
+    """
+
+    def __init__(self, backing_cache=None, max_entries=DEFAULT_MAX_ENTRIES):
+        self._backing_cache = backing_cache
+        self._max_entries = max_entries
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+    #enddef
+
+    def key(self, inp):
+        return input_key(inp)
+    #enddef
+
+    def load(self, key):
+        with self._lock:
+            events = self._entries.get(key)
+            if events is not None:
+                self._entries.move_to_end(key)
+                return events
+
+        if self._backing_cache is None:
+            return None
+
+        events = self._backing_cache.load(key)
+        if events is not None:
+            self._remember(key, events)
+        return events
+    #enddef
+
+    def store(self, key, events):
+        self._remember(key, events)
+        if self._backing_cache is not None:
+            self._backing_cache.store(key, events)
+    #enddef
+
+    def _remember(self, key, events):
+        with self._lock:
+            self._entries[key] = events
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+    #enddef
+
+    def evict(self, force=False):
+        if self._backing_cache is None:
+            return 0
+        return self._backing_cache.evict(force)
+    #enddef
+
+#endclass
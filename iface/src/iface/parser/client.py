@@ -0,0 +1,77 @@
+"""
+Thin client of the compile server (see CompileServer). It depends only on
+the standard library and can be run as a plain script, so a build system
+doesn't pay for importing the parser on every compilation.
+"""
+
+import json
+import os
+import socket
+
+def compile_remote(socket_path, inputs, include_paths=[], output="", engine="", using_all_types=False):
+    """
+    Sends a compile request to the server. Returns the class diagram JSON or
+    None when written by the server to the output file.
+    """
+    request = {
+        "inputs": [ os.path.abspath(path) for path in inputs ],
+        "include_paths": [ os.path.abspath(path) for path in include_paths ]
+    }
+    if output:
+        request["output"] = os.path.abspath(output)
+    if engine:
+        request["engine"] = engine
+    if using_all_types:
+        request["using_all_types"] = True
+
+    response = _send_request(socket_path, request)
+    if response["status"] != "ok":
+        raise RuntimeError(response["error"])
+    return response.get("class_diagram")
+#enddef
+
+def shutdown_server(socket_path):
+    _send_request(socket_path, { "shutdown": True })
+#enddef
+
+def _send_request(socket_path, request):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path)
+        with sock.makefile("rwb") as f:
+            f.write(json.dumps(request).encode("utf-8") + b"\n")
+            f.flush()
+            line = f.readline()
+
+    if not line:
+        raise RuntimeError("Compile server closed the connection.")
+    return json.loads(line.decode("utf-8"))
+#enddef
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    args_parser = argparse.ArgumentParser(description="Compile the input by a running compile server.")
+    args_parser.add_argument("-s", "--socket", dest="socket_path", required=True, help="Unix domain socket of the compile server")
+    args_parser.add_argument("-o", "--output", dest="output", default="", help="output file base name or empty (default) for stdout")
+    args_parser.add_argument("-I", "--includepath", dest="include_paths", action="append", default=[], help="paths where to look for included files")
+    args_parser.add_argument("-e", "--engine", dest="engine", default="", help="parser engine or empty (default) for the one of the server")
+    args_parser.add_argument("--using-all-types", dest="using_all_types", default=False, action="store_true", help="list all the known types in the 'using' section of the output, not just the referenced ones")
+    args_parser.add_argument("--shutdown", dest="shutdown", default=False, action="store_true", help="stop the compile server")
+    args_parser.add_argument("input_files", metavar="INPUT_FILE", nargs="*")
+
+    args = args_parser.parse_args()
+
+    if args.shutdown:
+        shutdown_server(args.socket_path)
+        sys.exit(0)
+
+    try:
+        class_diagram = compile_remote(args.socket_path, args.input_files, args.include_paths, args.output, args.engine, args.using_all_types)
+    except RuntimeError as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
+
+    if class_diagram is not None:
+        print(class_diagram, end="")
+#endif __main__
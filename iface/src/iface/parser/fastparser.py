@@ -0,0 +1,496 @@
+import re
+
+_WHSP = re.compile(r"\s+")
+_COMMENT = re.compile(r"#.*")
+_NAME = re.compile(r"[a-zA-Z_][a-zA-Z0-9_]*")
+_INCLUDE_FILEPATH = re.compile(r'[^"]*')
+_FIELD_ID = re.compile(r"[1-9][0-9]*")
+_ATTR_PATH = re.compile(r"[a-zA-Z_][a-zA-Z0-9_.]*")
+_ATTR_VALUE_STRING = re.compile(r'"[^"]*"')
+_ATTR_VALUE_BOOL_TRUE = re.compile(r"[tT][rR][uU][eE]")
+_ATTR_VALUE_BOOL_FALSE = re.compile(r"[fF][aA][lL][sS][eE]")
+_ATTR_VALUE_INT = re.compile(r"[0-9]+")
+_ATTR_VALUE_FLOAT = re.compile(r"[0-9]*\.[0-9]+")
+
+_FAIL = -1
+
+STREAM_CHUNK_SIZE = 1024 * 1024
+
+class FastParser(object):
+    """
+    Hand-written recursive descent parser of the 'grammar'. It follows the
+    PEG rules exactly (ordered choices, greedy repetitions, no backtracking
+    into a matched optional part), but without the packrat memoization and
+    without building the concrete syntax tree. Only the nodes of interest
+    are created and fed to the builders in the same order and with the same
+    text as the ParsimoniousNodeVisitor does.
+    """
+
+    class Node(object):
+
+        __slots__ = ("name", "start", "end", "_inp")
+
+        def __init__(self, name, inp, start, end=None):
+            self.name = name
+            self.start = start
+            self.end = end
+            self._inp = inp
+        #enddef
+
+        @property
+        def text(self):
+            return self._inp[self.start:self.end]
+        #enddef
+
+        def __str__(self):
+            return self.name
+        #enddef
+
+    #endclass
+
+    def __init__(self, inp, session):
+        self._session = session
+        self._inp = inp
+        self._size = len(inp)
+        # Node instance marks the node begin, None marks the end of the most
+        # recently begun node which hasn't ended yet.
+        self._events = []
+        # Positions (past the leading empties) where no keyword alternative
+        # of consistent_block matches. The fallback to 'empty' stops short of
+        # them, so the block would be parsed again there, for every level of
+        # an unterminated nested block.
+        self._failed_blocks = set()
+        # Position of the input start within the whole stream, used only to
+        # report errors.
+        self._line_offset = 0
+        self._column_offset = 0
+    #enddef
+
+    @classmethod
+    def process_file(cls, fpath, builders, session):
+        with open(fpath, "r") as f:
+            inp = f.read()
+            cls.process_input(inp, builders, session)
+    #enddef
+
+    @classmethod
+    def process_input(cls, inp, builders, session):
+        parser = cls(inp, session)
+        with session.phase("parse"):
+            parser.parse()
+        with session.phase("visit"):
+            parser.dispatch(builders)
+    #enddef
+
+    @classmethod
+    def process_stream(cls, f, builders, session, chunk_size=STREAM_CHUNK_SIZE):
+        """
+        Reads the input from the file object by chunks and feeds the builders
+        one top level block (consistent_block) at a time, so only the block
+        being processed is held in memory.
+        """
+        with session.phase("parse_stream"):
+            cls._process_stream(f, builders, session, chunk_size)
+    #enddef
+
+    @classmethod
+    def _process_stream(cls, f, builders, session, chunk_size):
+        parser = cls("", session)
+        pos = 0
+        eof = False
+        while True:
+            end = parser._consistent_block(pos) if pos < parser._size else pos
+
+            # A keyword block is complete once its closing token is parsed.
+            # Anything else (the block ends up as 'empty') may be just cut by
+            # the end of the chunk, so read more and parse the block again.
+            if not eof and (not parser._events or end >= parser._size):
+                parser._events = []
+                parser._drop_parsed(pos)
+                pos = 0
+                # Read at least as much as is buffered already, so a huge
+                # block isn't parsed again and again.
+                chunk = f.read(max(chunk_size, parser._size))
+                if chunk:
+                    parser._inp += chunk
+                    parser._size = len(parser._inp)
+                else:
+                    eof = True
+                continue
+
+            parser.dispatch(builders)
+            if end == pos:
+                break
+            pos = end
+
+        if pos != parser._size:
+            parser._raise_parse_error(pos)
+    #enddef
+
+    def _drop_parsed(self, pos):
+        parsed = self._inp[:pos]
+        last_newline = parsed.rfind("\n")
+        if last_newline < 0:
+            self._column_offset += len(parsed)
+        else:
+            self._line_offset += parsed.count("\n")
+            self._column_offset = len(parsed) - last_newline - 1
+        self._inp = self._inp[pos:]
+        self._size = len(self._inp)
+        # The positions shift and more input follows, a failed block may
+        # match then.
+        self._failed_blocks.clear()
+    #enddef
+
+    def parse(self):
+        pos = self._file(0)
+        if pos != self._size:
+            self._raise_parse_error(pos)
+    #enddef
+
+    def _raise_parse_error(self, pos):
+        line = self._inp.count("\n", 0, pos)
+        last_newline = self._inp.rfind("\n", 0, pos)
+        column = pos - last_newline
+        if last_newline < 0:
+            column += self._column_offset
+        raise RuntimeError("Cannot parse the input at line {}, column {}.".format(self._line_offset + line + 1, column))
+    #enddef
+
+    def dispatch(self, builders):
+        """
+        Feeds the parsed nodes of interest to the builders and releases them.
+        """
+        debug = self._session.debug
+        nodes_stack = []
+        for node in self._events:
+            if node is not None:
+                nodes_stack.append(node)
+                if debug:
+                    self._session.print_debug("Node {} begin.", node)
+                for builder in builders:
+                    builder.node_begin(node)
+            else:
+                node = nodes_stack.pop()
+                if debug:
+                    self._session.print_debug("Node {} end.", node)
+                for builder in builders:
+                    builder.node_end(node)
+        self._events = []
+    #enddef
+
+    def _begin(self, name, pos):
+        node = FastParser.Node(name, self._inp, pos)
+        self._events.append(node)
+        return node
+    #enddef
+
+    def _end(self, node, pos):
+        node.end = pos
+        self._events.append(None)
+        return pos
+    #enddef
+
+    def _leaf(self, name, start, end):
+        self._events.append(FastParser.Node(name, self._inp, start, end))
+        self._events.append(None)
+        return end
+    #enddef
+
+    def _fail(self, mark):
+        del self._events[mark:]
+        return _FAIL
+    #enddef
+
+    def _whsp_opt(self, pos):
+        m = _WHSP.match(self._inp, pos)
+        return m.end() if m else pos
+    #enddef
+
+    # file = consistent_block*
+    def _file(self, pos):
+        while pos < self._size:
+            end = self._consistent_block(pos)
+            if end == pos:
+                break
+            pos = end
+        return pos
+    #enddef
+
+    # consistent_block = include / ns / using_directive / interface / empty
+    def _consistent_block(self, pos):
+        mark = len(self._events)
+        p = self._empties(pos)
+        inp = self._inp
+        if p in self._failed_blocks:
+            return self._empty(pos)
+        if inp.startswith("@", p):
+            # Only the attributed alternatives can match, try them in order.
+            for alternative in (self._ns, self._using_directive, self._interface):
+                end = alternative(pos)
+                if end != _FAIL:
+                    return end
+                self._fail(mark)
+        else:
+            # Without attributes the keyword decides which alternative could
+            # match, the others would fail on it.
+            alternative = None
+            if inp.startswith("include", p):
+                alternative = self._include
+            elif inp.startswith("namespace", p):
+                alternative = self._ns
+            elif inp.startswith("using", p):
+                alternative = self._using_directive
+            elif inp.startswith("interface", p):
+                alternative = self._interface
+            if alternative:
+                end = alternative(pos)
+                if end != _FAIL:
+                    return end
+                self._fail(mark)
+        self._failed_blocks.add(p)
+        return self._empty(pos)
+    #enddef
+
+    # empty = whsp? comment?
+    def _empty(self, pos):
+        pos = self._whsp_opt(pos)
+        m = _COMMENT.match(self._inp, pos)
+        return m.end() if m else pos
+    #enddef
+
+    # empty*
+    def _empties(self, pos):
+        while pos < self._size:
+            end = self._empty(pos)
+            if end == pos:
+                break
+            pos = end
+        return pos
+    #enddef
+
+    # attr*
+    def _attrs(self, pos):
+        while pos < self._size:
+            end = self._attr(pos)
+            if end == _FAIL:
+                break
+            pos = end
+        return pos
+    #enddef
+
+    # include = empty* include_decl
+    # include_decl = "include" whsp '"' include_filepath '"'
+    def _include(self, pos):
+        mark = len(self._events)
+        inp = self._inp
+        node = self._begin("include", pos)
+        p = self._empties(pos)
+        if not inp.startswith("include", p):
+            return self._fail(mark)
+        m = _WHSP.match(inp, p + 7)
+        if not m or not inp.startswith('"', m.end()):
+            return self._fail(mark)
+        m = _INCLUDE_FILEPATH.match(inp, m.end() + 1)
+        p = self._leaf("include_filepath", m.start(), m.end())
+        if not inp.startswith('"', p):
+            return self._fail(mark)
+        return self._end(node, p + 1)
+    #enddef
+
+    # attr = empty* attr_decl attr_value_notation?
+    # attr_decl = "@" attr_path
+    def _attr(self, pos):
+        mark = len(self._events)
+        node = self._begin("attr", pos)
+        p = self._empties(pos)
+        if not self._inp.startswith("@", p):
+            return self._fail(mark)
+        m = _ATTR_PATH.match(self._inp, p + 1)
+        if not m:
+            return self._fail(mark)
+        p = self._leaf("attr_path", m.start(), m.end())
+        end = self._attr_value_notation(p)
+        if end != _FAIL:
+            p = end
+        return self._end(node, p)
+    #enddef
+
+    # attr_value_notation = attr_value_open attr_value attr_value_close
+    # attr_value = attr_value_string / attr_value_bool / attr_value_int / attr_value_float
+    def _attr_value_notation(self, pos):
+        inp = self._inp
+        if not inp.startswith("(", pos):
+            return _FAIL
+        mark = len(self._events)
+        pos += 1
+        m = _ATTR_VALUE_STRING.match(inp, pos)
+        if m:
+            pos = self._leaf("attr_value_string", m.start(), m.end())
+        else:
+            m = _ATTR_VALUE_BOOL_TRUE.match(inp, pos) or _ATTR_VALUE_BOOL_FALSE.match(inp, pos)
+            if m:
+                pos = self._leaf("attr_value_bool", m.start(), m.end())
+            else:
+                m = _ATTR_VALUE_INT.match(inp, pos)
+                if m:
+                    pos = self._leaf("attr_value_int", m.start(), m.end())
+                else:
+                    m = _ATTR_VALUE_FLOAT.match(inp, pos)
+                    if not m:
+                        return _FAIL
+                    pos = self._leaf("attr_value_float", m.start(), m.end())
+        if not inp.startswith(")", pos):
+            return self._fail(mark)
+        return pos + 1
+    #enddef
+
+    # ns = attr* empty* ns_decl empty* ns_body_open consistent_block* ns_body_close
+    # ns_decl = "namespace" whsp ns_name
+    def _ns(self, pos):
+        mark = len(self._events)
+        inp = self._inp
+        node = self._begin("ns", pos)
+        p = self._empties(self._attrs(pos))
+        if not inp.startswith("namespace", p):
+            return self._fail(mark)
+        m = _WHSP.match(inp, p + 9)
+        m = m and _NAME.match(inp, m.end())
+        if not m:
+            return self._fail(mark)
+        p = self._empties(self._leaf("ns_name", m.start(), m.end()))
+        if not inp.startswith("{", p):
+            return self._fail(mark)
+        p += 1
+        while p < self._size:
+            end = self._consistent_block(p)
+            if end == p:
+                break
+            p = end
+        if not inp.startswith("}", p):
+            return self._fail(mark)
+        return self._end(node, p + 1)
+    #enddef
+
+    # using_directive = attr* empty* using_directive_keyword whsp type_name empty* directive_end
+    def _using_directive(self, pos):
+        mark = len(self._events)
+        inp = self._inp
+        node = self._begin("using_directive", pos)
+        p = self._empties(self._attrs(pos))
+        if not inp.startswith("using", p):
+            return self._fail(mark)
+        m = _WHSP.match(inp, p + 5)
+        m = m and _NAME.match(inp, m.end())
+        if not m:
+            return self._fail(mark)
+        p = self._empties(self._leaf("type_name", m.start(), m.end()))
+        if not inp.startswith(";", p):
+            return self._fail(mark)
+        return self._end(node, p + 1)
+    #enddef
+
+    # interface = attr* empty* interface_decl whsp? interface_base? empty* interface_body_open field* empty* interface_body_close
+    # interface_decl = "interface" whsp type_name
+    def _interface(self, pos):
+        mark = len(self._events)
+        inp = self._inp
+        node = self._begin("interface", pos)
+        p = self._empties(self._attrs(pos))
+        if not inp.startswith("interface", p):
+            return self._fail(mark)
+        m = _WHSP.match(inp, p + 9)
+        m = m and _NAME.match(inp, m.end())
+        if not m:
+            return self._fail(mark)
+        p = self._whsp_opt(self._leaf("type_name", m.start(), m.end()))
+        end = self._interface_base(p)
+        if end != _FAIL:
+            p = end
+        p = self._empties(p)
+        if not inp.startswith("{", p):
+            return self._fail(mark)
+        p += 1
+        while p < self._size:
+            end = self._field(p)
+            if end == _FAIL:
+                break
+            p = end
+        p = self._empties(p)
+        if not inp.startswith("}", p):
+            return self._fail(mark)
+        return self._end(node, p + 1)
+    #enddef
+
+    # interface_base = ":" whsp? type_ref
+    # type_ref = type_ns_part* type_name
+    # type_ns_part = ns_name "."
+    def _interface_base(self, pos):
+        inp = self._inp
+        if not inp.startswith(":", pos):
+            return _FAIL
+        mark = len(self._events)
+        node = self._begin("interface_base", pos)
+        p = self._whsp_opt(pos + 1)
+        type_ref_node = self._begin("type_ref", p)
+        while p < self._size:
+            m = _NAME.match(inp, p)
+            if not m or not inp.startswith(".", m.end()):
+                break
+            p = self._leaf("ns_name", m.start(), m.end()) + 1
+        m = _NAME.match(inp, p)
+        if not m:
+            return self._fail(mark)
+        p = self._leaf("type_name", m.start(), m.end())
+        self._end(type_ref_node, p)
+        return self._end(node, p)
+    #enddef
+
+    # field = attr* empty* field_decl
+    # field_decl = field_is_ref? whsp? field_type field_is_repeated? whsp field_name whsp? field_id_assignment? attr* field_end
+    def _field(self, pos):
+        mark = len(self._events)
+        inp = self._inp
+        node = self._begin("field", pos)
+        p = self._empties(self._attrs(pos))
+        if inp.startswith("ref", p):
+            p = self._leaf("field_is_ref", p, p + 3)
+        p = self._whsp_opt(p)
+
+        # field_type = name_part name_next_part*
+        m = _NAME.match(inp, p)
+        if not m:
+            return self._fail(mark)
+        end = m.end()
+        while end < self._size and inp.startswith(".", end):
+            m = _NAME.match(inp, end + 1)
+            if not m:
+                break
+            end = m.end()
+        p = self._leaf("field_type", p, end)
+
+        # field_is_repeated = whsp? "[]"
+        end = self._whsp_opt(p)
+        if inp.startswith("[]", end):
+            p = self._leaf("field_is_repeated", p, end + 2)
+
+        m = _WHSP.match(inp, p)
+        m = m and _NAME.match(inp, m.end())
+        if not m:
+            return self._fail(mark)
+        p = self._whsp_opt(self._leaf("field_name", m.start(), m.end()))
+
+        # field_id_assignment = "=" whsp? field_id
+        if inp.startswith("=", p):
+            m = _FIELD_ID.match(inp, self._whsp_opt(p + 1))
+            if m:
+                p = self._leaf("field_id", m.start(), m.end())
+
+        # field_end = empty* ";"
+        p = self._empties(self._attrs(p))
+        if not inp.startswith(";", p):
+            return self._fail(mark)
+        return self._end(node, p + 1)
+    #enddef
+
+#endclass
@@ -0,0 +1,204 @@
+import json
+import os
+import threading
+
+from .module import InterfaceBuilder, TypeBuilder
+
+# Bump when the format of the index files changes.
+INDEX_FORMAT_VERSION = 2
+
+INDEX_FILE_EXTENSION = ".ifaceidx"
+
+def index_filepath(filepath):
+    """
+    Returns path of the precompiled index belonging to the source file.
+    """
+    return os.path.splitext(filepath)[0] + INDEX_FILE_EXTENSION
+#enddef
+
+def _type_entry(full_type, type_info):
+    if "declaration" in type_info:
+        kind, builder = "declaration", type_info["declaration"]
+    else:
+        kind, builder = "definition", type_info["definition"]
+    type_entry = {
+        "name": full_type,
+        "kind": kind,
+        "attributes": builder.attributes
+    }
+    if kind == "definition":
+        # The type paths refer to other types, so they are listed in the
+        # 'using' section too (see FileBuilder._referenced_types).
+        type_entry["base"] = builder.base_type_ref
+        type_entry["field_types"] = builder.field_type_refs if builder.session is None \
+                else [ field.field_type for field in builder.child_builders ]
+    return type_entry
+#enddef
+
+def _register_types(session, path, type_entries):
+    for type_entry in type_entries:
+        builder = TypeBuilder() if type_entry["kind"] == "declaration" else InterfaceBuilder()
+        builder.type_name = type_entry["name"].split(".")[-1]
+        builder.attributes.update(type_entry["attributes"])
+
+        if type_entry["kind"] == "declaration":
+            session.register_type(type_entry["name"], declaration=builder, source=path)
+        else:
+            if type_entry["base"]:
+                builder.base_type_ref = type_entry["base"]
+            builder.field_type_refs = list(type_entry["field_types"])
+            session.register_type(type_entry["name"], definition=builder, source=path)
+#enddef
+
+def write_index(session, filepath):
+    """
+    Writes the types registered from the file and from the files it includes
+    to the precompiled index next to the file. The file needs to be indexed
+    already.
+    """
+    filepath = os.path.abspath(filepath)
+    sources = session.included_files(filepath) + [ filepath ]
+
+    types_by_source = {}
+    for full_type, type_info in session.types.items():
+        if "source" in type_info:
+            types_by_source.setdefault(type_info["source"], []).append(_type_entry(full_type, type_info))
+
+    index = {
+        "version": INDEX_FORMAT_VERSION,
+        "files": [ {
+            "path": source,
+            "mtime": os.stat(source).st_mtime,
+            "includes": session.includes.get(source, []),
+            "types": types_by_source.get(source, [])
+        } for source in sources ]
+    }
+
+    idx_filepath = index_filepath(filepath)
+    session.print_debug("Writing index '{}'.", idx_filepath)
+    with open(idx_filepath, "w") as f:
+        json.dump(index, f, separators=(",", ":"))
+#enddef
+
+def _is_up_to_date(index):
+    if index.get("version") != INDEX_FORMAT_VERSION:
+        return False
+
+    for source in index["files"]:
+        try:
+            if os.stat(source["path"]).st_mtime != source["mtime"]:
+                return False
+        except OSError:
+            return False
+
+    return True
+#enddef
+
+def load_index(session, filepath):
+    """
+    Registers the types of the file and of the files it includes from the
+    precompiled index of the file. Returns False if there is no index or it
+    is out of date, the file needs to be parsed then.
+    """
+    idx_filepath = index_filepath(filepath)
+    try:
+        with open(idx_filepath, "r") as f:
+            index = json.load(f)
+    except FileNotFoundError:
+        return False
+    except ValueError as e:
+        session.print_debug("Ignoring broken index '{}' ({}).", idx_filepath, e)
+        return False
+
+    if not _is_up_to_date(index):
+        session.print_debug("Ignoring out of date index '{}'.", idx_filepath)
+        return False
+
+    session.print_debug("Loading index '{}'.", idx_filepath)
+    for source in index["files"]:
+        path = source["path"]
+        if source["includes"]:
+            session.includes[path] = source["includes"]
+
+        # The file could be indexed already through another include.
+        if path in session.indexed_files:
+            continue
+        session.indexed_files.add(path)
+        _register_types(session, path, source["types"])
+
+    return True
+#enddef
+
+class MemoryIndex(object):
+    """
+    In-memory index of the included files shared by the sessions of a batch
+    compilation, so an included file is indexed just once however many
+    targets include it. Entries are keyed by the file path and the include
+    paths of the session. They are never invalidated unless 'check_mtime' is
+    set, e.g. by a long running server, an entry of a file modified since it
+    was indexed is dropped then. Like the precompiled index, the types of the
+    files a file includes are registered before its own types.
+    """
+
+    def __init__(self, check_mtime=False):
+        # (path, include paths) -> (included files, type entries, mtime)
+        self._entries = {}
+        self._check_mtime = check_mtime
+        self._lock = threading.Lock()
+    #enddef
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+    #enddef
+
+    def _mtime(self, filepath):
+        if not self._check_mtime:
+            return None
+        try:
+            return os.stat(filepath).st_mtime
+        except OSError:
+            return None
+    #enddef
+
+    def load(self, session, filepath):
+        """
+        Registers the types of the file and of the files it includes. Returns
+        False if the file isn't indexed yet.
+        """
+        key = (filepath, tuple(session.include_paths))
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            return False
+
+        includes, type_entries, mtime = entry
+        if self._check_mtime and (mtime is None or self._mtime(filepath) != mtime):
+            session.print_debug("Dropping out of date '{}' from the shared index.", filepath)
+            with self._lock:
+                if self._entries.get(key) is entry:
+                    del self._entries[key]
+            return False
+
+        session.print_debug("Loading '{}' from the shared index.", filepath)
+        session.indexed_files.add(filepath)
+        if includes:
+            session.includes[filepath] = list(includes)
+        for included_filepath in includes:
+            session.index_file(included_filepath)
+        _register_types(session, filepath, type_entries)
+        return True
+    #enddef
+
+    def store(self, session, filepath):
+        """
+        Stores the types the session registered from the file.
+        """
+        type_entries = [ _type_entry(full_type, type_info) for full_type, type_info in session.types.items()
+                if type_info.get("source") == filepath ]
+        entry = (list(session.includes.get(filepath, [])), type_entries, self._mtime(filepath))
+        with self._lock:
+            self._entries[(filepath, tuple(session.include_paths))] = entry
+    #enddef
+
+#endclass
@@ -0,0 +1,136 @@
+import os
+
+def _mtime(directory):
+    try:
+        return os.stat(directory).st_mtime
+    except OSError:
+        return None
+#enddef
+
+class IncludeResolver(object):
+    """
+    Resolves the included files to the first match in the include paths.
+    Every directory is listed at most once and both the listings and the
+    resolved files are cached, so a missing candidate costs no stat and a
+    file included from many places is looked up just once. The resolved
+    files are identified by the canonical real path, so a file reachable by
+    more paths (e.g. 'a/../x.iface' and 'x.iface', or symbolic links) is one
+    file.
+
+    The include directories are expected not to change during the
+    compilation, see refresh() for the changes between compilations. The
+    resolver can be shared by sessions with the same include paths, also in
+    parallel threads.
+    """
+
+    def __init__(self, include_paths):
+        self.include_paths = [ os.path.abspath(path) for path in include_paths ]
+        # Included file path as written -> real path or None if not found.
+        self._resolved = {}
+        # Directory -> names of its entries, empty if it can't be listed.
+        self._listings = {}
+        # Listed directory -> its modification time when listed (see refresh()).
+        self._mtimes = {}
+        # Candidate path -> whether it's a file.
+        self._files = {}
+
+        self.lookups = 0
+        self.hits = 0
+        self.unresolved = 0
+        self.listdir_calls = 0
+        self.stat_calls = 0
+    #enddef
+
+    def resolve(self, include_filepath):
+        """
+        Returns real path of the first match of the included file in the
+        include paths or None if there is none.
+        """
+        self.lookups += 1
+        try:
+            resolved = self._resolved[include_filepath]
+            self.hits += 1
+            return resolved
+        except KeyError:
+            pass
+
+        resolved = None
+        for include_path in self.include_paths:
+            candidate = os.path.join(include_path, include_filepath)
+            if self._is_file(candidate):
+                resolved = os.path.realpath(candidate)
+                break
+        if resolved is None:
+            self.unresolved += 1
+
+        self._resolved[include_filepath] = resolved
+        return resolved
+    #enddef
+
+    def _entries(self, directory):
+        try:
+            return self._listings[directory]
+        except KeyError:
+            pass
+
+        self.listdir_calls += 1
+        self._mtimes[directory] = _mtime(directory)
+        try:
+            entries = frozenset(os.listdir(directory))
+        except OSError:
+            entries = frozenset()
+        self._listings[directory] = entries
+        return entries
+    #enddef
+
+    def refresh(self):
+        """
+        Drops the listings of the directories modified since they were listed
+        (a file was added, removed or renamed in them) and all the resolved
+        files, for use between compilations of a long running server. Returns
+        True if any directory was modified.
+        """
+        changed = set(directory for directory, mtime in list(self._mtimes.items()) if _mtime(directory) != mtime)
+        if not changed:
+            return False
+
+        for directory in changed:
+            self._listings.pop(directory, None)
+            self._mtimes.pop(directory, None)
+        for path in list(self._files):
+            if os.path.split(path)[0] in changed:
+                self._files.pop(path, None)
+        self._resolved.clear()
+        return True
+    #enddef
+
+    def _is_file(self, path):
+        try:
+            return self._files[path]
+        except KeyError:
+            pass
+
+        # The directory isn't normalized, 'a/..' must be resolved by the
+        # filesystem when 'a' is a symbolic link.
+        directory, name = os.path.split(path)
+        is_file = False
+        if name in self._entries(directory):
+            # Could be a directory.
+            self.stat_calls += 1
+            is_file = os.path.isfile(path)
+        self._files[path] = is_file
+        return is_file
+    #enddef
+
+    def stats(self):
+        return {
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "unresolved": self.unresolved,
+            "listdir_calls": self.listdir_calls,
+            "stat_calls": self.stat_calls,
+            "directories": len(self._listings)
+        }
+    #enddef
+
+#endclass
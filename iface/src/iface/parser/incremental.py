@@ -0,0 +1,202 @@
+import hashlib
+import json
+import os
+import sys
+import time
+
+from .bindiagram import write_binary_class_diagram
+from .jsonwriter import write_class_diagram
+from .module import CompilationSession, InterfacesIndexBuilder, compile_files, get_type_treatment
+
+# Bump when the format of the manifest changes.
+MANIFEST_FORMAT_VERSION = 1
+
+def _file_hash(filepath):
+    try:
+        with open(filepath, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except OSError:
+        return None
+#enddef
+
+def _types_signature(session):
+    """
+    Returns hash of the registered types as seen by the output, i.e. their
+    names and treatments.
+    """
+    signature = hashlib.sha256()
+    for full_type in sorted(session.types):
+        signature.update("{}:{};".format(full_type, get_type_treatment(session.types[full_type])).encode("utf-8"))
+    return signature.hexdigest()
+#enddef
+
+class IncrementalBuild(object):
+    """
+    Builds the output from the input files and records the dependency graph
+    (input -> included files -> registered types) together with the content
+    hashes of all the files in a manifest. A rebuild then does nothing when
+    no file changed. When only included files changed, they are just indexed
+    again and the output is rebuilt only if the types it sees changed. Files
+    which didn't change are replayed from the parse cache.
+    """
+
+    def __init__(self, manifest_path, input_files, output, include_paths=[], engine="parsimonious", cache=None, debug=False, using_all_types=False,
+            output_format="json"):
+        self._manifest_path = manifest_path
+        self._input_files = [ os.path.abspath(filepath) for filepath in input_files ]
+        self._output = os.path.abspath(output)
+        self._include_paths = [ os.path.abspath(path) for path in include_paths ]
+        self._engine = engine
+        self._cache = cache
+        self._debug = debug
+        self._using_all_types = using_all_types
+        # "json" or "bin" (see write_binary_class_diagram).
+        self._output_format = output_format
+        self._manifest = self._load_manifest()
+    #enddef
+
+    @property
+    def watched_files(self):
+        """
+        Files the output depends on according to the last build.
+        """
+        if self._manifest is None:
+            return list(self._input_files)
+        return sorted(self._manifest["files"])
+    #enddef
+
+    def _create_session(self):
+        return CompilationSession(self._include_paths, debug=self._debug, engine=self._engine, cache=self._cache,
+                using_all_types=self._using_all_types)
+    #enddef
+
+    def _load_manifest(self):
+        try:
+            with open(self._manifest_path, "r") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if manifest.get("version") != MANIFEST_FORMAT_VERSION \
+                or manifest.get("inputs") != self._input_files \
+                or manifest.get("output") != self._output \
+                or manifest.get("include_paths") != self._include_paths \
+                or manifest.get("using_all_types", False) != self._using_all_types \
+                or manifest.get("output_format", "json") != self._output_format:
+            return None
+
+        return manifest
+    #enddef
+
+    def _write_manifest(self, session, hashes):
+        files = set(self._input_files)
+        for filepath in self._input_files:
+            files.update(session.included_files(filepath))
+
+        types = {}
+        for full_type, type_info in session.types.items():
+            if "source" in type_info:
+                types.setdefault(type_info["source"], []).append(full_type)
+
+        self._manifest = {
+            "version": MANIFEST_FORMAT_VERSION,
+            "inputs": self._input_files,
+            "output": self._output,
+            "include_paths": self._include_paths,
+            "using_all_types": self._using_all_types,
+            "output_format": self._output_format,
+            "files": { filepath: hashes[filepath] if filepath in hashes else _file_hash(filepath) for filepath in files },
+            "dependencies": { filepath: session.included_files(filepath) for filepath in self._input_files },
+            "types": types,
+            "types_signature": _types_signature(session)
+        }
+
+        tmp_path = self._manifest_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self._manifest, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self._manifest_path)
+    #enddef
+
+    def build(self):
+        """
+        Brings the output up to date. Returns True if it was rebuilt.
+        """
+        # Hash the files before they are processed, a file changed during the
+        # build then triggers another build.
+        hashes = { filepath: _file_hash(filepath) for filepath in self.watched_files }
+
+        if self._manifest is not None and os.path.exists(self._output):
+            changed = [ filepath for filepath, file_hash in self._manifest["files"].items() if hashes.get(filepath) != file_hash ]
+            if not changed:
+                return False
+
+            if not any(filepath in self._input_files for filepath in changed):
+                # The output depends on the included files only through the
+                # types registered from them.
+                session = self._create_session()
+                for filepath in self._input_files:
+                    session.process_file(filepath, [ InterfacesIndexBuilder(session, filepath) ])
+                if _types_signature(session) == self._manifest["types_signature"]:
+                    session.print_debug("Types seen by '{}' didn't change.", self._output)
+                    self._write_manifest(session, hashes)
+                    return False
+
+        session = self._create_session()
+        front_end = compile_files(session, self._input_files)
+        tmp_path = self._output + ".tmp"
+        try:
+            if self._output_format == "bin":
+                with open(tmp_path, "wb") as f:
+                    write_binary_class_diagram(front_end.root_builder, f)
+            else:
+                with open(tmp_path, "w") as f:
+                    write_class_diagram(front_end.root_builder, f)
+            os.replace(tmp_path, self._output)
+        except BaseException:
+            # Don't leave the partly written output behind.
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+        self._write_manifest(session, hashes)
+        return True
+    #enddef
+
+    def watch(self, interval=0.5):
+        """
+        Keeps the output up to date by polling the watched files for changes
+        until interrupted.
+        """
+        def stat_files():
+            stats = {}
+            for filepath in self.watched_files:
+                try:
+                    st = os.stat(filepath)
+                    stats[filepath] = (st.st_mtime_ns, st.st_size)
+                except OSError:
+                    stats[filepath] = None
+            return stats
+        #enddef
+
+        stats = None
+        while True:
+            current_stats = stat_files()
+            if current_stats != stats:
+                try:
+                    if self.build():
+                        print("Output '{}' rebuilt.".format(self._output), file=sys.stderr)
+                except Exception as e:
+                    print("Build of '{}' failed: {}: {}".format(self._output, type(e).__name__, e), file=sys.stderr)
+
+                # Files are stated before the build, so a change made during
+                # the build is noticed. Dependencies discovered by the build
+                # are watched from now on.
+                stats = current_stats
+                for filepath, st in stat_files().items():
+                    stats.setdefault(filepath, st)
+            time.sleep(interval)
+    #enddef
+
+#endclass
@@ -0,0 +1,97 @@
+_PLACEHOLDER_NAME = "__iface_placeholder_{}__"
+
+def _children_framing(diagram_node, child_node_type, to_json):
+    """
+    Returns (prefix, separator, suffix) codemodel.to_json() puts around and
+    between the serialized children of the node, or None if the children
+    aren't serialized in place. The framing is taken from the serialization
+    of the node with placeholder children, the node is spoiled then.
+    """
+    placeholders = [ to_json(_placeholder_node(child_node_type, i)) for i in range(2) ]
+
+    diagram_node.add(_placeholder_node(child_node_type, 0))
+    with_one = to_json(diagram_node)
+    diagram_node.add(_placeholder_node(child_node_type, 1))
+    with_two = to_json(diagram_node)
+
+    if with_one.count(placeholders[0]) != 1:
+        return None
+    prefix, suffix = with_one.split(placeholders[0])
+
+    if not with_two.startswith(prefix + placeholders[0]) \
+            or not with_two.endswith(placeholders[1] + suffix):
+        return None
+    separator = with_two[len(prefix) + len(placeholders[0]):len(with_two) - len(placeholders[1]) - len(suffix)]
+    if with_two != prefix + placeholders[0] + separator + placeholders[1] + suffix:
+        return None
+
+    return prefix, separator, suffix
+#enddef
+
+def _placeholder_node(node_type, i):
+    node = node_type()
+    node.attributes = { "name": _PLACEHOLDER_NAME.format(i) }
+    return node
+#enddef
+
+def write_class_diagram(builder, f, profiler=None):
+    """
+    Writes the class diagram of the builders tree to the file object in the
+    form of codemodel.to_json(builder.build()). Every subtree is built and
+    written right away, so only the nodes on the path to the one being
+    written are held in memory. The tree is built just once.
+
+    With a profiler, building and serialization are measured as the 'build'
+    and 'serialize' phases.
+    """
+    import codemodel
+
+    if profiler is None:
+        _write(builder, f, lambda builder: builder.build_node(), lambda builder: builder.build(), codemodel.to_json)
+        return
+
+    def build_node(builder):
+        with profiler.phase("build"):
+            return builder.build_node()
+    #enddef
+
+    def build(builder):
+        with profiler.phase("build"):
+            return builder.build()
+    #enddef
+
+    def to_json(diagram_node):
+        with profiler.phase("serialize"):
+            return codemodel.to_json(diagram_node)
+    #enddef
+
+    _write(builder, f, build_node, build, to_json)
+#enddef
+
+def _write(builder, f, build_node, build, to_json, diagram_node=None):
+    # The diagram node is given when it's built already, to find the type of
+    # the children of its parent.
+    child_builders = builder.child_builders
+    if diagram_node is None:
+        diagram_node = build_node(builder)
+    if not child_builders:
+        f.write(to_json(diagram_node))
+        return
+
+    first_child_node = build_node(child_builders[0])
+    framing = _children_framing(diagram_node, type(first_child_node), to_json)
+    if framing is None:
+        # Unexpected serialization of the children, write the whole subtree
+        # at once.
+        f.write(to_json(build(builder)))
+        return
+
+    prefix, separator, suffix = framing
+    f.write(prefix)
+    _write(child_builders[0], f, build_node, build, to_json, first_child_node)
+    del first_child_node
+    for child_builder in child_builders[1:]:
+        f.write(separator)
+        _write(child_builder, f, build_node, build, to_json)
+    f.write(suffix)
+#enddef
@@ -0,0 +1,133 @@
+"""
+Flattened layouts of the interfaces, the fields of an interface together with
+the ones of all its bases. Each layout is computed once and extends the
+layout of the base, so the inheritance chain is walked once for all the
+interfaces deriving from it. The table is used by the compilation (see
+CompilationSession.layouts) and by the generators (see SchemaModel.layout).
+"""
+
+class InterfaceLayout(object):
+    """
+    Layout of an interface: 'bases' are full names of its bases, the direct
+    one first, 'fields' are (definition of the owner, field) of all its
+    fields, the ones of the root base first, and 'field_names' are full names
+    of the same fields. The layout isn't complete if the definition of some
+    base isn't known, e.g. it's only indexed from an included file, so its
+    fields and its base aren't known either.
+    """
+
+    def __init__(self, full_name, bases=(), fields=(), field_names=(), field_ids=None, complete=True):
+        self.full_name = full_name
+        self.bases = list(bases)
+        self.fields = list(fields)
+        self.field_names = list(field_names)
+        # Field id -> full name of the field having it.
+        self.field_ids = dict(field_ids or {})
+        self.complete = complete
+    #enddef
+
+    @property
+    def depth(self):
+        return len(self.bases)
+    #enddef
+
+    def to_attributes(self):
+        """
+        Returns the layout as the 'inheritance' attribute of the diagram node,
+        the fields are given by their full names.
+        """
+        return {
+            "depth": self.depth,
+            "fields": list(self.field_names),
+            "complete": self.complete
+        }
+    #enddef
+
+#endclass
+
+class InterfaceLayouts(object):
+    """
+    Memoized layouts of interfaces. 'lookup' returns the definition of the
+    interface of a full name or None if it isn't known, 'describe' returns
+    (full name of its base or None, its own fields) of a definition and
+    'identify' returns (name, id or None) of a field. The layouts are
+    memoized per definition, the ones of the unknown interfaces per full
+    name.
+    """
+
+    def __init__(self, lookup, describe, identify):
+        self._lookup = lookup
+        self._describe = describe
+        self._identify = identify
+        # Definition or full name -> InterfaceLayout.
+        self._layouts = {}
+        # Keys of the layouts being computed.
+        self._visiting = set()
+        # Number of the requested layouts and of those not memoized yet.
+        self.lookups = 0
+        self.computed = 0
+    #enddef
+
+    def invalidate(self):
+        self._layouts.clear()
+    #enddef
+
+    def layout(self, full_name, definition=None):
+        """
+        Returns InterfaceLayout of the interface of the full name, of the
+        definition given or of the one found by the lookup. Raises if the
+        interface inherits from itself or if two of its fields share an id.
+        """
+        self.lookups += 1
+        if definition is None:
+            definition = self._lookup(full_name)
+        key = full_name if definition is None else definition
+
+        layout = self._layouts.get(key)
+        if layout is None:
+            if key in self._visiting:
+                raise RuntimeError("Interface '{}' inherits from itself.".format(full_name))
+            self._visiting.add(key)
+            try:
+                layout = self._compute(full_name, definition)
+            finally:
+                self._visiting.discard(key)
+            self._layouts[key] = layout
+        return layout
+    #enddef
+
+    def _compute(self, full_name, definition):
+        self.computed += 1
+        if definition is None:
+            return InterfaceLayout(full_name, complete=False)
+
+        base_name, fields = self._describe(definition)
+        if base_name:
+            base = self.layout(base_name)
+            layout = InterfaceLayout(full_name, [ base.full_name ] + base.bases, base.fields, base.field_names,
+                    base.field_ids, base.complete)
+        else:
+            layout = InterfaceLayout(full_name)
+
+        for field in fields:
+            field_name, field_id = self._identify(field)
+            field_full_name = full_name + "." + field_name
+            if field_id is not None:
+                if field_id in layout.field_ids:
+                    raise RuntimeError("Field id {} of '{}' is already used by '{}'.".format(field_id, field_full_name,
+                            layout.field_ids[field_id]))
+                layout.field_ids[field_id] = field_full_name
+            layout.fields.append((definition, field))
+            layout.field_names.append(field_full_name)
+        return layout
+    #enddef
+
+    def stats(self):
+        return {
+            "lookups": self.lookups,
+            "computed": self.computed,
+            "interfaces": len(self._layouts)
+        }
+    #enddef
+
+#endclass
@@ -1,8 +1,7 @@
-import codemodel
+import contextlib
+import threading
 
-import parsimonious
-
-grammar = parsimonious.Grammar("""
+grammar_definition = """
 file                = consistent_block*
 consistent_block    = include / ns / using_directive / interface / empty
 include             = empty* include_decl
@@ -66,45 +65,52 @@ attr_value_close      = ")"
 
 whsp                = ~"\s+"
 comment             = ~"#.*"
-""".format(type_name='~"[a-zA-Z_][a-zA-Z0-9_]*"'))
-
+""".format(type_name='~"[a-zA-Z_][a-zA-Z0-9_]*"')
 
-TREATMENT_VALUE_TYPE = "value_type"
-TREATMENT_REFERENCE_TYPE = "reference_type"
+_grammar = None
+_grammar_lock = threading.Lock()
 
-field_types = {}
-
-def register_type(identifier, treatment="", declaration=None, definition=None):
-    if identifier in field_types:
-        raise RuntimeError("Type '{}' redefinition.".format(identifier))
-
-    type_info = {}
-    if treatment: type_info["treatment"] = treatment
-    if declaration: type_info["declaration"] = declaration
-    if definition: type_info["definition"] = definition
+def get_grammar():
+    """
+    Returns the parsimonious grammar. It's loaded on the first use (see
+    cache.load_grammar()), so neither importing the module nor the 'fast'
+    engine pays for parsimonious.
+    """
+    global _grammar
+    if _grammar is None:
+        # The visitor keeps ids of the grammar expressions, so the grammar
+        # must be loaded just once.
+        with _grammar_lock:
+            if _grammar is None:
+                from .cache import load_grammar
+                _grammar = load_grammar()
+    return _grammar
+#enddef
 
-    field_types[identifier] = type_info
+def __getattr__(name):
+    # The grammar used to be compiled on import.
+    if name == "grammar":
+        return get_grammar()
+    raise AttributeError("module '{}' has no attribute '{}'".format(__name__, name))
 #enddef
 
-register_type("int", treatment=TREATMENT_VALUE_TYPE)
-register_type("int32", treatment=TREATMENT_VALUE_TYPE)
-register_type("uint", treatment=TREATMENT_VALUE_TYPE)
-register_type("uint32", treatment=TREATMENT_VALUE_TYPE)
-register_type("float", treatment=TREATMENT_VALUE_TYPE)
-register_type("double", treatment=TREATMENT_VALUE_TYPE)
-register_type("bool", treatment=TREATMENT_VALUE_TYPE)
-register_type("string", treatment=TREATMENT_REFERENCE_TYPE)
 
+# Context manager of the phases when not profiling (see CompilationSession.phase).
+_NO_PHASE = contextlib.nullcontext()
 
-opts = {
-    "debug": False
-}
+TREATMENT_VALUE_TYPE = "value_type"
+TREATMENT_REFERENCE_TYPE = "reference_type"
 
-def print_debug(*posargs, **kwargs):
-    import sys
-    if opts["debug"]:
-        print("[D]", *posargs, **kwargs, file=sys.stderr)
-#enddef
+BUILTIN_TYPES = [
+    ("int", TREATMENT_VALUE_TYPE),
+    ("int32", TREATMENT_VALUE_TYPE),
+    ("uint", TREATMENT_VALUE_TYPE),
+    ("uint32", TREATMENT_VALUE_TYPE),
+    ("float", TREATMENT_VALUE_TYPE),
+    ("double", TREATMENT_VALUE_TYPE),
+    ("bool", TREATMENT_VALUE_TYPE),
+    ("string", TREATMENT_REFERENCE_TYPE),
+]
 
 def get_parent_namespaces(builder):
     namespaces = []
@@ -118,21 +124,399 @@ def get_parent_namespaces(builder):
     return namespaces
 #enddef
 
-def resolve_type(type_path, builder):
+def get_type_treatment(type_info):
+    treatment = type_info.get("treatment", "")
+    if not treatment and "declaration" in type_info: treatment = type_info["declaration"].attributes.get("treatment", "")
+    if not treatment and "definition" in type_info: treatment = type_info["definition"].attributes.get("treatment", "")
+    return treatment
+#enddef
+
+class Scope(object):
     """
-    Returns full type of the field. Note that the type can be provided
-    as a relative path so in order to resolve the full type, we need to
-    have the builders tree finalized. Don't use this when the builders
-    tree isn't complete.
+    Namespace in the trie of the SymbolTable.
     """
-    namespaces = get_parent_namespaces(builder)
-    for i in reversed(range(len(namespaces) + 1)):
-        full_type = ".".join(namespaces[0:i] + [ type_path ])
-        if full_type in field_types:
-            return full_type
 
-    raise RuntimeError("Cannot resolve field type.")
-#enddef
+    __slots__ = ("parent", "prefix", "children", "resolved", "generation")
+
+    def __init__(self, parent, prefix):
+        self.parent = parent
+        # Full name of the namespace followed by '.', empty for the root.
+        self.prefix = prefix
+        # Namespace name -> nested scope.
+        self.children = {}
+        # Type path -> full type (False if it can't be resolved) as seen
+        # from the scope.
+        self.resolved = {}
+        self.generation = 0
+    #enddef
+
+#endclass
+
+class SymbolTable(object):
+    """
+    Scope-aware lookup of the registered types. Namespaces of the builders
+    tree form a trie and every scope memoizes the type paths resolved from
+    it, falling back to the memo of its parent scope. Resolving a type path
+    is then a dict lookup in most cases. The memos are dropped whenever a
+    type is registered (see invalidate()).
+    """
+
+    def __init__(self, types):
+        self._types = types
+        self._root = Scope(None, "")
+        self._generation = 0
+        # NamespaceBuilder -> its scope.
+        self._scopes = {}
+        # Number of the resolved type paths and of those not memoized yet.
+        self.lookups = 0
+        self.computed = 0
+    #enddef
+
+    @property
+    def root(self):
+        return self._root
+    #enddef
+
+    def invalidate(self):
+        self._generation += 1
+    #enddef
+
+    def child_scope(self, scope, ns_name):
+        child = scope.children.get(ns_name)
+        if child is None:
+            child = Scope(scope, scope.prefix + ns_name + ".")
+            scope.children[ns_name] = child
+        return child
+    #enddef
+
+    def scope_of_type(self, full_type):
+        """
+        Returns scope of the namespace enclosing the type of the full name.
+        """
+        scope = self._root
+        for ns_name in full_type.split(".")[:-1]:
+            scope = self.child_scope(scope, ns_name)
+        return scope
+    #enddef
+
+    def scope_of(self, builder):
+        """
+        Returns scope of the builder, i.e. of the closest parent namespace.
+        The builders tree needs to be complete.
+        """
+        parent = builder.parent
+        # FIXME Interface builder also creates a namespace.
+        while parent is not None and not isinstance(parent, NamespaceBuilder):
+            parent = parent.parent
+        if parent is None:
+            return self._root
+
+        scope = self._scopes.get(parent)
+        if scope is None:
+            scope = self.child_scope(self.scope_of(parent), parent.ns_name)
+            self._scopes[parent] = scope
+        return scope
+    #enddef
+
+    def resolve(self, scope, type_path):
+        """
+        Returns full type of the type path as seen from the scope, trying the
+        scope first and then the enclosing ones, or None if there is no such
+        type.
+        """
+        self.lookups += 1
+        return self._resolve(scope, type_path)
+    #enddef
+
+    def _resolve(self, scope, type_path):
+        if scope.generation != self._generation:
+            scope.resolved.clear()
+            scope.generation = self._generation
+
+        full_type = scope.resolved.get(type_path)
+        if full_type is None:
+            self.computed += 1
+            full_type = scope.prefix + type_path
+            if full_type not in self._types:
+                full_type = self._resolve(scope.parent, type_path) if scope.parent is not None else None
+                full_type = full_type or False
+            scope.resolved[type_path] = full_type
+        return full_type or None
+    #enddef
+
+#endclass
+
+class CompilationSession(object):
+    """
+    State of a single compilation: the options, the registry of the types
+    and the files indexed so far. The session is provided to the builders
+    and the parser engines explicitly, so independent compilations can run
+    in one process, even in parallel threads.
+    """
+
+    def __init__(self, include_paths=[], debug=False, engine="parsimonious", cache=None, stream=False, using_all_types=False, index=None, profiler=None, resolver=None):
+        from .includes import IncludeResolver
+        from .layouts import InterfaceLayouts
+
+        self.include_paths = list(include_paths)
+        # IncludeResolver of the include paths, can be shared by the sessions
+        # with the same include paths.
+        self.resolver = resolver if resolver is not None else IncludeResolver(self.include_paths)
+        self.debug = debug
+        self.engine = engine
+        # List all the registered types in the 'using' section of the output,
+        # not just the ones referenced by it.
+        self.using_all_types = using_all_types
+        # Process the files one top level block at a time (see process_stream
+        # of the engines). The parse cache isn't used then as it would hold
+        # the whole file.
+        self.stream = stream
+        # ParseCache instance or None for no caching.
+        self.cache = cache
+        # MemoryIndex of the included files shared by more sessions or None.
+        self.index = index
+        # Profiler collecting the metrics of the compilation or None.
+        self.profiler = profiler
+        # Absolute file path -> events of the file parsed in advance (see
+        # prefetch_files).
+        self.prefetched = {}
+
+        # Full type name -> type info.
+        self.types = {}
+        self.symbols = SymbolTable(self.types)
+        # Flattened layouts of the interfaces, computed on the first use.
+        self.layouts = InterfaceLayouts(self._interface_definition, self._describe_interface, self._identify_field)
+        # Full name -> InterfaceBuilder of the builders trees being built (see
+        # add_interface_builders).
+        self.interface_builders = {}
+        # Real paths of the included files indexed so far.
+        self.indexed_files = set()
+        # Absolute path of a file (None for stdin) -> absolute paths of the
+        # files it includes.
+        self.includes = {}
+
+        for identifier, treatment in BUILTIN_TYPES:
+            self.register_type(identifier, treatment=treatment)
+    #enddef
+
+    def register_type(self, identifier, treatment="", declaration=None, definition=None, source=None):
+        if identifier in self.types:
+            defined_in = self.types[identifier].get("source")
+            if defined_in or source:
+                raise RuntimeError("Type '{}' redefinition in '{}', already defined in '{}'.".format(
+                        identifier, source or "<stdin>", defined_in or "<stdin>"))
+            raise RuntimeError("Type '{}' redefinition.".format(identifier))
+
+        type_info = {}
+        if treatment: type_info["treatment"] = treatment
+        if declaration: type_info["declaration"] = declaration
+        if definition: type_info["definition"] = definition
+        if source: type_info["source"] = source
+
+        self.types[identifier] = type_info
+        self.symbols.invalidate()
+        self.layouts.invalidate()
+    #enddef
+
+    def add_interface_builders(self, builders):
+        """
+        Makes the interface builders of a builders tree known to the layouts.
+        The ones registered by InterfacesIndexBuilder aren't part of the tree
+        built by ClassDiagramBuilder.
+        """
+        for builder in builders:
+            self.interface_builders[get_node_full_name(builder)] = builder
+        self.layouts.invalidate()
+    #enddef
+
+    def _interface_definition(self, full_name):
+        builder = self.types.get(full_name, {}).get("definition")
+        if builder is not None and builder.session is None:
+            # Registered by an index builder, the interfaces indexed from the
+            # included files aren't part of any builders tree, their fields
+            # and bases aren't known.
+            builder = self.interface_builders.get(full_name)
+        return builder
+    #enddef
+
+    def _describe_interface(self, builder):
+        base = self.resolve_type(builder.base_type_ref, builder) if builder.base_type_ref else None
+        return base, builder.child_builders
+    #enddef
+
+    def _identify_field(self, field):
+        return field.field_name, int(field.field_id) if field.field_id else None
+    #enddef
+
+    def included_files(self, filepath):
+        """
+        Returns absolute paths of all the files included by the file, also
+        transitively. The included ones always precede the files including
+        them.
+        """
+        files = []
+        visited = set([ filepath ])
+
+        def visit(filepath):
+            for included in self.includes.get(filepath, []):
+                if included not in visited:
+                    visited.add(included)
+                    visit(included)
+                    files.append(included)
+        #enddef
+
+        visit(filepath)
+        return files
+    #enddef
+
+    def phase(self, name):
+        """
+        Returns context manager measuring the enclosed code as a phase of the
+        compilation if there is a profiler, doing nothing otherwise.
+        """
+        if self.profiler is None:
+            return _NO_PHASE
+        return self.profiler.phase(name)
+    #enddef
+
+    def print_debug(self, message, *args):
+        """
+        Prints the debugging message, formatted by the arguments only when
+        debugging is on.
+        """
+        if self.debug:
+            import sys
+            print("[D]", message.format(*args) if args else message, file=sys.stderr)
+    #enddef
+
+    def resolve_type(self, type_path, builder):
+        """
+        Returns full type of the field. Note that the type can be provided
+        as a relative path so in order to resolve the full type, we need to
+        have the builders tree finalized. Don't use this when the builders
+        tree isn't complete.
+        """
+        full_type = self.symbols.resolve(self.symbols.scope_of(builder), type_path)
+        if full_type is None:
+            raise RuntimeError("Cannot resolve field type.")
+        return full_type
+    #enddef
+
+    def process_include(self, filepath, include_filepath):
+        """
+        Indexes the file included by the file (None for stdin), the first
+        match in the include paths. Without include paths the includes are
+        skipped, as they always were.
+        """
+        included_filepath = self.resolver.resolve(include_filepath)
+        if included_filepath is None:
+            if not self.include_paths:
+                self.print_debug("Skipping include '{}', no include paths given.", include_filepath)
+                return
+            raise RuntimeError("Cannot find the included file '{}' in the include paths.".format(include_filepath))
+
+        included = self.includes.setdefault(filepath, [])
+        if included_filepath not in included:
+            included.append(included_filepath)
+        self.index_file(included_filepath)
+    #enddef
+
+    def index_file(self, filepath):
+        """
+        Registers the types of the included file, unless it's indexed already.
+        The shared index of the session or the precompiled index of the file
+        is used when available, the file is parsed otherwise.
+        """
+        if filepath in self.indexed_files:
+            return
+
+        if self.profiler is None:
+            self._index_file(filepath)
+        else:
+            import time
+            start_wall = time.perf_counter()
+            start_cpu = time.process_time()
+            with self.profiler.phase("index"):
+                source = self._index_file(filepath)
+            self.profiler.record_include(filepath, source, time.perf_counter() - start_wall, time.process_time() - start_cpu)
+    #enddef
+
+    def _index_file(self, filepath):
+        from .ifaceidx import load_index
+        if self.index is not None and self.index.load(self, filepath):
+            return "shared_index"
+        if load_index(self, filepath):
+            return "precompiled_index"
+
+        self.print_debug(">>> Indexing file '{}'", filepath)
+        self.indexed_files.add(filepath)
+        self.process_file(filepath, [ InterfacesIndexBuilder(self, filepath) ])
+        self.print_debug("<<< Indexing file '{}'", filepath)
+
+        if self.index is not None:
+            self.index.store(self, filepath)
+        return "parsed"
+    #enddef
+
+    def process_file(self, fpath, builders):
+        import os.path
+        if self.profiler is not None:
+            builders = builders + [ self.profiler ]
+
+        # Files parsed in advance, e.g. by a pool of processes (see prefetch_files).
+        events = self.prefetched.get(os.path.abspath(fpath))
+        if events is not None:
+            from .cache import replay_events
+            with self.phase("replay"):
+                replay_events(events, builders, self)
+        elif self.stream:
+            with open(fpath, "r") as f:
+                get_engine(self.engine).process_stream(f, builders, self)
+        elif self.cache is None:
+            get_engine(self.engine).process_file(fpath, builders, self)
+        else:
+            with open(fpath, "r") as f:
+                inp = f.read()
+            self._process_input(inp, builders)
+    #enddef
+
+    def process_input(self, inp, builders):
+        """
+        Parses the input by the selected engine, or replays it from the parse
+        cache if one is set (see ParseCache).
+        """
+        if self.profiler is not None:
+            builders = builders + [ self.profiler ]
+        self._process_input(inp, builders)
+    #enddef
+
+    def _process_input(self, inp, builders):
+        engine = get_engine(self.engine)
+        if self.stream:
+            import io
+            engine.process_stream(io.StringIO(inp), builders, self)
+            return
+        elif self.cache is None:
+            engine.process_input(inp, builders, self)
+            return
+
+        from .cache import EventsRecorder, replay_events
+        key = self.cache.key(inp)
+        events = self.cache.load(key)
+        if events is None:
+            self.print_debug("Parse cache miss ({}).", key)
+            recorder = EventsRecorder()
+            engine.process_input(inp, [ recorder ], self)
+            events = recorder.events
+            self.cache.store(key, events)
+        else:
+            self.print_debug("Parse cache hit ({}).", key)
+
+        with self.phase("replay"):
+            replay_events(events, builders, self)
+    #enddef
+
+#endclass
 
 class Builder(object):
 
@@ -153,6 +537,15 @@ class Builder(object):
         self._parent = parent
     #enddef
 
+    @property
+    def session(self):
+        """
+        Compilation session the builder belongs to, it's provided by the root
+        of the builders tree.
+        """
+        return self._parent.session if self._parent is not None else None
+    #enddef
+
     def validity_check(self):
         raise AssertionError("validity_check() isn't implemented by {} builder. Every builder needs to implement the function.".format(type(self).__name__))
     #enddef
@@ -181,12 +574,36 @@ class NodeBuilder(Builder):
         return node
     #enddef
 
+    @property
+    def child_builders(self):
+        """
+        Builders of the children of the diagram node.
+        """
+        return []
+    #enddef
+
     def build(self):
         self.validity_check()
         return self._build()
     #enddef
 
+    def build_node(self):
+        """
+        Builds the diagram node without its children, they are built by the
+        child builders (see write_class_diagram).
+        """
+        self.validity_check()
+        return self._build_node()
+    #enddef
+
     def _build(self):
+        diagram_node = self._build_node()
+        for builder in self.child_builders:
+            diagram_node.add(builder.build())
+        return diagram_node
+    #enddef
+
+    def _build_node(self):
         raise AssertionError("build() isn't implemented by {} builder. Every builder needs to implement the function.".format(type(self).__name__))
     #enddef
 
@@ -216,9 +633,17 @@ def get_node_full_name(node):
 
 class FileBuilder(NodeBuilder):
 
-    def __init__(self):
+    def __init__(self, session):
         super(FileBuilder, self).__init__()
+        self._session = session
         self._content = []
+        # Full names of the types declared by using directives.
+        self._declarations = []
+    #enddef
+
+    @property
+    def session(self):
+        return self._session
     #enddef
 
     def add(self, child_builder):
@@ -230,29 +655,102 @@ class FileBuilder(NodeBuilder):
             raise Exception("Unsupported builder type (%s)" % type(child_builder).__name__)
     #enddef
 
-    def _build(self):
+    def declare(self, full_type):
+        """
+        Records the type declared by a using directive, it's listed in the
+        'using' section even if not referenced.
+        """
+        self._declarations.append(full_type)
+    #enddef
+
+    @property
+    def child_builders(self):
+        return self._content
+    #enddef
+
+    def _interfaces(self):
+        """
+        Returns builders of all the interfaces of the content.
+        """
+        interfaces = []
+        pending = list(self._content)
+        while pending:
+            builder = pending.pop()
+            if isinstance(builder, NamespaceBuilder):
+                pending.extend(builder.child_builders)
+            elif isinstance(builder, InterfaceBuilder):
+                interfaces.append(builder)
+        return interfaces
+    #enddef
+
+    def _referenced_types(self, interfaces):
+        """
+        Returns full names of the types the content refers to: the
+        interfaces, types of their fields and bases and the declared types,
+        and transitively the bases and types of fields of the referenced
+        interfaces from the included files.
+        """
+        referenced = set(self._declarations)
+        pending = []
+
+        def refer(full_type):
+            if full_type not in referenced:
+                referenced.add(full_type)
+                pending.append(full_type)
+        #enddef
+
+        for builder in interfaces:
+            refer(get_node_full_name(builder))
+            if builder.base_type_ref:
+                refer(self.session.resolve_type(builder.base_type_ref, builder))
+            for field in builder.child_builders:
+                refer(field._full_type)
+
+        symbols = self.session.symbols
+        while pending:
+            full_type = pending.pop()
+            definition = self.session.types.get(full_type, {}).get("definition")
+            if definition is None or definition.session is not None:
+                # Not an interface or one of the builders tree, see above.
+                continue
+            # Indexed from an included file, its type paths are relative to
+            # its namespace.
+            scope = symbols.scope_of_type(full_type)
+            type_refs = [ definition.base_type_ref ] if definition.base_type_ref else []
+            for type_ref in type_refs + definition.field_type_refs:
+                resolved = symbols.resolve(scope, type_ref)
+                if resolved is not None:
+                    refer(resolved)
+        return referenced
+    #enddef
+
+    def _build_node(self):
+        import codemodel
         diagram_node = self._create_node(codemodel.Package)
 
+        # The children are built after this node, their layouts need the
+        # whole tree.
+        interfaces = self._interfaces()
+        self.session.add_interface_builders(interfaces)
+
+        referenced = None if self.session.using_all_types else self._referenced_types(interfaces)
+
         using = {}
-        for full_type, type_info in field_types.items():
+        for full_type, type_info in self.session.types.items():
             using_type_info = {}
 
-            treatment = type_info.get("treatment", "")
-            if not treatment and "declaration" in type_info: treatment = type_info["declaration"].attributes.get("treatment", "")
-            if not treatment and "definition" in type_info: treatment = type_info["definition"].attributes.get("treatment", "")
+            treatment = get_type_treatment(type_info)
             if treatment:
                 if treatment not in [TREATMENT_VALUE_TYPE, TREATMENT_REFERENCE_TYPE]:
                     raise RuntimeError("Invalid treatment '{}' for type '{}'.".format(treatment, full_type))
                 using_type_info["treatment"] = treatment
 
-            using[full_type] = using_type_info
+            if referenced is None or full_type in referenced:
+                using[full_type] = using_type_info
 
         if using:
             diagram_node.attributes["using"] = using
 
-        for builder in self._content:
-            diagram_node.add(builder.build())
-
         return diagram_node
     #enddef
 
@@ -289,11 +787,15 @@ class NamespaceBuilder(NodeBuilder):
             raise Exception("Unsupproted builder type (%s)" % type(child_builder).__name__)
     #enddef
 
-    def _build(self):
+    @property
+    def child_builders(self):
+        return self._content
+    #enddef
+
+    def _build_node(self):
+        import codemodel
         diagram_node = self._create_node(codemodel.Package)
         diagram_node.attributes["name"] = self._name
-        for builder in self._content:
-            diagram_node.add(builder.build())
         return diagram_node
     #enddef
 
@@ -322,7 +824,8 @@ class TypeBuilder(NodeBuilder):
         assert self._name
     #enddef
 
-    def _build(self):
+    def _build_node(self):
+        import codemodel
         diagram_node = self._create_node(codemodel.Class)
         diagram_node.attributes["name"] = self._name
         return diagram_node
@@ -341,6 +844,9 @@ class InterfaceBuilder(TypeBuilder):
         super(InterfaceBuilder, self).__init__()
         self._fields = []
         self._base_type_ref = None
+        # Type paths of the fields recorded by InterfacesIndexBuilder, it
+        # doesn't build the fields.
+        self.field_type_refs = []
     #enddef
 
     @property
@@ -362,15 +868,32 @@ class InterfaceBuilder(TypeBuilder):
             raise Exception("Unsupproted builder type (%s)" % type(child_builder).__name__)
     #enddef
 
-    def _build(self):
-        diagram_node = super(InterfaceBuilder, self)._build()
+    @property
+    def child_builders(self):
+        return self._fields
+    #enddef
+
+    def _build_node(self):
+        diagram_node = super(InterfaceBuilder, self)._build_node()
         if self._base_type_ref:
-            diagram_node.attributes["base"] = resolve_type(self._base_type_ref, self)
-        for field in self._fields:
-            diagram_node.add(field.build())
+            diagram_node.attributes["base"] = self.session.resolve_type(self._base_type_ref, self)
+            diagram_node.attributes["inheritance"] = self.session.layouts.layout(get_node_full_name(self), self).to_attributes()
         return diagram_node
     #enddef
 
+    def validity_check(self):
+        super(InterfaceBuilder, self).validity_check()
+
+        fields_by_id = {}
+        for field in self._fields:
+            if not field.field_id:
+                continue
+            other = fields_by_id.setdefault(field.field_id, field)
+            if other is not field:
+                raise RuntimeError("Field id {} of '{}' is already used by '{}'.".format(
+                        field.field_id, get_node_full_name(field), get_node_full_name(other)))
+    #enddef
+
 #endclass
 
 class FieldBuilder(NodeBuilder):
@@ -434,16 +957,20 @@ class FieldBuilder(NodeBuilder):
         self._is_ref = True
     #enddef
 
-    def _build(self):
+    def _build_node(self):
+        import codemodel
         diagram_node = self._create_node(codemodel.Attribute)
+        full_type = self._full_type
         # TODO Don't split it, the splitted form can't be used as a key of an json object. The '.' notation
         # is used in 'using' section, so keep it consistent.
         diagram_node.attributes["is_ref"] = self._is_ref
         diagram_node.attributes["type"] = self._type.split(".")
-        diagram_node.attributes["full_type"] = self._full_type.split(".")
+        diagram_node.attributes["full_type"] = full_type.split(".")
         diagram_node.attributes["name"] = self._name
         # TODO How did I come up with the 'is_repeated' attribute? Is it an UML term?
         diagram_node.attributes["is_repeated"] = self._is_repeated
+        if self._id:
+            diagram_node.attributes["id"] = int(self._id)
         return diagram_node
     #enddef
 
@@ -451,7 +978,7 @@ class FieldBuilder(NodeBuilder):
         if not self._type:
             raise Exception("Field type missing")
 
-        if self._full_type not in field_types:
+        if self._full_type not in self.session.types:
             # Shouldn't get here as the full type must be resolvable, otherwise an exception
             # will be raised.
             assert False
@@ -468,11 +995,10 @@ class FieldBuilder(NodeBuilder):
         have the builders tree finalized. Don't use this property when the
         builders tree isn't complete.
         """
-        namespaces = get_parent_namespaces(self)
-        for i in reversed(range(len(namespaces) + 1)):
-            full_type = ".".join(namespaces[0:i] + [ self._type ])
-            if full_type in field_types:
-                return full_type
+        symbols = self.session.symbols
+        full_type = symbols.resolve(symbols.scope_of(self), self._type)
+        if full_type is not None:
+            return full_type
 
         raise RuntimeError("Cannot resolve the type of the field '{}'.".format(get_node_full_name(self)))
     #enddef
@@ -565,7 +1091,7 @@ class NullBuilder(Builder):
 
 #endclass
 
-class ParsimoniousNodeVisitor(parsimonious.NodeVisitor):
+class ParsimoniousNodeVisitor(object):
 
     class Node(object):
 
@@ -597,9 +1123,8 @@ class ParsimoniousNodeVisitor(parsimonious.NodeVisitor):
                 "field", "field_is_ref", "field_type", "field_is_repeated", "field_name", "field_id",
                 "attr", "attr_path", "attr_value_string", "attr_value_bool", "attr_value_int", "attr_value_float" ])
 
-    def __init__(self, builders=[]):
-        super(ParsimoniousNodeVisitor, self).__init__()
-
+    def __init__(self, session, builders=[]):
+        self._session = session
         self._builders = builders
     #enddef
 
@@ -607,45 +1132,156 @@ class ParsimoniousNodeVisitor(parsimonious.NodeVisitor):
         pass
     #enddef
 
-    def visit(self, parsimonious_node):
-        node = ParsimoniousNodeVisitor.Node(parsimonious_node)
-
-        interested = node.name in ParsimoniousNodeVisitor.NOI
+    @classmethod
+    def _interesting_expressions(cls):
+        """
+        Returns ids of the grammar expressions whose nodes are of interest or
+        can contain a node of interest. Subtrees of the other nodes (white
+        spaces, comments, keywords, ...) are skipped by visit().
+        """
+        if cls._interesting is None:
+            expressions = {}
+            pending = list(get_grammar().values())
+            while pending:
+                expr = pending.pop()
+                if id(expr) not in expressions:
+                    expressions[id(expr)] = expr
+                    pending.extend(getattr(expr, "members", ()))
+
+            interesting = set(id(expr) for expr in expressions.values() if expr.name in cls.NOI)
+            # Propagate up to the fixed point, the grammar is recursive.
+            changed = True
+            while changed:
+                changed = False
+                for expr_id, expr in expressions.items():
+                    if expr_id not in interesting \
+                            and any(id(member) in interesting for member in getattr(expr, "members", ())):
+                        interesting.add(expr_id)
+                        changed = True
+
+            cls._interesting = interesting
+        return cls._interesting
+    #enddef
+
+    _interesting = None
 
-        if interested:
-            print_debug("Node {} begin.".format(node))
-            for builder in self._builders:
-                builder.node_begin(node)
+    def visit(self, parsimonious_node):
+        """
+        Feeds the builders with the nodes of interest of the tree. The tree is
+        walked by an explicit stack, so deep nesting doesn't hit the recursion
+        limit, and the subtrees without a node of interest are skipped.
+        """
+        from parsimonious.exceptions import VisitationError
 
-        ret = super(ParsimoniousNodeVisitor, self).visit(parsimonious_node)
+        interesting = self._interesting_expressions()
+        noi = ParsimoniousNodeVisitor.NOI
+        builders = self._builders
+        session = self._session
+        debug = session.debug
 
-        if interested:
-            print_debug("Node {} end.".format(node))
-            for builder in self._builders:
-                builder.node_end(node)
+        if id(parsimonious_node.expr) not in interesting:
+            return
 
-        return ret
+        # Parsimonious node to visit or wrapped node of interest to end.
+        stack = [ parsimonious_node ]
+        while stack:
+            item = stack.pop()
+            try:
+                if isinstance(item, ParsimoniousNodeVisitor.Node):
+                    if debug:
+                        session.print_debug("Node {} end.", item)
+                    for builder in builders:
+                        builder.node_end(item)
+                    continue
+
+                if item.expr_name in noi:
+                    node = ParsimoniousNodeVisitor.Node(item)
+                    if debug:
+                        session.print_debug("Node {} begin.", node)
+                    for builder in builders:
+                        builder.node_begin(node)
+                    stack.append(node)
+
+                stack.extend(child for child in reversed(item.children) if id(child.expr) in interesting)
+            except VisitationError:
+                raise
+            except Exception as e:
+                # Same as parsimonious.NodeVisitor does.
+                node = item._parsimonious_node if isinstance(item, ParsimoniousNodeVisitor.Node) else item
+                raise VisitationError(e, type(e), node) from e
     #enddef
 
     @classmethod
-    def process_file(cls, fpath, builders):
+    def process_file(cls, fpath, builders, session):
         with open(fpath, "r") as f:
             inp = f.read()
-            cls.process_input(inp, builders)
+            cls.process_input(inp, builders, session)
+    #enddef
+
+    @classmethod
+    def process_input(cls, inp, builders, session):
+        with session.phase("parse"):
+            tree = get_grammar().parse(inp)
+        with session.phase("visit"):
+            tree_visitor = cls(session, builders)
+            tree_visitor.visit(tree)
     #enddef
 
     @classmethod
-    def process_input(cls, inp, builders):
-        tree = grammar.parse(inp)
-        tree_visitor = cls(builders)
-        tree_visitor.visit(tree)
+    def process_stream(cls, f, builders, session):
+        """
+        Parses and visits one top level block (consistent_block) at a time,
+        so the parse tree and the packrat cache exist only for the block being
+        processed. Parsimonious needs the whole input text though.
+        """
+        with session.phase("parse_stream"):
+            cls._process_stream(f, builders, session)
+    #enddef
+
+    @classmethod
+    def _process_stream(cls, f, builders, session):
+        from parsimonious.exceptions import IncompleteParseError
+
+        inp = f.read()
+        grammar = get_grammar()
+        consistent_block = grammar["consistent_block"]
+        tree_visitor = cls(session, builders)
+        pos = 0
+        while pos < len(inp):
+            tree = consistent_block.match(inp, pos)
+            tree_visitor.visit(tree)
+            if tree.end == pos:
+                break
+            pos = tree.end
+            del tree
+
+        if pos != len(inp):
+            raise IncompleteParseError(inp, pos, grammar["file"])
     #enddef
 
 #endclass
 
+ENGINES = [ "parsimonious", "fast" ]
+
+def get_engine(name):
+    """
+    Returns the parser engine class providing 'process_file' and
+    'process_input' class methods. Both engines feed the builders with the
+    same nodes, the 'fast' one just doesn't build the parsimonious tree.
+    """
+    if name == "parsimonious":
+        return ParsimoniousNodeVisitor
+    elif name == "fast":
+        from .fastparser import FastParser
+        return FastParser
+    else:
+        raise RuntimeError("Unknown parser engine '{}'.".format(name))
+#enddef
+
 class NodesHandler(object):
 
-    def __init__(self):
+    def __init__(self, session):
+        self._session = session
         self.__nodes_processors_stack = []
     #enddef
 
@@ -657,13 +1293,13 @@ class NodesHandler(object):
             #enddef
             processor = do_nothing
         #endif
-        print_debug("Employing processor for node {}. (id(node)={})".format(node.name, id(node)))
+        self._session.print_debug("Employing processor for node {}. (id(node)={})", node.name, id(node))
         self.__nodes_processors_stack.append((processor, node))
     #enddef
 
     def _remove_nodes_processor(self, node):
         if self.__nodes_processors_stack and self.__nodes_processors_stack[-1][1] is node:
-            print_debug("Popping processor for node {}.".format(self.__nodes_processors_stack[-1][1].name))
+            self._session.print_debug("Popping processor for node {}.", self.__nodes_processors_stack[-1][1].name)
             self.__nodes_processors_stack.pop()
             assert not self.__nodes_processors_stack \
                     or self.__nodes_processors_stack[-1][1] is not node
@@ -674,7 +1310,7 @@ class NodesHandler(object):
 
     def _process_node(self, node):
         if self.__nodes_processors_stack:
-            print_debug("Processing node by {} routine.".format(self.__nodes_processors_stack[-1][1].name))
+            self._session.print_debug("Processing node by {} routine.", self.__nodes_processors_stack[-1][1].name)
             self.__nodes_processors_stack[-1][0](node)
             return True
         else:
@@ -685,12 +1321,11 @@ class NodesHandler(object):
 
 class InterfacesIndexBuilder(NodesHandler):
 
-    indexed_files = set()
-
-    def __init__(self, include_paths):
-        super(InterfacesIndexBuilder, self).__init__()
+    def __init__(self, session, filepath=None):
+        super(InterfacesIndexBuilder, self).__init__(session)
 
-        self._include_paths = include_paths
+        import os.path
+        self._filepath = os.path.abspath(filepath) if filepath else None
         self._type_nodes_stack = []
 
         self._attribute_builder = None
@@ -718,15 +1353,7 @@ class InterfacesIndexBuilder(NodesHandler):
 
         def includes_handling(node):
             if node.name == "include_filepath":
-                for include_path in self._include_paths:
-                    import os.path
-                    filepath = os.path.join(include_path, node.text)
-                    if filepath not in InterfacesIndexBuilder.indexed_files:
-                        print_debug(">>> Indexing file '{}'".format(filepath))
-                        InterfacesIndexBuilder.indexed_files.add(filepath)
-                        ParsimoniousNodeVisitor.process_file(filepath,
-                                [ InterfacesIndexBuilder(self._include_paths) ])
-                        print_debug("<<< Indexing file '{}'".format(filepath))
+                self._session.process_include(self._filepath, node.text)
                 return True
             else:
                 return False
@@ -791,8 +1418,8 @@ class InterfacesIndexBuilder(NodesHandler):
                         declaration = self._type_nodes_stack[-1]
 
                         assert full_name
-                        print_debug("Registering type '{}'.".format(full_name))
-                        register_type(full_name, declaration=declaration)
+                        self._session.print_debug("Registering type '{}'.", full_name)
+                        self._session.register_type(full_name, declaration=declaration, source=self._filepath)
                     elif attributes_handling(node):
                         pass
                 #enddef
@@ -817,11 +1444,20 @@ class InterfacesIndexBuilder(NodesHandler):
                         definition = self._type_nodes_stack[-1]
 
                         assert full_name
-                        print_debug("Registering type '{}'.".format(full_name))
-                        register_type(full_name, definition=definition)
+                        self._session.print_debug("Registering type '{}'.", full_name)
+                        self._session.register_type(full_name, definition=definition, source=self._filepath)
                     elif node.name == "interface_base":
                         # Avoid processing 'type_name' node declaring base interface name.
-                        self._employ_nodes_processor(None, node)
+                        interface_builder = self._type_nodes_stack[-1]
+
+                        def process_base_node(node):
+                            if node.name == "type_ref":
+                                interface_builder.base_type_ref = node.text
+                                self._employ_nodes_processor(None, node)
+                        #enddef
+                        self._employ_nodes_processor(process_base_node, node)
+                    elif node.name == "field_type":
+                        self._type_nodes_stack[-1].field_type_refs.append(node.text.strip())
                     elif attributes_handling(node):
                         pass
                 #enddef
@@ -876,10 +1512,10 @@ class InterfacesIndexBuilder(NodesHandler):
 
 class ClassDiagramBuilder(NodesHandler):
 
-    def __init__(self, root_builder=None):
-        super(ClassDiagramBuilder, self).__init__()
+    def __init__(self, session, root_builder=None):
+        super(ClassDiagramBuilder, self).__init__(session)
 
-        self.root_builder = root_builder if root_builder else FileBuilder()
+        self.root_builder = root_builder if root_builder else FileBuilder(session)
         self.__builders_stack = [(self.root_builder, None)]
     #enddef
 
@@ -896,9 +1532,10 @@ class ClassDiagramBuilder(NodesHandler):
             self._push_builder(NamespaceBuilder(), node)
         elif node.name == "ns_name":
             self._top_builder_set_property(node.name, node.text)
-        # using directive (used only to build index, not class diagram)
+        # using directive, the declared type is only listed in the 'using'
+        # section of the class diagram
         elif node.name == "using_directive":
-            self._push_builder(NullBuilder(), node)
+            self._push_builder(TypeBuilder(), node)
         # interfaces
         elif node.name == "interface":
             self._push_builder(InterfaceBuilder(), node)
@@ -935,7 +1572,10 @@ class ClassDiagramBuilder(NodesHandler):
         if node.name == "ns":
             self._top_builder_add(self._pop_builder(node))
         elif node.name == "using_directive":
-            self._pop_builder(node)
+            type_builder = self._pop_builder(node)
+            name_parts = [ b.ns_name for b, _ in self.__builders_stack if isinstance(b, NamespaceBuilder) ]
+            name_parts.append(type_builder.type_name)
+            self.root_builder.declare(".".join(name_parts))
         elif node.name == "interface":
             self._top_builder_add(self._pop_builder(node))
         elif node.name == "field":
@@ -948,7 +1588,7 @@ class ClassDiagramBuilder(NodesHandler):
     #enddef
 
     def _push_builder(self, builder, node):
-        print_debug("Pushing {} on top of the builders stack. type(builder)={}".format(builder, type(builder)))
+        self._session.print_debug("Pushing {} on top of the builders stack. type(builder)={}", builder, type(builder))
 
         if not isinstance(builder, Builder):
             raise TypeError("{} is not a Builder instance".format(builder))
@@ -960,7 +1600,7 @@ class ClassDiagramBuilder(NodesHandler):
         assert self.__builders_stack
         assert self.__builders_stack[-1][1] is node
 
-        print_debug("Popping {} from top of the builders stack.".format(self.__builders_stack[-1][0]))
+        self._session.print_debug("Popping {} from top of the builders stack.", self.__builders_stack[-1][0])
         builder = self.__builders_stack.pop()[0]
         return builder
     #enddef
@@ -1005,3 +1645,134 @@ class ClassDiagramBuilder(NodesHandler):
     #enddef
 
 #endclass
+
+class FrontEndBuilder(object):
+    """
+    Fused front end doing the job of InterfacesIndexBuilder and
+    ClassDiagramBuilder fed by the same nodes in a single pass: the builders
+    tree of the class diagram is built on one builders stack and the types
+    are registered from the very same builders. Types of the fields and of
+    the interface bases are resolved only when the tree is built, i.e. once
+    all the input files are processed.
+
+    The builder is fed by process_file() and process_input(), which set the
+    file the registered types come from.
+    """
+
+    def __init__(self, session, root_builder=None):
+        self._session = session
+        self._filepath = None
+
+        self.root_builder = root_builder if root_builder else FileBuilder(session)
+        self.__builders_stack = [(self.root_builder, None)]
+        # Set while inside 'interface_base', its 'type_name' doesn't name the
+        # interface.
+        self.__in_interface_base = False
+    #enddef
+
+    def build(self):
+        return self.root_builder.build()
+    #enddef
+
+    def process_file(self, filepath):
+        import os.path
+        self._session.print_debug("Processing file '{}'.", filepath)
+        self._filepath = os.path.abspath(filepath)
+        self._session.process_file(filepath, [ self ])
+    #enddef
+
+    def process_input(self, inp):
+        self._filepath = None
+        self._session.process_input(inp, [ self ])
+    #enddef
+
+    def node_begin(self, node):
+        name = node.name
+        if name == "type_name":
+            if not self.__in_interface_base:
+                self._register_type(node.text)
+        elif name in FrontEndBuilder._PUSHED_BUILDERS:
+            builder = FrontEndBuilder._PUSHED_BUILDERS[name]()
+            self._session.print_debug("Pushing {} on top of the builders stack.", builder)
+            self.__builders_stack.append((builder, node))
+        elif name == "ns_name":
+            # The namespaces of the path of a base aren't declared.
+            if not self.__in_interface_base:
+                self.__builders_stack[-1][0].ns_name = node.text
+        elif name in FrontEndBuilder._PROPERTIES:
+            setattr(self.__builders_stack[-1][0], FrontEndBuilder._PROPERTIES[name], node.text)
+        elif name in FrontEndBuilder._ATTR_VALUES:
+            self.__builders_stack[-1][0].attr_value = (node.text, name)
+        elif name == "interface_base":
+            self.__in_interface_base = True
+        elif name == "include_filepath":
+            self._session.process_include(self._filepath, node.text)
+    #enddef
+
+    def node_end(self, node):
+        name = node.name
+        if name in FrontEndBuilder._PUSHED_BUILDERS:
+            assert self.__builders_stack[-1][1] is node
+            builder = self.__builders_stack.pop()[0]
+            self._session.print_debug("Popping {} from top of the builders stack.", builder)
+            if name == "attr":
+                builder.build(self.__builders_stack[-1][0])
+            elif name != "using_directive":
+                # Declarations made by using directives are in the types
+                # registry only, not in the class diagram.
+                self.__builders_stack[-1][0].add(builder)
+        elif name == "interface_base":
+            self.__in_interface_base = False
+    #enddef
+
+    def _register_type(self, type_name):
+        builder = self.__builders_stack[-1][0]
+        builder.type_name = type_name
+
+        name_parts = [ b.ns_name for b, _ in self.__builders_stack if isinstance(b, NamespaceBuilder) ]
+        name_parts.append(builder.type_name)
+        full_name = ".".join(name_parts)
+
+        self._session.print_debug("Registering type '{}'.", full_name)
+        if isinstance(builder, InterfaceBuilder):
+            self._session.register_type(full_name, definition=builder, source=self._filepath)
+        else:
+            self._session.register_type(full_name, declaration=builder, source=self._filepath)
+            self.root_builder.declare(full_name)
+    #enddef
+
+    # Node name -> builder pushed on the stack for the node.
+    _PUSHED_BUILDERS = {
+        "ns": NamespaceBuilder,
+        "using_directive": TypeBuilder,
+        "interface": InterfaceBuilder,
+        "field": FieldBuilder,
+        "attr": AttributeBuilder
+    }
+
+    # Node name -> property of the builder on top of the stack set to the
+    # node text.
+    _PROPERTIES = {
+        "type_ref": "base_type_ref",
+        "field_is_ref": "field_is_ref",
+        "field_type": "field_type",
+        "field_is_repeated": "field_is_repeated",
+        "field_name": "field_name",
+        "field_id": "field_id",
+        "attr_path": "attr_path"
+    }
+
+    _ATTR_VALUES = set([ "attr_value_string", "attr_value_bool", "attr_value_int", "attr_value_float" ])
+
+#endclass
+
+def compile_files(session, filepaths):
+    """
+    Processes the input files by the fused front end and returns it, the
+    class diagram is built by its build().
+    """
+    front_end = FrontEndBuilder(session)
+    for filepath in filepaths:
+        front_end.process_file(filepath)
+    return front_end
+#enddef
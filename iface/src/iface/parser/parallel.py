@@ -0,0 +1,62 @@
+import concurrent.futures
+import os
+
+from .cache import EventsRecorder
+from .module import CompilationSession
+
+def _parse_file(filepath, engine, cache):
+    """
+    Runs in a worker process, returns the recorded events of the file.
+    """
+    session = CompilationSession(engine=engine, cache=cache)
+    recorder = EventsRecorder()
+    session.process_file(filepath, [ recorder ])
+    return recorder.events
+#enddef
+
+def prefetch_files(session, filepaths, jobs):
+    """
+    Parses the files and all the files they include (transitively) in a pool
+    of 'jobs' processes and stores the recorded events to the session as
+    prefetched. The builders are still fed from the prefetched events one
+    file after another in the main process, so the result is the same as
+    without the prefetching.
+
+    Files failing to parse are left out, the error is reported once the file
+    is processed in the main process.
+    """
+    submitted = set()
+    pending = {}
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+
+        def submit(filepath):
+            filepath = os.path.abspath(filepath)
+            if filepath not in submitted:
+                session.print_debug("Prefetching file '{}'.", filepath)
+                submitted.add(filepath)
+                future = executor.submit(_parse_file, filepath, session.engine, session.cache)
+                pending[future] = filepath
+        #enddef
+
+        for filepath in filepaths:
+            submit(filepath)
+
+        while pending:
+            done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                filepath = pending.pop(future)
+                try:
+                    events = future.result()
+                except Exception as e:
+                    session.print_debug("Prefetching file '{}' failed ({}).", filepath, e)
+                    continue
+                session.prefetched[filepath] = events
+
+                # Included files can be parsed as soon as they are discovered.
+                for event in events:
+                    if event is not None and event[0] == "include_filepath":
+                        include_filepath = session.resolver.resolve(event[1])
+                        if include_filepath is not None:
+                            submit(include_filepath)
+#enddef
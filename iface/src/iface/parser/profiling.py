@@ -0,0 +1,166 @@
+import collections
+import contextlib
+import json
+import time
+import tracemalloc
+
+# Bump when the format of the report changes.
+PROFILE_REPORT_VERSION = 1
+
+class Profiler(object):
+    """
+    Collects the metrics of a compilation: wall and CPU time of the phases
+    (see CompilationSession.phase()), nodes of interest per rule, timing of
+    the indexed included files and optionally the peak of the traced memory
+    per phase. It's fed by the session it's given to, a session without a
+    profiler doesn't call any of the hooks.
+
+    The profiler also acts as a builder counting the nodes it's fed by.
+    """
+
+    def __init__(self, trace_memory=True):
+        self._trace_memory = trace_memory
+        # Phase name -> [calls, wall, cpu, self wall, self cpu, peak memory]
+        self._phases = collections.OrderedDict()
+        # Wall and CPU time of the nested phases of the phases being
+        # measured.
+        self._nested = []
+        # Phase name -> number of its calls being measured.
+        self._active = collections.Counter()
+        # Peaks of the traced memory of the phases being measured, the
+        # outermost is the whole run.
+        self._peaks = []
+        self._nodes = collections.Counter()
+        self._includes = []
+        self._start = None
+        self._total = None
+        self._started_tracing = False
+    #enddef
+
+    def start(self):
+        if self._trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        self._peaks = [ 0 ]
+        if self._trace_memory:
+            tracemalloc.reset_peak()
+        self._start = (time.perf_counter(), time.process_time())
+    #enddef
+
+    def stop(self):
+        wall = time.perf_counter() - self._start[0]
+        cpu = time.process_time() - self._start[1]
+        peak = self._pop_peak() if self._trace_memory else None
+        self._total = { "wall": wall, "cpu": cpu, "peak_memory": peak }
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+    #enddef
+
+    def _push_peak(self):
+        # The peak is reset for the nested phase, so remember the peak of the
+        # enclosing one so far.
+        self._peaks[-1] = max(self._peaks[-1], tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+        self._peaks.append(0)
+    #enddef
+
+    def _pop_peak(self):
+        peak = max(self._peaks.pop(), tracemalloc.get_traced_memory()[1])
+        if self._peaks:
+            self._peaks[-1] = max(self._peaks[-1], peak)
+        return peak
+    #enddef
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """
+        Measures the enclosed code as a call of the phase. Phases can nest
+        (e.g. an included file is parsed while the including one is visited),
+        the time of a phase includes its nested phases, but a phase nested in
+        itself is counted once. The self time excludes the nested phases, so
+        the self times of all the phases add up to at most the total time.
+        """
+        trace_memory = self._trace_memory and bool(self._peaks)
+        if trace_memory:
+            self._push_peak()
+        self._nested.append([ 0.0, 0.0 ])
+        self._active[name] += 1
+        start_wall = time.perf_counter()
+        start_cpu = time.process_time()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - start_wall
+            cpu = time.process_time() - start_cpu
+            peak = self._pop_peak() if trace_memory else 0
+            nested_wall, nested_cpu = self._nested.pop()
+            if self._nested:
+                self._nested[-1][0] += wall
+                self._nested[-1][1] += cpu
+            self._active[name] -= 1
+
+            stats = self._phases.get(name)
+            if stats is None:
+                stats = self._phases[name] = [ 0, 0.0, 0.0, 0.0, 0.0, 0 ]
+            stats[0] += 1
+            if not self._active[name]:
+                stats[1] += wall
+                stats[2] += cpu
+            stats[3] += wall - nested_wall
+            stats[4] += cpu - nested_cpu
+            stats[5] = max(stats[5], peak)
+    #enddef
+
+    def record_include(self, filepath, source, wall, cpu):
+        """
+        Records indexing of the included file, the source is where its types
+        came from ("parsed", "shared_index" or "precompiled_index").
+        """
+        self._includes.append({ "path": filepath, "source": source, "wall": wall, "cpu": cpu })
+    #enddef
+
+    def node_begin(self, node):
+        self._nodes[node.name] += 1
+    #enddef
+
+    def node_end(self, node):
+        pass
+    #enddef
+
+    def report(self, session=None):
+        """
+        Returns the collected metrics as a JSON serializable object, with the
+        type and include resolution counts of the session if given.
+        """
+        report = {
+            "version": PROFILE_REPORT_VERSION,
+            "total": self._total,
+            "phases": { name: {
+                    "calls": calls,
+                    "wall": wall,
+                    "cpu": cpu,
+                    "self_wall": self_wall,
+                    "self_cpu": self_cpu,
+                    "peak_memory": peak if self._trace_memory else None
+                } for name, (calls, wall, cpu, self_wall, self_cpu, peak) in self._phases.items() },
+            "nodes": dict(self._nodes.most_common()),
+            "includes": self._includes
+        }
+        if session is not None:
+            report["resolution"] = {
+                "lookups": session.symbols.lookups,
+                "computed": session.symbols.computed,
+                "types": len(session.types)
+            }
+            report["include_resolution"] = session.resolver.stats()
+            report["layouts"] = session.layouts.stats()
+        return report
+    #enddef
+
+    def write_report(self, f, session=None):
+        json.dump(self.report(session), f, indent=1)
+        f.write("\n")
+    #enddef
+
+#endclass
@@ -0,0 +1,133 @@
+import json
+import os
+import socketserver
+import threading
+
+from .cache import MemoryParseCache
+from .ifaceidx import MemoryIndex
+from .includes import IncludeResolver
+from .module import CompilationSession, compile_files
+
+class CompileRequestHandler(socketserver.StreamRequestHandler):
+    """
+    Handles newline delimited JSON requests of a client connection, see
+    CompileServer.process_request_data() for the format.
+    """
+
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+
+            request = None
+            try:
+                request = json.loads(line.decode("utf-8"))
+            except ValueError as e:
+                response = { "status": "error", "error": "Invalid request ({}).".format(e) }
+            else:
+                if isinstance(request, dict):
+                    response = self.server.process_request_data(request)
+                else:
+                    response = { "status": "error", "error": "Invalid request (not a JSON object)." }
+
+            self.wfile.write(json.dumps(response).encode("utf-8") + b"\n")
+            self.wfile.flush()
+
+            if isinstance(request, dict) and request.get("shutdown"):
+                # shutdown() blocks until serve_forever() returns, so it can't
+                # be called from the serving thread.
+                threading.Thread(target=self.server.shutdown).start()
+                break
+    #enddef
+
+#endclass
+
+class CompileServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Long running compile server listening on a Unix domain socket. The
+    grammar is compiled once and the parsed files are kept in memory (in
+    front of the optional persistent cache), so a compilation of unchanged
+    includes only replays their events. The index of the included files and
+    the include resolvers are shared by the requests too, checked for the
+    changed files and directories at the start of every request. Every
+    request is compiled in its own CompilationSession.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, socket_path, engine="parsimonious", cache=None, debug=False):
+        # Remove the socket left by a previous server.
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+
+        socketserver.UnixStreamServer.__init__(self, socket_path, CompileRequestHandler)
+
+        self.socket_path = socket_path
+        self.engine = engine
+        self.debug = debug
+        self.cache = MemoryParseCache(cache)
+        self.index = MemoryIndex(check_mtime=True)
+        # Include paths -> IncludeResolver.
+        self._resolvers = {}
+        self._resolvers_lock = threading.Lock()
+    #enddef
+
+    def _resolver(self, include_paths):
+        with self._resolvers_lock:
+            resolver = self._resolvers.get(tuple(include_paths))
+            if resolver is None:
+                resolver = IncludeResolver(include_paths)
+                self._resolvers[tuple(include_paths)] = resolver
+            elif resolver.refresh():
+                # An include may resolve to another file now.
+                self.index.clear()
+        return resolver
+    #enddef
+
+    def process_request_data(self, request):
+        """
+        Request is an object with the keys:
+            inputs        - absolute paths of the input files
+            include_paths - absolute paths where to look for included files
+            output        - optional absolute path of the output file, the
+                            class diagram is returned otherwise
+            engine        - optional parser engine to use
+            using_all_types - optional, list all the known types in the
+                            'using' section, not just the referenced ones
+            shutdown      - stops the server if true
+        Response is an object with 'status' ("ok" or "error") and either
+        'class_diagram' or 'error'.
+        """
+        if request.get("shutdown"):
+            return { "status": "ok" }
+
+        try:
+            include_paths = request.get("include_paths", [])
+            session = CompilationSession(include_paths,
+                    debug=self.debug,
+                    engine=request.get("engine") or self.engine,
+                    cache=self.cache,
+                    using_all_types=bool(request.get("using_all_types")),
+                    index=self.index,
+                    resolver=self._resolver(include_paths))
+            import codemodel
+            class_diagram_builder = compile_files(session, request["inputs"])
+            class_diagram = codemodel.to_json(class_diagram_builder.build())
+
+            if request.get("output"):
+                with open(request["output"], "w") as f:
+                    f.write(class_diagram)
+                return { "status": "ok" }
+        except Exception as e:
+            return { "status": "error", "error": "{}: {}".format(type(e).__name__, e) }
+        return { "status": "ok", "class_diagram": class_diagram }
+    #enddef
+
+    def server_close(self):
+        socketserver.UnixStreamServer.server_close(self)
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        self.cache.evict()
+    #enddef
+
+#endclass
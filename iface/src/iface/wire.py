@@ -0,0 +1,252 @@
+"""
+Runtime of the Python wire codecs generated by iface.generator, see
+iface.generator.wireformat for the format. Encoders append to a bytearray,
+decoders take the data and a position and return the value and the position
+after it.
+"""
+
+import array
+import struct
+import sys
+
+WIRE_VARINT = 0
+WIRE_FIXED64 = 1
+WIRE_LENGTH = 2
+WIRE_FIXED32 = 5
+
+_FLOAT = struct.Struct("<f")
+_DOUBLE = struct.Struct("<d")
+
+# The arrays of the columns (see iface.columns) of the floats and doubles are
+# copied as they are if their byte order is the one of the format.
+_LITTLE_ENDIAN = sys.byteorder == "little"
+
+def encode_varint(value, out):
+    if value < 0:
+        raise RuntimeError("Cannot encode negative value {} as unsigned.".format(value))
+    while value >= 0x80:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+#enddef
+
+def encode_signed(value, out):
+    # Zigzag, small negative values are short too.
+    encode_varint(value << 1 if value >= 0 else ((-value) << 1) - 1, out)
+#enddef
+
+def encode_bool(value, out):
+    out.append(1 if value else 0)
+#enddef
+
+def encode_float(value, out):
+    out += _FLOAT.pack(value)
+#enddef
+
+def encode_double(value, out):
+    out += _DOUBLE.pack(value)
+#enddef
+
+def encode_string(value, out):
+    data = value.encode("utf-8")
+    encode_varint(len(data), out)
+    out += data
+#enddef
+
+def encode_length_delimited(data, out):
+    encode_varint(len(data), out)
+    out += data
+#enddef
+
+def decode_varint(data, pos):
+    try:
+        byte = data[pos]
+    except IndexError:
+        raise RuntimeError("Truncated varint at {}.".format(pos))
+    if byte < 0x80:
+        return byte, pos + 1
+
+    value = byte & 0x7f
+    shift = 7
+    while True:
+        pos += 1
+        try:
+            byte = data[pos]
+        except IndexError:
+            raise RuntimeError("Truncated varint at {}.".format(pos))
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, pos + 1
+        shift += 7
+        if shift >= 70:
+            raise RuntimeError("Varint too long at {}.".format(pos))
+#enddef
+
+def decode_signed(data, pos):
+    try:
+        value = data[pos]
+    except IndexError:
+        raise RuntimeError("Truncated varint at {}.".format(pos))
+    if value < 0x80:
+        pos += 1
+    else:
+        value, pos = decode_varint(data, pos)
+    return (value >> 1) ^ -(value & 1), pos
+#enddef
+
+def decode_bool(data, pos):
+    value, pos = decode_varint(data, pos)
+    return value != 0, pos
+#enddef
+
+def decode_float(data, pos):
+    if pos + 4 > len(data):
+        raise RuntimeError("Truncated float at {}.".format(pos))
+    return _FLOAT.unpack_from(data, pos)[0], pos + 4
+#enddef
+
+def decode_double(data, pos):
+    if pos + 8 > len(data):
+        raise RuntimeError("Truncated double at {}.".format(pos))
+    return _DOUBLE.unpack_from(data, pos)[0], pos + 8
+#enddef
+
+def decode_length(data, pos):
+    """
+    Returns the end of the length delimited value and its start.
+    """
+    length, pos = decode_varint(data, pos)
+    end = pos + length
+    if end > len(data):
+        raise RuntimeError("Truncated value at {}.".format(pos))
+    return end, pos
+#enddef
+
+def decode_string(data, pos):
+    end, pos = decode_length(data, pos)
+    return bytes(data[pos:end]).decode("utf-8"), end
+#enddef
+
+# Wire kind -> (decoder of an item, fixed size or None), see decode_packed().
+_PACKED_DECODERS = {
+    "signed": (decode_signed, None),
+    "unsigned": (decode_varint, None),
+    "bool": (decode_bool, None),
+    "float": (decode_float, 4),
+    "double": (decode_double, 8),
+}
+
+def encode_packed(kind, values, out):
+    """
+    Writes the values of a packed repeated field (without the key).
+    """
+    if _LITTLE_ENDIAN and isinstance(values, array.array) and values.typecode == ("f" if kind == "float" else "d"):
+        data = memoryview(values).cast("B")
+    elif kind == "float":
+        data = struct.pack("<{}f".format(len(values)), *values)
+    elif kind == "double":
+        data = struct.pack("<{}d".format(len(values)), *values)
+    else:
+        data = bytearray()
+        encode_item = encode_signed if kind == "signed" else encode_bool if kind == "bool" else encode_varint
+        for value in values:
+            encode_item(value, data)
+    encode_length_delimited(data, out)
+#enddef
+
+def decode_packed(kind, data, pos, values):
+    """
+    Appends the values of a packed repeated field to the list (or the array
+    of a column), returns the position after the field.
+    """
+    end, pos = decode_length(data, pos)
+    decode_item, size = _PACKED_DECODERS[kind]
+    if size is not None:
+        if (end - pos) % size:
+            raise RuntimeError("Broken packed field at {}.".format(pos))
+        if _LITTLE_ENDIAN and isinstance(values, array.array) and values.typecode == ("f" if size == 4 else "d"):
+            values.frombytes(memoryview(data)[pos:end])
+            return end
+        values.extend(struct.unpack_from("<{}{}".format((end - pos) // size, "f" if size == 4 else "d"), data, pos))
+        return end
+
+    append = values.append
+    if kind == "bool":
+        while pos < end:
+            value, pos = decode_item(data, pos)
+            append(value)
+    else:
+        # The varints are decoded inline, there are many of them.
+        signed = kind == "signed"
+        try:
+            while pos < end:
+                value = data[pos]
+                pos += 1
+                if value >= 0x80:
+                    value &= 0x7f
+                    shift = 7
+                    while True:
+                        byte = data[pos]
+                        pos += 1
+                        value |= (byte & 0x7f) << shift
+                        if byte < 0x80:
+                            break
+                        shift += 7
+                append((value >> 1) ^ -(value & 1) if signed else value)
+        except IndexError:
+            raise RuntimeError("Truncated varint at {}.".format(pos))
+    if pos != end:
+        raise RuntimeError("Broken packed field at {}.".format(pos))
+    return end
+#enddef
+
+def skip_field(data, pos, wire_type):
+    """
+    Returns the position after the value of an unknown field.
+    """
+    if wire_type == WIRE_VARINT:
+        return decode_varint(data, pos)[1]
+    elif wire_type == WIRE_FIXED64:
+        pos += 8
+    elif wire_type == WIRE_LENGTH:
+        return decode_length(data, pos)[0]
+    elif wire_type == WIRE_FIXED32:
+        pos += 4
+    else:
+        raise RuntimeError("Unsupported wire type {} at {}.".format(wire_type, pos))
+    if pos > len(data):
+        raise RuntimeError("Truncated value at {}.".format(pos))
+    return pos
+#enddef
+
+def encode_many(objects):
+    """
+    Returns the objects of the generated classes encoded to a single buffer,
+    every one length delimited, see decode_many().
+    """
+    out = bytearray()
+    # The message of every object is written to the same scratch buffer.
+    data = bytearray()
+    for obj in objects:
+        del data[:]
+        obj._encode(data)
+        encode_varint(len(data), out)
+        out += data
+    return bytes(out)
+#enddef
+
+def decode_many(cls, data):
+    """
+    Returns the list of the objects of the class decoded from the buffer
+    written by encode_many().
+    """
+    objects = []
+    append = objects.append
+    pos = 0
+    end = len(data)
+    while pos < end:
+        obj_end, pos = decode_length(data, pos)
+        append(cls._decode(data, pos, obj_end))
+        pos = obj_end
+    return objects
+#enddef
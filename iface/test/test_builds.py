@@ -0,0 +1,143 @@
+"""
+Batch and incremental builds: the outputs are the ones of a plain
+compilation, a failed target doesn't affect the others nor leave a partial
+output, and an incremental rebuild does nothing when nothing it depends on
+changed.
+"""
+
+import json
+import os
+import time
+
+import pytest
+
+codemodel = pytest.importorskip("codemodel")
+
+from iface.parser import CompilationSession
+from iface.parser.batch import BatchBuild, BatchTarget, load_batch_manifest
+from iface.parser.bindiagram import BinaryClassDiagram
+from iface.parser.incremental import IncrementalBuild
+from iface.parser.module import compile_files
+
+LIB = "namespace lib {\n@treatment(\"value_type\")\nusing Handle;\ninterface Base { Handle h = 1; }\n}\n"
+MAIN = "include \"lib.iface\"\nnamespace app {\ninterface Item : lib.Base { int n = 2; }\n}\n"
+OTHER = "include \"lib.iface\"\ninterface Other { lib.Base[] bases = 1; }\n"
+
+def _write(filepath, content, mtime_offset=0):
+    with open(filepath, "w") as f:
+        f.write(content)
+    if mtime_offset:
+        mtime = time.time() + mtime_offset
+        os.utime(filepath, (mtime, mtime))
+    return filepath
+#enddef
+
+def _read(filepath):
+    with open(filepath, "r") as f:
+        return f.read()
+#enddef
+
+def _local(inputs, include_paths):
+    return codemodel.to_json(compile_files(CompilationSession(include_paths), inputs).build())
+#enddef
+
+@pytest.fixture
+def files(tmp_path):
+    include_dir = tmp_path / "include"
+    include_dir.mkdir()
+    lib = _write(str(include_dir / "lib.iface"), LIB)
+    main = _write(str(tmp_path / "main.iface"), MAIN)
+    other = _write(str(tmp_path / "other.iface"), OTHER)
+    return main, other, lib, str(include_dir)
+#enddef
+
+@pytest.mark.parametrize("jobs", [ 1, 2 ])
+def test_batch(tmp_path, files, jobs):
+    main, other, _, include_dir = files
+    manifest = _write(str(tmp_path / "batch.json"), json.dumps({
+        "include_paths": [ "include" ],
+        "targets": [
+            { "input": "main.iface", "output": "main.json" },
+            { "inputs": [ "other.iface", "main.iface" ], "output": "both.json" },
+            { "input": "missing.iface", "output": "missing.json" }
+        ]
+    }))
+
+    targets = load_batch_manifest(manifest)
+    assert not BatchBuild(targets).build(jobs)
+    assert _read(str(tmp_path / "main.json")) == _local([ main ], [ include_dir ])
+    assert _read(str(tmp_path / "both.json")) == _local([ other, main ], [ include_dir ])
+    assert [ target.error is None for target in targets ] == [ True, True, False ]
+    assert not os.path.exists(str(tmp_path / "missing.json"))
+    assert not [ name for name in os.listdir(str(tmp_path)) if name.endswith(".tmp") ]
+#enddef
+
+def test_batch_binary(tmp_path, files):
+    main, _, _, include_dir = files
+    output = str(tmp_path / "main.bin")
+    assert BatchBuild([ BatchTarget([ main ], output, [ include_dir ]) ], output_format="bin").build()
+    with BinaryClassDiagram(output) as class_diagram:
+        assert class_diagram.node("app.Item").attributes["base"] == "lib.Base"
+#enddef
+
+def test_incremental(tmp_path, files):
+    main, _, lib, include_dir = files
+    output = str(tmp_path / "main.json")
+    manifest = output + ".manifest"
+
+    def build():
+        return IncrementalBuild(manifest, [ main ], output, include_paths=[ include_dir ]).build()
+    #enddef
+
+    assert build()
+    assert _read(output) == _local([ main ], [ include_dir ])
+
+    # Nothing changed.
+    mtime = os.stat(output).st_mtime_ns
+    assert not build()
+    assert os.stat(output).st_mtime_ns == mtime
+
+    # The types seen by the input didn't change.
+    _write(lib, "# comment\n" + LIB, 10)
+    assert not build()
+
+    _write(lib, LIB.replace("value_type", "reference_type"), 20)
+    assert build()
+    assert _read(output) == _local([ main ], [ include_dir ])
+
+    _write(main, MAIN.replace("int n = 2;", "int n = 2; int m = 3;"), 30)
+    assert build()
+    assert _read(output) == _local([ main ], [ include_dir ])
+
+    os.remove(output)
+    assert build()
+    assert not build()
+#enddef
+
+def test_incremental_failure(tmp_path, files):
+    main, _, _, include_dir = files
+    output = str(tmp_path / "main.json")
+    manifest = output + ".manifest"
+    assert IncrementalBuild(manifest, [ main ], output, include_paths=[ include_dir ]).build()
+    previous = _read(output)
+
+    _write(main, MAIN.replace("lib.Base", "lib.Missing"), 10)
+    with pytest.raises(Exception):
+        IncrementalBuild(manifest, [ main ], output, include_paths=[ include_dir ]).build()
+    assert _read(output) == previous
+    assert not os.path.exists(output + ".tmp")
+#enddef
+
+def test_incremental_binary(tmp_path, files):
+    main, _, _, include_dir = files
+    output = str(tmp_path / "main.out")
+    manifest = output + ".manifest"
+    assert IncrementalBuild(manifest, [ main ], output, include_paths=[ include_dir ]).build()
+    assert _read(output) == _local([ main ], [ include_dir ])
+
+    # Another format is another output.
+    assert IncrementalBuild(manifest, [ main ], output, include_paths=[ include_dir ], output_format="bin").build()
+    with BinaryClassDiagram(output) as class_diagram:
+        assert class_diagram.node("app.Item").attributes["base"] == "lib.Base"
+    assert not IncrementalBuild(manifest, [ main ], output, include_paths=[ include_dir ], output_format="bin").build()
+#enddef
@@ -0,0 +1,108 @@
+"""
+Parse cache: the events are replayed from the cache instead of parsing, the
+entries are keyed by the content and the eviction keeps the cache bounded
+without scanning it on every run.
+"""
+
+import os
+import time
+
+import pytest
+
+from iface.parser import CompilationSession
+from iface.parser.cache import EVICTION_STAMP, EventsRecorder, MemoryParseCache, ParseCache, input_key
+
+INPUT = "namespace n {\nusing T;\ninterface A { T t = 1; n.A[] all = 2; }\n}\n"
+
+def _entries(cache_dir):
+    return sorted(os.path.join(shard, entry) for shard in os.listdir(cache_dir) if shard != EVICTION_STAMP
+            for entry in os.listdir(os.path.join(cache_dir, shard)))
+#enddef
+
+def _events(inp, cache, engine="parsimonious"):
+    recorder = EventsRecorder()
+    CompilationSession(engine=engine, cache=cache).process_input(inp, [ recorder ])
+    return recorder.events
+#enddef
+
+def _age(cache_dir, seconds):
+    mtime = time.time() - seconds
+    for entry in _entries(cache_dir):
+        os.utime(os.path.join(cache_dir, entry), (mtime, mtime))
+#enddef
+
+@pytest.mark.parametrize("engine", [ "parsimonious", "fast" ])
+def test_replay(tmp_path, engine):
+    cache = ParseCache(str(tmp_path))
+    parsed = _events(INPUT, cache, engine)
+    assert len(_entries(str(tmp_path))) == 1
+    assert _events(INPUT, None, engine) == parsed
+    assert _events(INPUT, cache, engine) == parsed
+
+    # The input isn't parsed again, the stored events are replayed.
+    cache.store(cache.key(INPUT), [ ("file", "replayed"), None ])
+    assert _events(INPUT, cache, engine) == [ ("file", "replayed"), None ]
+#enddef
+
+def test_keys():
+    assert input_key(INPUT) == input_key(INPUT)
+    assert input_key(INPUT) != input_key(INPUT + "\n")
+#enddef
+
+def test_broken_entry(tmp_path):
+    cache = ParseCache(str(tmp_path))
+    key = cache.key(INPUT)
+    cache.store(key, [ ("file", ""), None ])
+    with open(os.path.join(str(tmp_path), _entries(str(tmp_path))[0]), "wb") as f:
+        f.write(b"broken")
+    assert cache.load(key) is None
+    assert _events(INPUT, cache) == _events(INPUT, None)
+#enddef
+
+def test_evict_max_age(tmp_path):
+    cache = ParseCache(str(tmp_path), max_age=60)
+    cache.store(cache.key("a"), [])
+    _age(str(tmp_path), 120)
+    cache.store(cache.key("b"), [])
+    assert cache.evict() == 1
+    assert cache.load(cache.key("a")) is None and cache.load(cache.key("b")) == []
+#enddef
+
+def test_evict_max_size(tmp_path):
+    cache = ParseCache(str(tmp_path), max_size=1)
+    cache.store(cache.key("a"), [])
+    assert cache.evict() == 1
+    assert _entries(str(tmp_path)) == []
+#enddef
+
+def test_evict_interval(tmp_path):
+    cache = ParseCache(str(tmp_path), max_age=60)
+    # Nothing stored, the cache isn't scanned.
+    assert cache.evict() == 0
+    assert not os.path.exists(os.path.join(str(tmp_path), EVICTION_STAMP))
+
+    cache.store(cache.key("a"), [])
+    _age(str(tmp_path), 120)
+    assert cache.evict() == 1
+    assert os.path.exists(os.path.join(str(tmp_path), EVICTION_STAMP))
+
+    # Another instance stored an entry, but the cache was scanned recently.
+    other = ParseCache(str(tmp_path), max_age=60)
+    other.store(other.key("b"), [])
+    _age(str(tmp_path), 120)
+    assert other.evict() == 0
+    assert other.evict(force=True) == 1
+#enddef
+
+def test_memory_cache(tmp_path):
+    backing = ParseCache(str(tmp_path))
+    cache = MemoryParseCache(backing, max_entries=2)
+    for inp in [ "a", "b", "c" ]:
+        cache.store(cache.key(inp), [ (inp, inp), None ])
+    assert len(_entries(str(tmp_path))) == 3
+
+    # The least recently used entry is loaded from the backing cache.
+    assert cache.load(cache.key("a")) == [ ("a", "a"), None ]
+    assert MemoryParseCache(max_entries=2).load(cache.key("a")) is None
+    assert cache.evict(force=True) == 0
+#enddef
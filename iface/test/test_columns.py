@@ -0,0 +1,191 @@
+"""
+Columns of the generated classes and structs: the repeated numeric and bool
+fields are typed arrays, the repeated fields of the interfaces with the
+columnar layout are struct of arrays, and both encode to the bytes of the
+plain layout.
+"""
+
+import array
+import importlib.util
+import io
+import os
+import shutil
+import subprocess
+
+import pytest
+
+pytest.importorskip("codemodel")
+
+from iface.generator import load_schema
+from iface.generator.cpp import generate_cpp_header
+from iface.generator.cppwire import generate_cpp_wire_header
+from iface.generator.python import generate_python
+from iface.parser import CompilationSession, FrontEndBuilder
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+CPP_INCLUDE_DIR = os.path.join(TEST_DIR, os.pardir, os.pardir, "cpp", "include")
+
+SCHEMA = """
+namespace app {
+
+@treatment("value_type")
+interface Point {
+  double x = 1;
+  float y = 2;
+}
+
+interface Base {
+  int t = 1;
+}
+
+interface Sample : Base {
+  bool valid = 2;
+}
+
+interface Named {
+  string name = 1;
+}
+
+@layout("columnar")
+interface Track {
+  string name = 1;
+  Point[] points = 2;
+  Sample[] samples = 3;
+  int[] ticks = 4;
+  bool[] flags = 5;
+  Named[] names = 6;
+}
+
+}
+"""
+
+CPP_ROUND_TRIP = r"""
+#include "schema_wire.hpp"
+#include <cstdint>
+#include <cstdio>
+#include <fstream>
+#include <iterator>
+#include <type_traits>
+
+static_assert(std::is_same<decltype(app::Track::points), app::PointColumns>::value, "points");
+static_assert(std::is_same<decltype(app::SampleColumns::valid), std::vector<std::uint8_t>>::value, "bool column");
+static_assert(std::is_same<decltype(app::Track::flags), std::vector<std::uint8_t>>::value, "repeated bool");
+
+#define CHECK(condition) if (!(condition)) { std::printf("failed: %s\n", #condition); return 1; }
+
+int main(int argc, char* argv[])
+{
+  std::ifstream in(argv[1], std::ios::binary);
+  std::string data((std::istreambuf_iterator<char>(in)), std::istreambuf_iterator<char>());
+  app::Track track;
+  mad::interfaces::wire::decode_message(data, track);
+  CHECK(track.name == "track" && track.points.size() == 3 && track.points.x[1] == 2.5 && track.points[2].y == -1.0f);
+  CHECK(track.samples.size() == 2 && track.samples.t[1] == -4 && track.samples.valid[0] && !track.samples[1].valid);
+  CHECK(track.ticks.size() == 2 && track.flags.size() == 2 && track.names.size() == 1);
+
+  app::Point point;
+  point.x = 9.0;
+  track.points.push_back(point);
+  std::ofstream(argv[2], std::ios::binary) << mad::interfaces::wire::encode_message(track);
+  return 0;
+}
+"""
+
+def _schema(inp):
+    session = CompilationSession()
+    front_end = FrontEndBuilder(session)
+    front_end.process_input(inp)
+    return load_schema(front_end.root_builder.build())
+#enddef
+
+def _generate(generate, schema, filepath, **kwargs):
+    f = io.StringIO()
+    generate(schema, f, **kwargs)
+    with open(filepath, "w") as out:
+        out.write(f.getvalue())
+    return filepath
+#enddef
+
+def _load(schema, filepath, name):
+    _generate(generate_python, schema, filepath)
+    spec = importlib.util.spec_from_file_location(name, filepath)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+#enddef
+
+@pytest.fixture(scope="module")
+def generated(tmp_path_factory):
+    tmp_path = tmp_path_factory.mktemp("columns")
+    columnar = _load(_schema(SCHEMA), str(tmp_path / "columnar.py"), "generated_columnar_schema")
+    plain = _load(_schema(SCHEMA.replace("@layout(\"columnar\")", "")), str(tmp_path / "plain.py"), "generated_plain_schema")
+    return columnar, plain
+#enddef
+
+def _track(gen):
+    return gen.Track(name="track", points=[ gen.Point(x=1.0), gen.Point(x=2.5, y=0.5), gen.Point(y=-1.0) ],
+            samples=[ gen.Sample(t=3, valid=True), gen.Sample(t=-4) ], ticks=[ 1, -2 ], flags=[ False, True ],
+            names=[ gen.Named(name="n") ])
+#enddef
+
+def test_column_fields():
+    schema = _schema(SCHEMA)
+    assert [ field.name for field in schema.column_fields("app.Sample") ] == [ "t", "valid" ]
+    assert [ field.name for field in schema.column_fields("app.Point") ] == [ "x", "y" ]
+    for full_type in [ "app.Named", "app.Track", "app.Missing", "int" ]:
+        assert schema.column_fields(full_type) is None
+    assert schema.columnar_types() == { "app.Point", "app.Sample" }
+
+    # Without the fields of the base the layout isn't known.
+    schema = _schema("namespace lib { using Base; }\ninterface S : lib.Base { int t = 1; }\n@layout(\"columnar\")\ninterface T { S[] s = 1; }\n")
+    assert schema.column_fields("S") is None and not schema.columnar_types()
+#enddef
+
+def test_python_columns(generated):
+    columnar, _ = generated
+    track = _track(columnar)
+    assert isinstance(track.points, columnar.PointColumns) and isinstance(track.samples, columnar.SampleColumns)
+    assert isinstance(track.names, list)
+    assert [ column.typecode for column in [ track.points.x, track.points.y, track.samples.t, track.samples.valid ] ] == [ "d", "f", "i", "B" ]
+    assert [ column.typecode for column in [ track.ticks, track.flags ] ] == [ "i", "B" ]
+    assert len(track.samples) == 2 and track.samples[0].valid is True and track.samples[1].valid is False
+    assert [ (point.x, point.y) for point in track.points ] == [ (1.0, 0.0), (2.5, 0.5), (0.0, -1.0) ]
+
+    columns = columnar.PointColumns(track.points)
+    columns.extend([ columnar.Point(x=4.0) ])
+    columns.append(columnar.Point(y=2.0))
+    assert list(columns.x) == [ 1.0, 2.5, 0.0, 4.0, 0.0 ] and list(columns.y) == [ 0.0, 0.5, -1.0, 0.0, 2.0 ]
+    assert memoryview(columns.x).nbytes == 5 * array.array("d").itemsize
+#enddef
+
+def test_python_wire(generated):
+    columnar, plain = generated
+    data = _track(plain).encode()
+    assert _track(columnar).encode() == data
+    track = columnar.Track.decode(data)
+    assert isinstance(track.samples, columnar.SampleColumns)
+    assert list(track.samples.t) == [ 3, -4 ] and list(track.samples.valid) == [ 1, 0 ]
+    assert track.encode() == data
+    assert plain.Track.decode(data).encode() == data
+#enddef
+
+@pytest.mark.skipif(shutil.which("g++") is None, reason="needs g++")
+def test_cpp_columns(generated, tmp_path):
+    columnar, plain = generated
+    schema = _schema(SCHEMA)
+    _generate(generate_cpp_header, schema, str(tmp_path / "schema.hpp"))
+    _generate(generate_cpp_wire_header, schema, str(tmp_path / "schema_wire.hpp"), includes=[ "schema.hpp" ])
+    with open(str(tmp_path / "round_trip.cpp"), "w") as f:
+        f.write(CPP_ROUND_TRIP)
+    subprocess.check_call([ "g++", "-std=c++17", "-Wall", "-I", CPP_INCLUDE_DIR, "-I", str(tmp_path),
+            "-o", str(tmp_path / "round_trip"), str(tmp_path / "round_trip.cpp") ])
+
+    with open(str(tmp_path / "in.bin"), "wb") as f:
+        f.write(_track(columnar).encode())
+    subprocess.check_call([ str(tmp_path / "round_trip"), str(tmp_path / "in.bin"), str(tmp_path / "out.bin") ])
+
+    track = _track(plain)
+    track.points.append(plain.Point(x=9.0))
+    with open(str(tmp_path / "out.bin"), "rb") as f:
+        assert f.read() == track.encode()
+#enddef
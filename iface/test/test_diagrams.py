@@ -0,0 +1,142 @@
+"""
+Class diagram outputs: the streaming JSON writer writes what codemodel
+serializes, the fused front end builds what the separate index and class
+diagram builders do, and every lookup of the binary diagram gives the
+subtree of the JSON diagram.
+"""
+
+import glob
+import io
+import json
+import os
+
+import pytest
+
+codemodel = pytest.importorskip("codemodel")
+
+from iface.bench.corpus import CORPORA, generate_corpus
+from iface.parser import CompilationSession, FrontEndBuilder
+from iface.parser.bindiagram import BinaryClassDiagram, write_binary_class_diagram
+from iface.parser.jsonwriter import write_class_diagram
+from iface.parser.module import ClassDiagramBuilder, InterfacesIndexBuilder
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+
+SAMPLE_FILES = sorted(glob.glob(os.path.join(TEST_DIR, "*.iface")))
+
+QUALIFIED_BASES = """
+namespace n { interface B { int b = 1; } }
+namespace m {
+  using T;
+  interface A : n.B { T t = 2; }
+  interface C : A { @doc("c") A[] all = 3; }
+}
+namespace m { interface D : m.C {} }
+"""
+
+def _front_end(inputs, include_paths=[], engine="fast"):
+    session = CompilationSession(include_paths, engine=engine)
+    front_end = FrontEndBuilder(session)
+    for inp in inputs:
+        if os.path.exists(inp):
+            front_end.process_file(inp)
+        else:
+            front_end.process_input(inp)
+    return front_end.root_builder
+#enddef
+
+def _class_diagram_builder(inputs, include_paths=[], engine="fast"):
+    session = CompilationSession(include_paths, engine=engine)
+    builders = None
+    for inp in inputs:
+        filepath = inp if os.path.exists(inp) else None
+        class_diagram_builder = ClassDiagramBuilder(session, builders[-1].root_builder if builders else None)
+        builders = [ InterfacesIndexBuilder(session, filepath), class_diagram_builder ]
+        if filepath:
+            session.process_file(filepath, builders)
+        else:
+            session.process_input(inp, builders)
+    return builders[-1].root_builder
+#enddef
+
+def _json(root_builder):
+    f = io.StringIO()
+    write_class_diagram(root_builder, f)
+    return f.getvalue()
+#enddef
+
+def _subtrees(node, parent_name="", subtrees=None):
+    """
+    Returns full name -> JSON subtrees of the packages and classes.
+    """
+    if subtrees is None:
+        subtrees = {}
+    full_name = parent_name
+    if node["type"] != "Attribute" and node["attributes"].get("name"):
+        full_name = parent_name + "." + node["attributes"]["name"] if parent_name else node["attributes"]["name"]
+        subtrees.setdefault(full_name, []).append(node)
+    for child in node["children"]:
+        _subtrees(child, full_name, subtrees)
+    return subtrees
+#enddef
+
+def _without_children(node):
+    return dict(node, children=[])
+#enddef
+
+@pytest.fixture(scope="module")
+def diagram_inputs(tmp_path_factory):
+    inputs = [ ([ filepath ], []) for filepath in SAMPLE_FILES ]
+    inputs.append((SAMPLE_FILES, []))
+    inputs.append(([ QUALIFIED_BASES ], []))
+    for spec in CORPORA:
+        main, include_dir, _ = generate_corpus(spec, str(tmp_path_factory.mktemp(spec.name)))
+        inputs.append(([ main ], [ include_dir ]))
+    return inputs
+#enddef
+
+def test_json_writer(diagram_inputs):
+    for inputs, include_paths in diagram_inputs:
+        expected = codemodel.to_json(_front_end(inputs, include_paths).build())
+        assert _json(_front_end(inputs, include_paths)) == expected
+#enddef
+
+def test_json_writer_empty():
+    assert _json(_front_end([ "" ])) == codemodel.to_json(_front_end([ "" ]).build())
+#enddef
+
+def test_front_end(diagram_inputs):
+    for inputs, include_paths in diagram_inputs:
+        assert _json(_front_end(inputs, include_paths)) == _json(_class_diagram_builder(inputs, include_paths))
+#enddef
+
+def test_binary_diagram(diagram_inputs, tmp_path):
+    output = str(tmp_path / "diagram.bin")
+    for inputs, include_paths in diagram_inputs:
+        root = json.loads(_json(_front_end(inputs, include_paths)))
+        with open(output, "wb") as f:
+            write_binary_class_diagram(_front_end(inputs, include_paths), f)
+
+        subtrees = _subtrees(root)
+        with BinaryClassDiagram(output) as class_diagram:
+            assert json.loads(codemodel.to_json(class_diagram.root())) == root
+            assert class_diagram.names() == sorted(subtrees)
+            for full_name, nodes in subtrees.items():
+                assert full_name in class_diagram
+                assert json.loads(codemodel.to_json(class_diagram.node(full_name))) == nodes[0]
+                assert [ json.loads(codemodel.to_json(node)) for node in class_diagram.nodes(full_name) ] == nodes
+                assert json.loads(codemodel.to_json(class_diagram.node(full_name, children=False))) == _without_children(nodes[0])
+
+            for missing in [ "", "zz", "ns0.zz", sorted(subtrees)[0] + ".zz" if subtrees else "a.b" ]:
+                assert missing not in class_diagram
+                with pytest.raises(KeyError):
+                    class_diagram.node(missing)
+#enddef
+
+def test_not_binary_diagram(tmp_path):
+    for content in [ b"", b"{}", b"IFACEBIN" * 20 ]:
+        with open(str(tmp_path / "diagram.bin"), "wb") as f:
+            f.write(content)
+        with pytest.raises(RuntimeError):
+            BinaryClassDiagram(str(tmp_path / "diagram.bin"))
+#enddef
@@ -0,0 +1,121 @@
+"""
+Equivalence of the parser engines: the fast one has to feed the builders
+with the same nodes as the parsimonious one, also when the input is read by
+chunks.
+"""
+
+import glob
+import io
+import os
+
+import pytest
+
+from iface.bench.corpus import CORPORA, generate_corpus
+from iface.parser import CompilationSession
+from iface.parser.cache import EventsRecorder
+from iface.parser.fastparser import FastParser
+from iface.parser.module import ParsimoniousNodeVisitor
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+
+SAMPLE_FILES = sorted(glob.glob(os.path.join(TEST_DIR, "*.iface")))
+
+# Chunk sizes of the streamed input, the small ones cut every block.
+CHUNK_SIZES = [ 1, 7, 64 ]
+
+SAMPLE_INPUTS = [
+    "",
+    "\n\n",
+    "# just a comment\n",
+    "interface A {}\n",
+    "@a.b(1)\n@c(\"x\")\ninterface A : B {\n  @d(true) ref A[] a = 1;\n}\n",
+    "namespace n {\nusing T;\ninterface A { T t; n.A[] all; }\n} # n\n",
+    "include \"other.iface\"\ninterface A{int a;}",
+]
+
+MALFORMED_INPUTS = [
+    "interface A {",
+    "interface { int a; }",
+    "interface A { int a }",
+    "interface A { int; }",
+    "namespace n { interface A {} ",
+    "interface A {} }",
+    "interface A : { }",
+    "@a(\ninterface A {}",
+    "include other.iface",
+    "interface A { int a = x; }",
+    # Unterminated nesting, every level has to fail once only.
+    "namespace n {\n" * 40 + "interface A {}\n",
+]
+
+def _events(process, inp):
+    recorder = EventsRecorder()
+    process(inp, [ recorder ], CompilationSession())
+    return recorder.events
+#enddef
+
+def _parse(inp):
+    return _events(ParsimoniousNodeVisitor.process_input, inp)
+#enddef
+
+def _fast(inp):
+    return _events(FastParser.process_input, inp)
+#enddef
+
+def _stream(engine, inp, **kwargs):
+    return _events(lambda inp, builders, session: engine.process_stream(io.StringIO(inp), builders, session, **kwargs), inp)
+#enddef
+
+def _read(filepath):
+    with open(filepath, "r") as f:
+        return f.read()
+#enddef
+
+@pytest.fixture(scope="module")
+def corpus_files(tmp_path_factory):
+    files = {}
+    for spec in CORPORA:
+        _, _, written = generate_corpus(spec, str(tmp_path_factory.mktemp(spec.name)))
+        files[spec.name] = written
+    return files
+#enddef
+
+@pytest.mark.parametrize("inp", SAMPLE_INPUTS)
+def test_sample_inputs(inp):
+    expected = _parse(inp)
+    assert _fast(inp) == expected
+    for chunk_size in CHUNK_SIZES:
+        assert _stream(FastParser, inp, chunk_size=chunk_size) == expected
+    assert _stream(ParsimoniousNodeVisitor, inp) == expected
+#enddef
+
+@pytest.mark.parametrize("filepath", SAMPLE_FILES, ids=os.path.basename)
+def test_sample_files(filepath):
+    inp = _read(filepath)
+    expected = _parse(inp)
+    assert expected
+    assert _fast(inp) == expected
+    for chunk_size in CHUNK_SIZES:
+        assert _stream(FastParser, inp, chunk_size=chunk_size) == expected
+    assert _stream(ParsimoniousNodeVisitor, inp) == expected
+#enddef
+
+@pytest.mark.parametrize("name", [ spec.name for spec in CORPORA ])
+def test_corpora(corpus_files, name):
+    for filepath in corpus_files[name]:
+        inp = _read(filepath)
+        expected = _parse(inp)
+        assert _fast(inp) == expected
+        assert _stream(FastParser, inp, chunk_size=64) == expected
+#enddef
+
+@pytest.mark.parametrize("inp", MALFORMED_INPUTS)
+def test_malformed_inputs(inp):
+    with pytest.raises(Exception):
+        _parse(inp)
+    with pytest.raises(RuntimeError):
+        _fast(inp)
+    for chunk_size in CHUNK_SIZES:
+        with pytest.raises(RuntimeError):
+            _stream(FastParser, inp, chunk_size=chunk_size)
+#enddef
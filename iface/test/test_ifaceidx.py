@@ -0,0 +1,118 @@
+"""
+Precompiled (.ifaceidx) and shared in-memory indexes of the included files:
+they register the same types as indexing the files, and out of date indexes
+are ignored.
+"""
+
+import json
+import os
+import time
+
+from iface.parser import CompilationSession
+from iface.parser.ifaceidx import INDEX_FORMAT_VERSION, MemoryIndex, index_filepath, load_index, write_index
+
+LIB = "@treatment(\"value_type\")\nusing Handle;\n@doc(\"base\")\ninterface Base { Handle h = 1; }\n"
+SHAPES = "include \"lib.iface\"\nnamespace s {\ninterface Shape : Base { int n = 2; Base[] parts = 3; }\n}\n"
+
+def _write(filepath, content):
+    with open(filepath, "w") as f:
+        f.write(content)
+    return filepath
+#enddef
+
+def _files(tmp_path):
+    lib = _write(str(tmp_path / "lib.iface"), LIB)
+    shapes = _write(str(tmp_path / "shapes.iface"), SHAPES)
+    return lib, shapes
+#enddef
+
+def _indexed(session, filepath):
+    session.index_file(os.path.abspath(filepath))
+    return session
+#enddef
+
+def _summary(session):
+    """
+    Returns what's registered from the files: kinds, sources, attributes and
+    type paths of the types and the includes.
+    """
+    types = {}
+    for full_type, type_info in session.types.items():
+        if "source" not in type_info:
+            continue
+        builder = type_info.get("definition") or type_info.get("declaration")
+        types[full_type] = (
+            "definition" if "definition" in type_info else "declaration",
+            type_info["source"],
+            dict(builder.attributes),
+            getattr(builder, "base_type_ref", None),
+            list(getattr(builder, "field_type_refs", []))
+        )
+    return types, { filepath: list(included) for filepath, included in session.includes.items() if included }
+#enddef
+
+def test_precompiled_index(tmp_path):
+    lib, shapes = _files(tmp_path)
+    parsed = _indexed(CompilationSession([ str(tmp_path) ]), shapes)
+    write_index(parsed, shapes)
+
+    loaded = CompilationSession([ str(tmp_path) ])
+    assert load_index(loaded, os.path.abspath(shapes))
+    assert _summary(loaded) == _summary(parsed)
+    assert loaded.types["s.Shape"]["definition"].base_type_ref == "Base"
+    assert loaded.types["s.Shape"]["definition"].field_type_refs == [ "int", "Base" ]
+#enddef
+
+def test_index_used_for_includes(tmp_path):
+    lib, shapes = _files(tmp_path)
+    write_index(_indexed(CompilationSession([ str(tmp_path) ]), lib), lib)
+
+    # The index is used instead of parsing the file.
+    with open(index_filepath(lib), "r") as f:
+        index = json.load(f)
+    index["files"][0]["types"][0]["attributes"]["doc"] = "from the index"
+    with open(index_filepath(lib), "w") as f:
+        json.dump(index, f)
+
+    session = _indexed(CompilationSession([ str(tmp_path) ]), shapes)
+    assert session.types["Handle"]["declaration"].attributes["doc"] == "from the index"
+#enddef
+
+def test_out_of_date_index(tmp_path):
+    lib, shapes = _files(tmp_path)
+    write_index(_indexed(CompilationSession([ str(tmp_path) ]), lib), lib)
+
+    _write(lib, LIB + "interface Added {}\n")
+    mtime = time.time() + 10
+    os.utime(lib, (mtime, mtime))
+    session = CompilationSession([ str(tmp_path) ])
+    assert not load_index(session, os.path.abspath(lib))
+    assert "Added" in _indexed(session, lib).types
+#enddef
+
+def test_broken_index(tmp_path):
+    lib, _ = _files(tmp_path)
+    _write(index_filepath(lib), "{")
+    assert not load_index(CompilationSession(), os.path.abspath(lib))
+
+    _write(index_filepath(lib), json.dumps({ "version": INDEX_FORMAT_VERSION - 1, "files": [] }))
+    assert not load_index(CompilationSession(), os.path.abspath(lib))
+#enddef
+
+def test_memory_index(tmp_path):
+    lib, shapes = _files(tmp_path)
+    index = MemoryIndex(check_mtime=True)
+    parsed = _indexed(CompilationSession([ str(tmp_path) ], index=index), shapes)
+
+    shared = CompilationSession([ str(tmp_path) ], index=index)
+    assert index.load(shared, os.path.abspath(shapes))
+    assert _summary(shared) == _summary(parsed)
+
+    # Other include paths don't share the entries.
+    assert not index.load(CompilationSession([], index=index), os.path.abspath(shapes))
+
+    # A modified file is indexed again.
+    mtime = time.time() + 10
+    os.utime(shapes, (mtime, mtime))
+    assert not index.load(CompilationSession([ str(tmp_path) ], index=index), os.path.abspath(shapes))
+#enddef
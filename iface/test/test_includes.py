@@ -0,0 +1,57 @@
+"""
+Resolution of the included files: the first match in the include paths,
+each file indexed once, and the includes skipped without include paths.
+"""
+
+import os
+
+import pytest
+
+from iface.parser import CompilationSession
+from iface.parser.includes import IncludeResolver
+from iface.parser.module import InterfacesIndexBuilder
+
+def _write(filepath, content):
+    os.makedirs(os.path.dirname(filepath), exist_ok=True)
+    with open(filepath, "w") as f:
+        f.write(content)
+    return filepath
+#enddef
+
+def _index(session, filepath):
+    session.process_file(filepath, [ InterfacesIndexBuilder(session, filepath) ])
+    return session
+#enddef
+
+def test_first_match(tmp_path):
+    first = _write(str(tmp_path / "first" / "lib.iface"), "interface First {}\n")
+    _write(str(tmp_path / "second" / "lib.iface"), "interface Second {}\n")
+    main = _write(str(tmp_path / "main.iface"), "include \"lib.iface\"\ninclude \"./lib.iface\"\n")
+
+    session = _index(CompilationSession([ str(tmp_path / "first"), str(tmp_path / "second") ]), main)
+    assert "First" in session.types and "Second" not in session.types
+    assert session.includes[os.path.abspath(main)] == [ os.path.realpath(first) ]
+#enddef
+
+def test_resolver_caches_listings(tmp_path):
+    _write(str(tmp_path / "a.iface"), "")
+    resolver = IncludeResolver([ str(tmp_path) ])
+    assert resolver.resolve("a.iface") == os.path.realpath(str(tmp_path / "a.iface"))
+    assert resolver.resolve("a.iface") == os.path.realpath(str(tmp_path / "a.iface"))
+    assert resolver.resolve("missing.iface") is None
+    assert resolver.hits == 1 and resolver.listdir_calls == 1
+#enddef
+
+def test_unresolved_include(tmp_path):
+    main = _write(str(tmp_path / "main.iface"), "include \"missing.iface\"\ninterface A {}\n")
+    # Wrapped in VisitationError by parsimonious.
+    with pytest.raises(Exception, match="Cannot find the included file 'missing.iface'"):
+        _index(CompilationSession([ str(tmp_path) ]), main)
+#enddef
+
+def test_include_without_include_paths(tmp_path):
+    main = _write(str(tmp_path / "main.iface"), "include \"missing.iface\"\ninterface A {}\n")
+    session = _index(CompilationSession(), main)
+    assert "A" in session.types
+    assert session.includes.get(os.path.abspath(main), []) == []
+#enddef
@@ -0,0 +1,96 @@
+"""
+Flattened inheritance layouts, of the compiled interfaces and of the structs
+of the generators: the fields of the bases come first, each layout is
+computed once, and cycles and field ids shared across a chain are errors.
+"""
+
+import pytest
+
+from iface.generator.model import FieldModel, SchemaModel, StructModel
+from iface.parser import CompilationSession, FrontEndBuilder
+from iface.parser.layouts import InterfaceLayouts
+
+CHAIN = """
+namespace n { interface A { int a = 1; } }
+namespace m {
+  interface B : n.A { int b = 2; ref B self = 3; }
+  interface C : B { int c = 4; }
+  interface D : m.B { int d = 4; }
+}
+"""
+
+def _session(inp, include_paths=[]):
+    session = CompilationSession(include_paths)
+    FrontEndBuilder(session).process_input(inp)
+    return session
+#enddef
+
+def _layout(session, full_name):
+    return session.layouts.layout(full_name)
+#enddef
+
+def test_chain():
+    session = _session(CHAIN)
+    layout = _layout(session, "m.C")
+    assert layout.bases == [ "m.B", "n.A" ]
+    assert layout.depth == 2 and layout.complete
+    assert layout.field_names == [ "n.A.a", "m.B.b", "m.B.self", "m.C.c" ]
+    assert [ field.field_name for _, field in layout.fields ] == [ "a", "b", "self", "c" ]
+    assert layout.to_attributes() == { "depth": 2, "fields": layout.field_names, "complete": True }
+    assert _layout(session, "n.A").to_attributes() == { "depth": 0, "fields": [ "n.A.a" ], "complete": True }
+#enddef
+
+def test_memoized():
+    session = _session(CHAIN)
+    for full_name in [ "m.C", "m.D", "m.C", "m.B" ]:
+        _layout(session, full_name)
+    assert session.layouts.stats() == { "lookups": 7, "computed": 4, "interfaces": 4 }
+
+    # A newly registered type may change how the bases resolve.
+    session.register_type("m.E")
+    _layout(session, "m.C")
+    assert session.layouts.stats()["computed"] == 7
+#enddef
+
+def test_included_base(tmp_path):
+    (tmp_path / "lib.iface").write_text("namespace lib { interface Base { int a = 1; } }\n")
+    session = _session("include \"lib.iface\"\ninterface A : lib.Base { int b = 2; }\n", [ str(tmp_path) ])
+    layout = _layout(session, "A")
+    assert layout.bases == [ "lib.Base" ] and not layout.complete
+    assert layout.field_names == [ "A.b" ]
+#enddef
+
+def test_errors():
+    with pytest.raises(RuntimeError, match="Field id 4 of 'm.D.d' is already used by 'm.B.x'"):
+        _layout(_session(CHAIN.replace("int b = 2;", "int b = 2; int x = 4;")), "m.D")
+    with pytest.raises(RuntimeError, match="inherits from itself"):
+        _layout(_session("interface A : B { int a = 1; }\ninterface B : A { int b = 2; }\n"), "A")
+#enddef
+
+def test_generic_table():
+    # Name -> (base, ((field name, id), ...)), the definitions are hashable.
+    interfaces = {
+        "A": (None, (("a", 1), ("b", None))),
+        "B": ("A", (("c", 2),)),
+        "C": ("Missing", (("d", 1),))
+    }
+    layouts = InterfaceLayouts(interfaces.get, lambda interface: interface, lambda field: field)
+    assert layouts.layout("B").field_names == [ "A.a", "A.b", "B.c" ]
+    assert layouts.layout("B").field_ids == { 1: "A.a", 2: "B.c" }
+    layout = layouts.layout("C")
+    assert layout.bases == [ "Missing" ] and not layout.complete and layout.field_names == [ "C.d" ]
+#enddef
+
+def test_schema_layout():
+    point = StructModel([ "app" ], "Point", fields=[ FieldModel("x", "double", id=1) ])
+    base = StructModel([ "app" ], "Base", fields=[ FieldModel("label", "string", id=1) ])
+    item = StructModel([ "app" ], "Item", "app.Base", fields=[ FieldModel("at", "app.Point", id=2) ])
+    schema = SchemaModel([ point, base, item ], { "app.Point": "value_type" })
+    layout = schema.layout("app.Item")
+    assert [ (owner.name, field.name) for owner, field in layout.fields ] == [ ("Base", "label"), ("Item", "at") ]
+    assert schema.layout("app.Item") is layout
+
+    clash = StructModel([ "app" ], "Clash", "app.Base", fields=[ FieldModel("other", "int", id=1) ])
+    with pytest.raises(RuntimeError, match="Field id 1 of 'app.Clash.other' is already used by 'app.Base.label'"):
+        SchemaModel([ base, clash ], {}).layout("app.Clash")
+#enddef
@@ -0,0 +1,108 @@
+"""
+Compile server and its client: the server compiles the same class diagram
+as a local compilation, notices changed includes, and survives malformed
+requests and failed compilations.
+"""
+
+import json
+import os
+import socket
+import threading
+import time
+
+import pytest
+
+codemodel = pytest.importorskip("codemodel")
+
+from iface.parser import CompilationSession
+from iface.parser.client import compile_remote, shutdown_server
+from iface.parser.module import compile_files
+from iface.parser.server import CompileServer
+
+LIB = "namespace lib {\n@treatment(\"value_type\")\nusing Handle;\ninterface Base { Handle h = 1; }\n}\n"
+MAIN = "include \"lib.iface\"\nnamespace app {\ninterface Item : lib.Base { int n = 2; }\n}\n"
+
+def _write(filepath, content):
+    with open(filepath, "w") as f:
+        f.write(content)
+    return filepath
+#enddef
+
+def _local(inputs, include_paths):
+    return codemodel.to_json(compile_files(CompilationSession(include_paths), inputs).build())
+#enddef
+
+@pytest.fixture
+def server(tmp_path):
+    compile_server = CompileServer(str(tmp_path / "server.sock"))
+    thread = threading.Thread(target=compile_server.serve_forever)
+    thread.start()
+    yield compile_server
+    shutdown_server(compile_server.socket_path)
+    thread.join(10)
+    compile_server.server_close()
+    assert not thread.is_alive()
+#enddef
+
+@pytest.fixture
+def files(tmp_path):
+    include_dir = tmp_path / "include"
+    include_dir.mkdir()
+    lib = _write(str(include_dir / "lib.iface"), LIB)
+    main = _write(str(tmp_path / "main.iface"), MAIN)
+    return main, lib, str(include_dir)
+#enddef
+
+def test_compile(server, files):
+    main, _, include_dir = files
+    expected = _local([ main ], [ include_dir ])
+    assert compile_remote(server.socket_path, [ main ], [ include_dir ]) == expected
+    # Served from the memory cache and the shared index the second time.
+    assert compile_remote(server.socket_path, [ main ], [ include_dir ], engine="fast") == expected
+#enddef
+
+def test_output(server, files, tmp_path):
+    main, _, include_dir = files
+    output = str(tmp_path / "out.json")
+    assert compile_remote(server.socket_path, [ main ], [ include_dir ], output=output) is None
+    with open(output, "r") as f:
+        assert f.read() == _local([ main ], [ include_dir ])
+#enddef
+
+def test_changed_include(server, files):
+    main, lib, include_dir = files
+    compile_remote(server.socket_path, [ main ], [ include_dir ])
+
+    _write(lib, LIB.replace("Handle h = 1;", "Handle h = 1; int added = 3;").replace("value_type", "reference_type"))
+    mtime = time.time() + 10
+    os.utime(lib, (mtime, mtime))
+    class_diagram = compile_remote(server.socket_path, [ main ], [ include_dir ])
+    assert json.loads(class_diagram)["attributes"]["using"]["lib.Handle"] == { "treatment": "reference_type" }
+    assert class_diagram == _local([ main ], [ include_dir ])
+#enddef
+
+def test_failed_compilation(server, files, tmp_path):
+    main, _, include_dir = files
+    with pytest.raises(RuntimeError, match="Cannot find the included file"):
+        compile_remote(server.socket_path, [ main ], [ str(tmp_path) ])
+    with pytest.raises(RuntimeError):
+        compile_remote(server.socket_path, [ str(tmp_path / "missing.iface") ], [])
+    # The server keeps serving.
+    assert compile_remote(server.socket_path, [ main ], [ include_dir ]) == _local([ main ], [ include_dir ])
+#enddef
+
+def test_malformed_requests(server, files):
+    main, _, include_dir = files
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(server.socket_path)
+        with sock.makefile("rwb") as f:
+            for line in [ b"{broken\n", b"[1, 2]\n", b"{}\n" ]:
+                f.write(line)
+                f.flush()
+                assert json.loads(f.readline().decode("utf-8"))["status"] == "error"
+
+            # The connection is still usable.
+            f.write(json.dumps({ "inputs": [ main ], "include_paths": [ include_dir ] }).encode("utf-8") + b"\n")
+            f.flush()
+            assert json.loads(f.readline().decode("utf-8"))["status"] == "ok"
+#enddef
@@ -0,0 +1,195 @@
+"""
+Wire codecs generated for Python and C++: a message encoded by one of them
+decodes to the same values and encodes to the same bytes by the other one,
+unknown fields are skipped and broken messages are errors.
+"""
+
+import importlib.util
+import io
+import os
+import shutil
+import subprocess
+
+import pytest
+
+pytest.importorskip("codemodel")
+
+from iface import wire
+from iface.generator import load_schema
+from iface.generator.cpp import generate_cpp_header
+from iface.generator.cppwire import generate_cpp_wire_header
+from iface.generator.python import generate_python
+from iface.parser import CompilationSession, FrontEndBuilder
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+CPP_INCLUDE_DIR = os.path.join(TEST_DIR, os.pardir, os.pardir, "cpp", "include")
+
+SCHEMA = """
+namespace app {
+
+@treatment("value_type")
+interface Point {
+  double x = 1;
+  float y = 2;
+}
+
+interface Base {
+  string label = 1;
+}
+
+interface Item : Base {
+  int count = 2;
+  uint size = 3;
+  bool flag = 4;
+  int[] values = 5;
+  double[] weights = 6;
+  string[] tags = 7;
+  Point position = 8;
+  Point[] path = 9;
+  Item child = 10;
+  Item[] children = 11;
+  ref Item parent = 12;
+  int class = 13;
+  bool[] flags = 14;
+}
+
+}
+"""
+
+CPP_ROUND_TRIP = r"""
+#include "schema_wire.hpp"
+#include <cstdint>
+#include <cstdio>
+#include <fstream>
+#include <iterator>
+#include <type_traits>
+
+static_assert(std::is_same<decltype(app::Item::flags), std::vector<std::uint8_t>>::value, "repeated bool");
+
+#define CHECK(condition) if (!(condition)) { std::printf("failed: %s\n", #condition); return 1; }
+
+int main(int argc, char* argv[])
+{
+  std::ifstream in(argv[1], std::ios::binary);
+  std::string data((std::istreambuf_iterator<char>(in)), std::istreambuf_iterator<char>());
+  app::Item item;
+  mad::interfaces::wire::decode_message(data, item);
+  CHECK(item.label == "hello" && item.count == -5 && item.size == 300 && item.flag);
+  CHECK(item.values.size() == 3 && item.values[2] == 300000 && item.weights[1] == -1.25);
+  CHECK(item.tags[1] == "b\xc3\xa9" && item.position.x == 1.5 && item.path[1].y == -3.0f);
+  CHECK(item.child && item.child->count == 7 && item.children.size() == 2 && item.children[0]->label == "c1");
+  CHECK(item.class_ == 9 && item.flags.size() == 3 && item.flags[0] && !item.flags[1]);
+
+  // A long nested message needs more bytes for its length.
+  item.children[1]->label = std::string(1000, 'x');
+  std::ofstream(argv[2], std::ios::binary) << mad::interfaces::wire::encode_message(item);
+
+  try {
+    app::Item truncated;
+    mad::interfaces::wire::decode_message(data.substr(0, data.size() - 1), truncated);
+    return 1;
+  } catch (const std::runtime_error&) {
+  }
+  return 0;
+}
+"""
+
+def _schema(inp):
+    session = CompilationSession()
+    front_end = FrontEndBuilder(session)
+    front_end.process_input(inp)
+    return load_schema(front_end.root_builder.build())
+#enddef
+
+def _generate(generate, schema, filepath, **kwargs):
+    f = io.StringIO()
+    generate(schema, f, **kwargs)
+    with open(filepath, "w") as out:
+        out.write(f.getvalue())
+    return filepath
+#enddef
+
+@pytest.fixture(scope="module")
+def generated(tmp_path_factory):
+    filepath = _generate(generate_python, _schema(SCHEMA), str(tmp_path_factory.mktemp("wire") / "schema.py"))
+    spec = importlib.util.spec_from_file_location("generated_wire_schema", filepath)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+#enddef
+
+def _item(gen):
+    return gen.Item(label="hello", count=-5, size=300, flag=True, values=[1, -2, 300000], weights=[0.5, -1.25],
+            tags=["a", "bé"], position=gen.Point(x=1.5, y=2.0), path=[gen.Point(x=1.0), gen.Point(y=-3.0)],
+            child=gen.Item(count=7), children=[gen.Item(label="c1"), gen.Item(tags=["x"])], class_=9,
+            flags=[True, False, True])
+#enddef
+
+def test_python_round_trip(generated):
+    data = _item(generated).encode()
+    item = generated.Item.decode(data)
+    assert item.encode() == data
+    assert (item.label, item.count, item.size, item.flag, item.class_) == ("hello", -5, 300, True, 9)
+    assert list(item.values) == [1, -2, 300000] and list(item.weights) == [0.5, -1.25] and item.tags == ["a", "bé"]
+    assert (item.position.x, item.path[1].y, item.child.count, item.children[0].label) == (1.5, -3.0, 7, "c1")
+    assert [ bool(flag) for flag in item.flags ] == [True, False, True]
+    assert generated.Item.decode(generated.Item().encode()).encode() == b""
+#enddef
+
+def test_python_unknown_fields(generated):
+    data = _item(generated).encode()
+    out = bytearray(data)
+    wire.encode_varint((99 << 3) | 0, out)
+    wire.encode_varint(12345, out)
+    wire.encode_varint((98 << 3) | 2, out)
+    wire.encode_string("zzz", out)
+    wire.encode_varint((97 << 3) | 1, out)
+    out += b"12345678"
+    wire.encode_varint((96 << 3) | 5, out)
+    out += b"1234"
+    assert generated.Item.decode(bytes(out)).encode() == data
+
+    # Repeated values which aren't packed.
+    unpacked = bytearray()
+    for value in [ -7, 8 ]:
+        wire.encode_varint((5 << 3) | 0, unpacked)
+        wire.encode_signed(value, unpacked)
+    assert list(generated.Item.decode(bytes(unpacked)).values) == [ -7, 8 ]
+#enddef
+
+def test_python_broken_message(generated):
+    data = _item(generated).encode()
+    with pytest.raises(RuntimeError):
+        generated.Item.decode(data[:-1])
+#enddef
+
+def test_field_ids():
+    with pytest.raises(RuntimeError, match="Field id 1 of 'B.b' is already used by 'A.a'"):
+        _schema("interface A { int a = 1; }\ninterface B : A { int b = 1; }\n")
+    with pytest.raises(RuntimeError, match="has no id"):
+        generate_python(_schema("interface A { int a; }\n"), io.StringIO(), wire=True)
+    # Only the wire codec needs the ids.
+    generate_python(_schema("interface A { int a; }\n"), io.StringIO(), wire=False)
+#enddef
+
+@pytest.mark.skipif(shutil.which("g++") is None, reason="needs g++")
+def test_cpp_round_trip(generated, tmp_path):
+    schema = _schema(SCHEMA)
+    _generate(generate_cpp_header, schema, str(tmp_path / "schema.hpp"))
+    _generate(generate_cpp_wire_header, schema, str(tmp_path / "schema_wire.hpp"), includes=[ "schema.hpp" ])
+    with open(str(tmp_path / "round_trip.cpp"), "w") as f:
+        f.write(CPP_ROUND_TRIP)
+    subprocess.check_call([ "g++", "-std=c++17", "-Wall", "-I", CPP_INCLUDE_DIR, "-I", str(tmp_path),
+            "-o", str(tmp_path / "round_trip"), str(tmp_path / "round_trip.cpp") ])
+
+    item = _item(generated)
+    with open(str(tmp_path / "in.bin"), "wb") as f:
+        f.write(item.encode())
+    subprocess.check_call([ str(tmp_path / "round_trip"), str(tmp_path / "in.bin"), str(tmp_path / "out.bin") ])
+
+    item.children[1].label = "x" * 1000
+    with open(str(tmp_path / "out.bin"), "rb") as f:
+        data = f.read()
+    assert data == item.encode()
+    assert generated.Item.decode(data).children[1].label == "x" * 1000
+#enddef